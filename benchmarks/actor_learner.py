@@ -0,0 +1,68 @@
+"""
+Episodes per second that an ActorPool gets into a SharedReplayBuffer on the synthetic env, against the number of
+actor processes. Every actor seeds its RNGs and env from its actor_id, which is checked here: no two episodes in the
+buffer may have the same observations and actions.
+
+    python3 benchmarks/actor_learner.py [--actors 1 2 4] [--episodes 40] [--batch-size-run 1]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.actor_pool import ActorPool
+from components.episode_buffer import EpisodeBatch, SharedReplayBuffer
+from controllers import REGISTRY as mac_REGISTRY
+from utils.logging import Logger
+
+ENV_ARGS = dict(n_agents=5, n_actions=SC2_LIKE["n_actions"], obs_shape=32, state_shape=48, episode_limit=60,
+                episode_length="geometric", mean_episode_length=30, seed=0)
+
+
+def collect(n_actors, cfg):
+    args = SN(env="synthetic", env_args=dict(ENV_ARGS), runner="parallel" if cfg.batch_size_run > 1 else "episode",
+              batch_size_run=cfg.batch_size_run, shared_transport=True, envs_per_worker=1, seed=0,
+              actor_processes=n_actors, device="cpu", use_cuda=False, test_nepisode=1, runner_log_interval=10 ** 9,
+              n_agents=ENV_ARGS["n_agents"], n_actions=ENV_ARGS["n_actions"], obs_agent_id=True, obs_last_action=True,
+              mac="basic_mac", agent="rnn", rnn_hidden_dim=64, agent_output_type="q", action_selector="epsilon_greedy",
+              epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, ENV_ARGS["obs_shape"],
+                                             ENV_ARGS["state_shape"])
+    buffer_size = cfg.episodes + n_actors * cfg.batch_size_run * 2
+    buffer = SharedReplayBuffer(scheme, groups, buffer_size, ENV_ARGS["episode_limit"] + 1, preprocess=preprocess)
+    th.manual_seed(0)
+    mac = mac_REGISTRY[args.mac](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    logger = Logger(logging.getLogger("bench"))
+
+    start = time.perf_counter()
+    pool = ActorPool(args, buffer, scheme, groups, preprocess, mac)
+    while pool.episodes < cfg.episodes:
+        pool.drain(logger)
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    pool.close(logger)
+
+    n = buffer.episodes_in_buffer
+    episodes = buffer[:n]
+    keys = [episodes["obs"][i].numpy().tobytes() + episodes["actions"][i].numpy().tobytes() for i in range(n)]
+    assert len(set(keys)) == n, "{} of {} episodes collected more than once".format(n - len(set(keys)), n)
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actors", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--episodes", type=int, default=40)
+    parser.add_argument("--batch-size-run", type=int, default=1)
+    cfg = parser.parse_args()
+
+    print("{} episodes per run, {} envs per actor".format(cfg.episodes, cfg.batch_size_run))
+    print("{:<10}{:>14}".format("actors", "episodes/s"))
+    for n_actors in cfg.actors:
+        print("{:<10}{:>14.1f}".format(n_actors, collect(n_actors, cfg)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Env steps per second of the async runner against local env servers (envs/env_server.py) of the stand-in env of
+parallel_transport.py, which waits step_time seconds per step with the GIL released, as a simulator in another
+process or on another machine would. With every env of a batch in flight at once, a step of the batch should
+take about step_time whatever batch_size_run is, so env steps/s should grow with it up to the CPU limit.
+
+    python3 benchmarks/async_runner.py [--batch-size-run 16 64 256] [--servers 2] [--step-time 0.01]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch
+from controllers import REGISTRY as mac_REGISTRY
+from envs import REGISTRY as env_REGISTRY
+from parallel_transport import StandInEnv
+from runners import REGISTRY as r_REGISTRY
+from utils.logging import Logger
+
+
+def run(batch_size_run, cfg):
+    # Smaller observations than SC2_LIKE, so that hundreds of envs are not bound by pickling on a small machine
+    env_args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], obs_dim=cfg.obs_dim,
+                    state_dim=cfg.obs_dim, episode_limit=SC2_LIKE["episode_limit"], step_time=cfg.step_time, seed=None)
+    args = SN(env="stand_in", env_args=env_args, batch_size_run=batch_size_run, remote_endpoints=[],
+              remote_local_servers=cfg.servers, remote_timeout=30.0, device="cpu", test_nepisode=batch_size_run,
+              runner_log_interval=10 ** 9, n_agents=env_args["n_agents"], n_actions=env_args["n_actions"],
+              obs_agent_id=True, obs_last_action=True, agent="rnn", rnn_hidden_dim=64, agent_output_type="q",
+              action_selector="epsilon_greedy", epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    runner = r_REGISTRY["async"](args, Logger(logging.getLogger("bench")))
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, cfg.obs_dim, cfg.obs_dim)
+    mac = mac_REGISTRY["basic_mac"](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+
+    steps, start = 0, time.time()
+    while runner.t_env < cfg.env_steps:
+        with th.no_grad():
+            runner.run(test_mode=False)
+        steps += runner.t
+    elapsed = time.time() - start
+    runner.close_env()
+    return runner.t_env / elapsed, 1000.0 * elapsed / steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--servers", type=int, default=2)
+    parser.add_argument("--env-steps", type=int, default=20000)
+    parser.add_argument("--step-time", type=float, default=0.01)
+    parser.add_argument("--obs-dim", type=int, default=32)
+    cfg = parser.parse_args()
+    env_REGISTRY["stand_in"] = StandInEnv
+
+    print("{} servers, {} env steps, {}s per step".format(cfg.servers, cfg.env_steps, cfg.step_time))
+    print("{:<16}{:>16}{:>20}".format("batch_size_run", "env steps/s", "ms per batch step"))
+    for batch_size_run in cfg.batch_size_run:
+        steps_per_s, ms_per_step = run(batch_size_run, cfg)
+        print("{:<16}{:>16.0f}{:>20.1f}".format(batch_size_run, steps_per_s, ms_per_step))
+
+
+if __name__ == "__main__":
+    main()
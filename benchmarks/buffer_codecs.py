@@ -0,0 +1,48 @@
+"""
+Bytes stored per replay buffer field with and without storage codecs, plus the largest
+reconstruction error the codecs introduce on sampled batches.
+
+    python3 benchmarks/buffer_codecs.py [--buffer-size 200] [--batch-size 32]
+"""
+import argparse
+
+import numpy as np
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from components.codecs import AffineUint8Codec, BitPackCodec, DerivedCodec, Float16Codec
+from components.episode_buffer import ReplayBuffer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-size", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    cfg = parser.parse_args()
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    codecs = {
+        "obs": AffineUint8Codec(-1.0, 1.0),
+        "state": Float16Codec(),
+        "avail_actions": BitPackCodec(n_bits=SC2_LIKE["n_actions"]),
+        "actions_onehot": DerivedCodec("actions", preprocess["actions"][1]),
+    }
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+    plain = ReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess)
+    encoded = ReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess, codecs=codecs)
+
+    for _ in range(-(-cfg.buffer_size // 10)):
+        ep_batch = random_episode_batch(scheme, groups, preprocess, 10, SC2_LIKE["episode_limit"], SC2_LIKE["n_actions"])
+        plain.insert_episode_batch(ep_batch)
+        encoded.insert_episode_batch(ep_batch)
+
+    print("buffer_size={} {}".format(cfg.buffer_size, SC2_LIKE))
+    print(encoded.storage_report())
+
+    ep_ids = np.random.choice(cfg.buffer_size, min(cfg.batch_size, cfg.buffer_size), replace=False)
+    expected, decoded = plain[ep_ids], encoded[ep_ids]
+    print("\nmax abs error after decoding:")
+    for k in codecs:
+        print("{:<16}{:>12.6f}".format(k, (expected[k].float() - decoded[k].float()).abs().max().item()))
+
+
+if __name__ == "__main__":
+    main()
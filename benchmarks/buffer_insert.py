@@ -0,0 +1,58 @@
+"""
+Inserts per second into ReplayBuffer: the old path through EpisodeBatch.update against
+the bulk-copy path used by ReplayBuffer.insert_episode_batch.
+
+    python3 benchmarks/buffer_insert.py [--buffer-size 1000] [--batch-size-run 1]
+"""
+import argparse
+
+from common import SC2_LIKE, make_scheme, random_episode_batch, timeit
+from components.episode_buffer import ReplayBuffer
+
+
+def legacy_insert(buffer, ep_batch):
+    # The previous implementation of ReplayBuffer.insert_episode_batch
+    if buffer.buffer_index + ep_batch.batch_size <= buffer.buffer_size:
+        buffer.update(ep_batch.data.transition_data,
+                      slice(buffer.buffer_index, buffer.buffer_index + ep_batch.batch_size),
+                      slice(0, ep_batch.max_seq_length),
+                      mark_filled=False)
+        buffer.update(ep_batch.data.episode_data,
+                      slice(buffer.buffer_index, buffer.buffer_index + ep_batch.batch_size))
+        buffer.buffer_index = (buffer.buffer_index + ep_batch.batch_size)
+        buffer.episodes_in_buffer = max(buffer.episodes_in_buffer, buffer.buffer_index)
+        buffer.buffer_index = buffer.buffer_index % buffer.buffer_size
+    else:
+        buffer_left = buffer.buffer_size - buffer.buffer_index
+        legacy_insert(buffer, ep_batch[0:buffer_left, :])
+        legacy_insert(buffer, ep_batch[buffer_left:, :])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-size", type=int, default=1000)
+    parser.add_argument("--batch-size-run", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=200)
+    cfg = parser.parse_args()
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    ep_batch = random_episode_batch(scheme, groups, preprocess, cfg.batch_size_run,
+                                    SC2_LIKE["episode_limit"], SC2_LIKE["n_actions"])
+
+    results = {}
+    for name, insert in [("update (before)", legacy_insert),
+                         ("bulk copy (after)", ReplayBuffer.insert_episode_batch)]:
+        buffer = ReplayBuffer(scheme, groups, cfg.buffer_size, SC2_LIKE["episode_limit"] + 1, preprocess=preprocess)
+        # Start close to the end so that wrap-around is part of the measurement
+        buffer.buffer_index = max(0, cfg.buffer_size - cfg.repeats * cfg.batch_size_run // 2)
+        results[name] = timeit(lambda: insert(buffer, ep_batch), cfg.repeats)
+        del buffer
+
+    print("buffer_size={} batch_size_run={} {}".format(cfg.buffer_size, cfg.batch_size_run, SC2_LIKE))
+    for name, t in results.items():
+        print("{:<20} {:>10.1f} inserts/s ({:.3f} ms/insert)".format(name, 1.0 / t, t * 1000))
+    print("speedup: {:.1f}x".format(results["update (before)"] / results["bulk copy (after)"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Time to snapshot a full ReplayBuffer to disk and to restore it, reading the files or through mmap.
+
+    python3 benchmarks/buffer_snapshot.py [--buffer-size 5000] [--no-codecs] [--dir /tmp/buffer_snapshot]
+
+By default the buffer uses the codecs from benchmarks/buffer_codecs.py. Without them a 5000 episode
+buffer of the SC2-like scheme takes about 5.5GB, twice that with the buffer it is restored into.
+"""
+import argparse
+import shutil
+import time
+
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from components.codecs import AffineUint8Codec, BitPackCodec, DerivedCodec, Float16Codec
+from components.episode_buffer import ReplayBuffer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-size", type=int, default=5000)
+    parser.add_argument("--no-codecs", action="store_true")
+    parser.add_argument("--dir", default="/tmp/buffer_snapshot")
+    cfg = parser.parse_args()
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    codecs = None if cfg.no_codecs else {
+        "obs": AffineUint8Codec(-1.0, 1.0),
+        "state": Float16Codec(),
+        "avail_actions": BitPackCodec(n_bits=SC2_LIKE["n_actions"]),
+        "actions_onehot": DerivedCodec("actions", preprocess["actions"][1]),
+    }
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+
+    def new_buffer():
+        return ReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess, codecs=codecs)
+
+    buffer = new_buffer()
+    ep_batches = [random_episode_batch(scheme, groups, preprocess, 10, SC2_LIKE["episode_limit"], SC2_LIKE["n_actions"])
+                  for _ in range(5)]
+    for i in range(cfg.buffer_size // 10):
+        buffer.insert_episode_batch(ep_batches[i % len(ep_batches)])
+    mb = sum(stored for _, stored in buffer.field_bytes.values()) / 2 ** 20
+    print("buffer_size={} codecs={} {:.0f}MB {}".format(cfg.buffer_size, codecs is not None, mb, SC2_LIKE))
+
+    shutil.rmtree(cfg.dir, ignore_errors=True)
+    start = time.perf_counter()
+    buffer.save(cfg.dir)
+    elapsed = time.perf_counter() - start
+    print("{:<14}{:>8.2f}s{:>10.0f}MB/s".format("save", elapsed, mb / elapsed))
+    del buffer
+
+    restored = new_buffer()
+    for mmap in [False, True]:
+        start = time.perf_counter()
+        restored.load(cfg.dir, mmap=mmap)
+        elapsed = time.perf_counter() - start
+        print("{:<14}{:>8.2f}s{:>10.0f}MB/s".format("load mmap" if mmap else "load read", elapsed, mb / elapsed))
+    assert restored.episodes_in_buffer == cfg.buffer_size
+    shutil.rmtree(cfg.dir)
+
+
+if __name__ == "__main__":
+    main()
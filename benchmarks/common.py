@@ -0,0 +1,78 @@
+"""
+Shared helpers for the micro-benchmarks in this folder.
+
+The scripts are meant to be run from the repository root, e.g.
+
+    python3 benchmarks/buffer_insert.py
+
+and import the framework straight from src/, the same way src/main.py does.
+"""
+import os
+import sys
+import time
+import warnings
+from os.path import dirname, abspath
+
+sys.path.insert(0, os.path.join(dirname(dirname(abspath(__file__))), "src"))
+# Indexing deprecation notices from newer torch versions would drown the results
+warnings.filterwarnings("ignore", category=UserWarning)
+
+import numpy as np
+import torch as th
+from components.episode_buffer import EpisodeBatch
+from components.transforms import OneHot
+
+
+# Roughly the size of a large SMAC map (e.g. 10m_vs_11m)
+SC2_LIKE = dict(n_agents=10, n_actions=17, obs_dim=132, state_dim=192, episode_limit=150)
+
+
+def make_scheme(n_agents, n_actions, obs_dim, state_dim, **kwargs):
+    # Mirrors the default scheme built in run.run_sequential
+    scheme = {
+        "state": {"vshape": state_dim},
+        "obs": {"vshape": obs_dim, "group": "agents"},
+        "actions": {"vshape": (1,), "group": "agents", "dtype": th.long},
+        "avail_actions": {"vshape": (n_actions,), "group": "agents", "dtype": th.int},
+        "reward": {"vshape": (1,)},
+        "terminated": {"vshape": (1,), "dtype": th.uint8},
+    }
+    groups = {"agents": n_agents}
+    preprocess = {"actions": ("actions_onehot", [OneHot(out_dim=n_actions)])}
+    return scheme, groups, preprocess
+
+
+def random_episode_batch(scheme, groups, preprocess, batch_size, episode_limit, n_actions, min_len=None):
+    """ Builds an EpisodeBatch filled with random episodes of random length """
+    batch = EpisodeBatch(scheme, groups, batch_size, episode_limit + 1, preprocess=preprocess)
+    n_agents = groups["agents"]
+    state_dim, obs_dim = scheme["state"]["vshape"], scheme["obs"]["vshape"]
+    min_len = episode_limit // 4 if min_len is None else min_len
+    for b in range(batch_size):
+        ep_len = np.random.randint(min_len, episode_limit + 1)
+        actions = np.random.randint(0, n_actions, size=(ep_len + 1, n_agents, 1))
+        avail_actions = np.random.randint(0, 2, size=(ep_len + 1, n_agents, n_actions))
+        np.put_along_axis(avail_actions, actions, 1, axis=-1)
+        batch.update({
+            "state": np.random.rand(ep_len + 1, state_dim),
+            "obs": np.random.rand(ep_len + 1, n_agents, obs_dim),
+            "avail_actions": avail_actions,
+            "actions": actions,
+        }, bs=b, ts=slice(0, ep_len + 1))
+        terminated = np.zeros((ep_len, 1))
+        terminated[-1] = 1
+        batch.update({
+            "reward": np.random.rand(ep_len, 1),
+            "terminated": terminated,
+        }, bs=b, ts=slice(0, ep_len), mark_filled=False)
+    return batch
+
+
+def timeit(fn, repeats, warmup=1):
+    """ Returns the mean wall-clock seconds per call of fn() """
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
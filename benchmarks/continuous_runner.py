@@ -0,0 +1,63 @@
+"""
+Env steps per second of the parallel runner, which waits for the longest episode of every batch, against
+the continuous runner, which resets each env as soon as its episode ends, at the same batch_size_run.
+Uses the stand-in env of parallel_transport.py, whose episodes end at random, with step_time seconds of
+waiting per step as for a game running in another process.
+
+    python3 benchmarks/continuous_runner.py [--batch-size-run 4] [--env-steps 3000] [--step-time 0.002]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch
+from controllers import REGISTRY as mac_REGISTRY
+from envs import REGISTRY as env_REGISTRY
+from parallel_transport import StandInEnv
+from runners import REGISTRY as r_REGISTRY
+from utils.logging import Logger
+
+
+def run(runner_name, cfg):
+    env_args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], obs_dim=SC2_LIKE["obs_dim"],
+                    state_dim=SC2_LIKE["state_dim"], episode_limit=SC2_LIKE["episode_limit"], step_time=cfg.step_time,
+                    seed=None)  # every env draws its own episode lengths
+    args = SN(env="stand_in", env_args=env_args, batch_size_run=cfg.batch_size_run, shared_transport=True,
+              device="cpu", test_nepisode=cfg.batch_size_run, runner_log_interval=10 ** 9,
+              n_agents=env_args["n_agents"], n_actions=env_args["n_actions"], obs_agent_id=True, obs_last_action=True,
+              agent="rnn", rnn_hidden_dim=64, agent_output_type="q", action_selector="epsilon_greedy",
+              epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    runner = r_REGISTRY[runner_name](args, Logger(logging.getLogger("bench")))
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, SC2_LIKE["obs_dim"], SC2_LIKE["state_dim"])
+    mac = mac_REGISTRY["basic_mac"](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+
+    episodes, start = 0, time.time()
+    while runner.t_env < cfg.env_steps:
+        with th.no_grad():
+            episodes += runner.run(test_mode=False).batch_size
+    elapsed = time.time() - start
+    runner.close_env()
+    return runner.t_env / elapsed, episodes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=4)
+    parser.add_argument("--env-steps", type=int, default=3000)
+    parser.add_argument("--step-time", type=float, default=0.002)
+    cfg = parser.parse_args()
+    env_REGISTRY["stand_in"] = StandInEnv
+
+    print("{} envs, {} env steps, {}s per step".format(cfg.batch_size_run, cfg.env_steps, cfg.step_time))
+    print("{:<12}{:>16}{:>10}".format("runner", "env steps/s", "episodes"))
+    for runner_name in ["parallel", "continuous"]:
+        steps_per_s, episodes = run(runner_name, cfg)
+        print("{:<12}{:>16.0f}{:>10}".format(runner_name, steps_per_s, episodes))
+
+
+if __name__ == "__main__":
+    main()
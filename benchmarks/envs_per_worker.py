@@ -0,0 +1,72 @@
+"""
+Env steps per second of ParallelRunner with batch_size_run envs spread over worker processes that run
+envs_per_worker (K) envs each, on the stand-in env of parallel_transport.py. The envs are seeded alike,
+so every K collects the same episodes, which is checked.
+
+    python3 benchmarks/envs_per_worker.py [--batch-size-run 8] [--k 1 2 4 8] [--env-steps 2000]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch
+from controllers import REGISTRY as mac_REGISTRY
+from envs import REGISTRY as env_REGISTRY
+from parallel_transport import StandInEnv
+from runners.parallel_runner import ParallelRunner
+from utils.logging import Logger
+
+
+def run(k, cfg):
+    env_args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], obs_dim=SC2_LIKE["obs_dim"],
+                    state_dim=SC2_LIKE["state_dim"], episode_limit=SC2_LIKE["episode_limit"], step_time=cfg.step_time)
+    args = SN(env="stand_in", env_args=env_args, batch_size_run=cfg.batch_size_run, envs_per_worker=k,
+              shared_transport=cfg.shared_transport, device="cpu", test_nepisode=cfg.batch_size_run,
+              runner_log_interval=10 ** 9, n_agents=env_args["n_agents"], n_actions=env_args["n_actions"],
+              obs_agent_id=True, obs_last_action=True, agent="rnn", rnn_hidden_dim=64, agent_output_type="q",
+              action_selector="epsilon_greedy", epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    runner = ParallelRunner(args, Logger(logging.getLogger("bench")))
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, SC2_LIKE["obs_dim"], SC2_LIKE["state_dim"])
+    th.manual_seed(0)
+    mac = mac_REGISTRY["basic_mac"](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+
+    batches, start = [], time.time()
+    while runner.t_env < cfg.env_steps:
+        with th.no_grad():
+            batches.append(runner.run(test_mode=False))
+    elapsed = time.time() - start
+    n_workers = len(runner.ps)
+    runner.close_env()
+    return batches, runner.t_env / elapsed, n_workers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=8)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--env-steps", type=int, default=2000)
+    parser.add_argument("--step-time", type=float, default=0.0)
+    parser.add_argument("--shared-transport", action="store_true")
+    cfg = parser.parse_args()
+    env_REGISTRY["stand_in"] = StandInEnv
+
+    print("{} envs, {} env steps, {}s per step, shared_transport={}".format(
+        cfg.batch_size_run, cfg.env_steps, cfg.step_time, cfg.shared_transport))
+    print("{:<6}{:>10}{:>16}".format("K", "workers", "env steps/s"))
+    reference = None
+    for k in cfg.k:
+        batches, steps_per_s, n_workers = run(k, cfg)
+        if reference is None:
+            reference = batches
+        for a, b in zip(reference, batches):
+            for key in a.data.transition_data:
+                assert th.equal(a[key], b[key]), key
+        print("{:<6}{:>10}{:>16.0f}".format(k, n_workers, steps_per_s))
+
+
+if __name__ == "__main__":
+    main()
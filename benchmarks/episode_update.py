@@ -0,0 +1,88 @@
+"""
+Per-step cost of writing runner data into an EpisodeBatch: EpisodeBatch.update with the lists the
+runners used to build, against EpisodeBatch.update_step with numpy arrays. The env data is made
+up front, so only the bookkeeping is timed. ReplayBuffer.update_step is checked to keep the episode lengths equal
+to the number of filled timesteps, with the same and with a different timestep for every episode.
+
+    python3 benchmarks/episode_update.py [--batch-size-run 1] [--steps 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch, ReplayBuffer
+
+
+def make_env_data(cfg):
+    # What SMAC returns: obs as a list of per-agent arrays, state and avail_actions as arrays
+    n_agents, n_actions = SC2_LIKE["n_agents"], SC2_LIKE["n_actions"]
+    return {
+        "state": np.random.randn(SC2_LIKE["state_dim"]).astype(np.float32),
+        "avail_actions": [[1] * n_actions for _ in range(n_agents)],
+        "obs": [np.random.randn(SC2_LIKE["obs_dim"]).astype(np.float32) for _ in range(n_agents)],
+        "actions": th.randint(0, n_actions, (cfg.batch_size_run, n_agents)),
+    }
+
+
+def run_update(batch, env, cfg, t):
+    n = cfg.batch_size_run
+    bs = list(range(n)) if n > 1 else slice(None)
+    batch.update({"state": [env["state"]] * n, "avail_actions": [env["avail_actions"]] * n, "obs": [env["obs"]] * n},
+                 bs=bs, ts=t)
+    batch.update({"actions": env["actions"].unsqueeze(1)}, bs=bs, ts=t, mark_filled=False)
+    batch.update({"reward": [(1.0,)] * n, "terminated": [(False,)] * n}, bs=bs, ts=t, mark_filled=False)
+
+
+def run_update_step(batch, env, cfg, t):
+    n = cfg.batch_size_run
+    bs = list(range(n)) if n > 1 else slice(None)
+    batch.update_step({"state": [env["state"]] * n, "avail_actions": [env["avail_actions"]] * n, "obs": [env["obs"]] * n},
+                      t, bs=bs)
+    batch.update_step({"actions": env["actions"].unsqueeze(1)}, t, bs=bs, mark_filled=False)
+    batch.update_step({"reward": [(1.0,)] * n, "terminated": [(False,)] * n}, t, bs=bs, mark_filled=False)
+
+
+def check_buffer_lengths(scheme, groups, preprocess, env, n=4, max_seq_length=20):
+    buffer = ReplayBuffer(scheme, groups, n, max_seq_length, preprocess=preprocess)
+    data = {"state": [env["state"]] * n, "avail_actions": [env["avail_actions"]] * n, "obs": [env["obs"]] * n}
+    for t in range(5):
+        buffer.update_step(data, t)
+        buffer.update_step({"reward": [(1.0,)] * n}, t, mark_filled=False)
+    # Episodes 1 and 3 go on to different lengths, one timestep each per call
+    rows = np.array([1, 3])
+    for t in range(5, 12):
+        buffer.update_step({k: v[:2] for k, v in data.items()}, th.tensor([t, min(t, 8)]), bs=rows)
+    assert (buffer.ep_lengths == buffer["filled"].sum((1, 2)).numpy()).all(), buffer.ep_lengths
+    assert buffer.ep_lengths.tolist() == [5, 12, 5, 9], buffer.ep_lengths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=1)
+    parser.add_argument("--steps", type=int, default=2000)
+    cfg = parser.parse_args()
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    env = make_env_data(cfg)
+    check_buffer_lengths(scheme, groups, preprocess, env)
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+
+    print("batch_size_run={} {}".format(cfg.batch_size_run, SC2_LIKE))
+    results = {}
+    for name, write in [("update", run_update), ("update_step", run_update_step)]:
+        batch = EpisodeBatch(scheme, groups, cfg.batch_size_run, max_seq_length, preprocess=preprocess)
+        start = time.perf_counter()
+        for step in range(cfg.steps):
+            write(batch, env, cfg, step % max_seq_length)
+        results[name] = (time.perf_counter() - start) / cfg.steps
+        results[name + "_batch"] = batch
+        print("{:<14}{:>10.1f} us / step".format(name, 1e6 * results[name]))
+    print("{:.1f}x faster".format(results["update"] / results["update_step"]))
+    for k in results["update_batch"].data.transition_data:
+        assert th.equal(results["update_batch"][k], results["update_step_batch"][k]), k
+
+
+if __name__ == "__main__":
+    main()
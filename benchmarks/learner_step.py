@@ -0,0 +1,79 @@
+"""
+Time per QLearner.train step on SMAC-sized random batches, for learner settings given as name=value overrides,
+e.g. with the agent inputs of the whole batch built once (learner_sequence_inputs=True, the default) against
+built at every timestep by each of the online and target macs:
+
+    python3 benchmarks/learner_step.py [--iterations 30] [--batch-size 32] [--settings learner_sequence_inputs=False ...]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import numpy as np
+import torch as th
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from controllers import REGISTRY as mac_REGISTRY
+from learners import REGISTRY as le_REGISTRY
+from utils.logging import Logger
+
+
+def make_learner(batch, groups, **settings):
+    args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], state_shape=SC2_LIKE["state_dim"],
+                obs_agent_id=True, obs_last_action=True, agent="rnn", rnn_hidden_dim=64, agent_output_type="q",
+                action_selector="epsilon_greedy", epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=1000,
+                mac="basic_mac", learner="q_learner", mixer="qmix", mixing_embed_dim=32, hypernet_layers=2,
+                hypernet_embed=64, double_q=True, gamma=0.99, lr=0.0005, optim_alpha=0.99, optim_eps=0.00001,
+                grad_norm_clip=10, target_update_interval=200, learner_log_interval=10 ** 9, device="cpu")
+    args.update(settings)
+    args = SN(**args)
+    th.manual_seed(0)
+    mac = mac_REGISTRY[args.mac](batch.scheme, groups, args)
+    return le_REGISTRY[args.learner](mac, batch.scheme, Logger(logging.getLogger("bench")), args)
+
+
+def time_train(learner, batch, iterations):
+    learner.train(batch, 0, 0)  # warm up
+    start = time.perf_counter()
+    for it in range(iterations):
+        learner.train(batch, it, it)
+    return 1000.0 * (time.perf_counter() - start) / iterations
+
+
+def parse_settings(text):
+    # "a=1,b=False" -> {"a": 1, "b": False}
+    settings = {}
+    for item in filter(None, text.split(",")):
+        name, value = item.split("=", 1)
+        try:
+            settings[name] = eval(value, {})
+        except (NameError, SyntaxError):
+            settings[name] = value
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--episode-limit", type=int, default=SC2_LIKE["episode_limit"])
+    parser.add_argument("--settings", nargs="+", default=["learner_sequence_inputs=False", "learner_sequence_inputs=True"],
+                        help="comma separated name=value overrides, one learner per entry")
+    cfg = parser.parse_args()
+
+    th.set_num_threads(1)
+    np.random.seed(0)
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    batch = random_episode_batch(scheme, groups, preprocess, cfg.batch_size, cfg.episode_limit,
+                                 SC2_LIKE["n_actions"], min_len=cfg.episode_limit)
+
+    print("batch of {} x {} timesteps, {} agents, 1 thread".format(cfg.batch_size, batch.max_seq_length,
+                                                                  SC2_LIKE["n_agents"]))
+    print("{:<60}{:>12}".format("settings", "ms / train"))
+    for text in cfg.settings:
+        learner = make_learner(batch, groups, **parse_settings(text))
+        print("{:<60}{:>12.1f}".format(text, time_train(learner, batch, cfg.iterations)))
+
+
+if __name__ == "__main__":
+    main()
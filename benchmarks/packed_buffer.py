@@ -0,0 +1,53 @@
+"""
+Memory held and sample time of the padded ReplayBuffer against PackedReplayBuffer when most
+episodes end well before episode_limit.
+
+    python3 benchmarks/packed_buffer.py [--buffer-size 500] [--mean-length 40]
+"""
+import argparse
+
+import torch as th
+from common import SC2_LIKE, make_scheme, random_episode_batch, timeit
+from components.episode_buffer import PackedReplayBuffer, ReplayBuffer
+
+
+def stored_mb(buffer):
+    return sum(stored for _, stored in buffer.field_bytes.values()) / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-size", type=int, default=500)
+    parser.add_argument("--mean-length", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=50)
+    cfg = parser.parse_args()
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+    # Episode lengths uniform in [mean_length / 2, 3 * mean_length / 2]
+    min_len, max_len = cfg.mean_length // 2, 3 * cfg.mean_length // 2
+    buffer_steps = cfg.buffer_size * (max_len + 1)
+
+    print("buffer_size={} episode lengths {}-{} {}".format(cfg.buffer_size, min_len, max_len, SC2_LIKE))
+    print("{:<10}{:>12}{:>16}".format("buffer", "stored MB", "sample ms"))
+    for name in ["padded", "packed"]:
+        th.manual_seed(0)
+        if name == "packed":
+            buffer = PackedReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, buffer_steps, preprocess=preprocess)
+        else:
+            buffer = ReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess)
+        for _ in range(cfg.buffer_size // 10):
+            buffer.insert_episode_batch(random_episode_batch(scheme, groups, preprocess, 10, max_len,
+                                                             SC2_LIKE["n_actions"], min_len=min_len))
+
+        def sample():
+            batch = buffer.sample(cfg.batch_size)
+            return batch[:, :batch.max_t_filled()]
+
+        print("{:<10}{:>12.1f}{:>16.3f}".format(name, stored_mb(buffer), 1000 * timeit(sample, cfg.repeats)))
+        del buffer
+
+
+if __name__ == "__main__":
+    main()
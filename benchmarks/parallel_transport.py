@@ -0,0 +1,107 @@
+"""
+Per-step cost of ParallelRunner with the env data sent through the pipes against written to shared
+memory (shared_transport=True), on a stand-in env with SMAC-sized observations so that only the
+runner and the transport are timed. Both modes collect the same episodes, which is checked.
+
+    python3 benchmarks/parallel_transport.py [--batch-size-run 4] [--episodes 4] [--obs-dim 132]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import numpy as np
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch
+from controllers import REGISTRY as mac_REGISTRY
+from envs import REGISTRY as env_REGISTRY
+from runners.parallel_runner import ParallelRunner
+from utils.logging import Logger
+
+
+class StandInEnv:
+    # Random observations of the size given, episodes end at random or at episode_limit.
+    # step_time seconds are spent waiting in every step, as for a game running in another process
+    def __init__(self, n_agents, n_actions, obs_dim, state_dim, episode_limit, seed=0, step_time=0.0):
+        self.n_agents, self.n_actions = n_agents, n_actions
+        self.obs_dim, self.state_dim = obs_dim, state_dim
+        self.episode_limit = episode_limit
+        self.rng = np.random.RandomState(seed)
+        self.step_time = step_time
+
+    def reset(self):
+        self.t = 0
+
+    def step(self, actions):
+        self.t += 1
+        if self.step_time > 0:
+            time.sleep(self.step_time)
+        terminated = self.rng.rand() < 0.01 or self.t == self.episode_limit
+        return float(self.rng.rand()), terminated, {"episode_limit": self.t == self.episode_limit} if terminated else {}
+
+    def get_obs(self):
+        return [self.rng.randn(self.obs_dim).astype(np.float32) for _ in range(self.n_agents)]
+
+    def get_state(self):
+        return self.rng.randn(self.state_dim).astype(np.float32)
+
+    def get_avail_actions(self):
+        return [[1] * self.n_actions for _ in range(self.n_agents)]
+
+    def get_env_info(self):
+        return {"state_shape": self.state_dim, "obs_shape": self.obs_dim, "n_actions": self.n_actions,
+                "n_agents": self.n_agents, "episode_limit": self.episode_limit}
+
+    def get_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def run(shared_transport, cfg):
+    env_args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], obs_dim=cfg.obs_dim,
+                    state_dim=SC2_LIKE["state_dim"], episode_limit=SC2_LIKE["episode_limit"])
+    args = SN(env="stand_in", env_args=env_args, batch_size_run=cfg.batch_size_run, shared_transport=shared_transport,
+              device="cpu", test_nepisode=cfg.batch_size_run, runner_log_interval=10 ** 9,
+              n_agents=env_args["n_agents"], n_actions=env_args["n_actions"], obs_agent_id=True, obs_last_action=True,
+              agent="rnn", rnn_hidden_dim=64, agent_output_type="q", action_selector="epsilon_greedy",
+              epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    runner = ParallelRunner(args, Logger(logging.getLogger("bench")))
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, cfg.obs_dim, env_args["state_dim"])
+    th.manual_seed(0)
+    # The controller needs the scheme after preprocessing (with actions_onehot), as run.py takes it from the buffer
+    mac = mac_REGISTRY["basic_mac"](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+
+    batches, steps, start = [], 0, time.time()
+    for _ in range(cfg.episodes):
+        batches.append(runner.run(test_mode=False))
+        steps += runner.t
+    elapsed = time.time() - start
+    runner.close_env()
+    return batches, 1000.0 * elapsed / steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=4)
+    parser.add_argument("--episodes", type=int, default=4)
+    parser.add_argument("--obs-dim", type=int, default=SC2_LIKE["obs_dim"])
+    cfg = parser.parse_args()
+    env_REGISTRY["stand_in"] = StandInEnv
+
+    print("{} envs x {} runs, obs_dim {}".format(cfg.batch_size_run, cfg.episodes, cfg.obs_dim))
+    pipe_batches, pipe_ms = run(False, cfg)
+    shared_batches, shared_ms = run(True, cfg)
+    for a, b in zip(pipe_batches, shared_batches):
+        for k in a.data.transition_data:
+            assert th.equal(a[k], b[k]), k
+    print("{:<10}{:>14}".format("transport", "ms per step"))
+    print("{:<10}{:>14.3f}".format("pipe", pipe_ms))
+    print("{:<10}{:>14.3f}".format("shared", shared_ms))
+
+
+if __name__ == "__main__":
+    main()
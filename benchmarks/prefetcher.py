@@ -0,0 +1,83 @@
+"""
+Time per training iteration (insert an episode, get a batch, learner.train) with batches sampled
+on the main loop against batches prefetched on a background thread by BatchPrefetcher.
+
+    python3 benchmarks/prefetcher.py [--iterations 100] [--depth 2]
+"""
+import argparse
+import logging
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from components.episode_buffer import ReplayBuffer
+from components.prefetcher import BatchPrefetcher
+from controllers import REGISTRY as mac_REGISTRY
+from learners import REGISTRY as le_REGISTRY
+from utils.logging import Logger
+
+
+def run(cfg, depth):
+    th.manual_seed(0)
+    device = "cuda" if th.cuda.is_available() else "cpu"
+    args = SN(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], state_shape=SC2_LIKE["state_dim"],
+              obs_agent_id=True, obs_last_action=True, agent="rnn", rnn_hidden_dim=64, agent_output_type="q",
+              action_selector="epsilon_greedy", epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=1000,
+              mac="basic_mac", learner="q_learner", mixer="vdn", double_q=True, gamma=0.99, lr=0.0005,
+              optim_alpha=0.99, optim_eps=0.00001, grad_norm_clip=10, target_update_interval=200,
+              learner_log_interval=10 ** 9, device=device)
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+    buffer = ReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess)
+    episodes = [random_episode_batch(scheme, groups, preprocess, 1, SC2_LIKE["episode_limit"], SC2_LIKE["n_actions"])
+                for _ in range(cfg.batch_size)]
+    for ep_batch in episodes:
+        buffer.insert_episode_batch(ep_batch)
+    mac = mac_REGISTRY[args.mac](buffer.scheme, groups, args)
+    learner = le_REGISTRY[args.learner](mac, buffer.scheme, Logger(logging.getLogger("bench")), args)
+    if device == "cuda":
+        learner.cuda()
+
+    prefetcher = None
+    if depth > 0:
+        prefetcher = BatchPrefetcher(lambda out: buffer.sample(cfg.batch_size, out=out), lambda: True, depth, device)
+    lock = nullcontext() if prefetcher is None else prefetcher.lock
+
+    start = time.perf_counter()
+    for it in range(cfg.iterations):
+        with lock:
+            buffer.insert_episode_batch(episodes[it % len(episodes)])
+        if prefetcher is not None:
+            batch = prefetcher.get()
+        else:
+            batch = buffer.sample(cfg.batch_size)
+            batch = batch[:, :batch.max_t_filled()]
+            batch.to(device)
+        learner.train(batch, it, it)
+    elapsed = (time.perf_counter() - start) / cfg.iterations
+    stats = {} if prefetcher is None else prefetcher.pop_stats()
+    if prefetcher is not None:
+        prefetcher.close()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--buffer-size", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    cfg = parser.parse_args()
+
+    print("{} {}".format("cuda" if th.cuda.is_available() else "cpu", SC2_LIKE))
+    print("{:<8}{:>14}{:>20}{:>18}".format("depth", "ms / iter", "learner wait ms", "starved"))
+    for depth in [0, cfg.depth]:
+        elapsed, stats = run(cfg, depth)
+        print("{:<8}{:>14.1f}{:>20.2f}{:>18.2f}".format(depth, 1000 * elapsed, stats.get("prefetch_wait_ms", float("nan")),
+                                                         stats.get("prefetch_starved", float("nan"))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Samples needed to reach a target test win rate with uniform and prioritized episode replay,
+on a small stand-in env that does not need StarCraft II.
+
+    python3 benchmarks/prioritized_replay.py [--seeds 3] [--target-win-rate 0.8]
+
+CueEnv: every agent observes a one-hot cue and has to pick the matching action. The team gets
+a reward of 1 and moves on while every agent is right, and the episode ends as soon as one of
+them is wrong. Surviving all episode_limit steps is a win, so long episodes are rare early on.
+"""
+import argparse
+import logging
+from functools import partial
+from types import SimpleNamespace as SN
+
+import numpy as np
+import torch as th
+from common import make_scheme
+from components.episode_buffer import EpisodeBatch, ReplayBuffer, PrioritizedReplayBuffer
+from controllers import REGISTRY as mac_REGISTRY
+from learners import REGISTRY as le_REGISTRY
+from utils.logging import Logger
+
+
+class CueEnv:
+    def __init__(self, n_agents=3, n_actions=5, episode_limit=10):
+        self.n_agents = n_agents
+        self.n_actions = n_actions
+        self.episode_limit = episode_limit
+
+    def reset(self):
+        self.t = 0
+        self.cues = np.random.randint(0, self.n_actions, size=self.n_agents)
+
+    def step(self, actions):
+        correct = all(int(a) == c for a, c in zip(actions, self.cues))
+        self.t += 1
+        self.cues = np.random.randint(0, self.n_actions, size=self.n_agents)
+        won = correct and self.t == self.episode_limit
+        return float(correct), (not correct) or won, {"battle_won": won}
+
+    def get_obs(self):
+        obs = np.zeros((self.n_agents, self.n_actions + 1), dtype=np.float32)
+        obs[np.arange(self.n_agents), self.cues] = 1
+        obs[:, -1] = self.t / self.episode_limit
+        return obs
+
+    def get_state(self):
+        return self.get_obs().reshape(-1)
+
+    def get_avail_actions(self):
+        return np.ones((self.n_agents, self.n_actions), dtype=np.int32)
+
+
+def run_episode(env, mac, new_batch, t_env, test_mode):
+    batch = new_batch()
+    env.reset()
+    mac.init_hidden(batch_size=1)
+    terminated, t, info = False, 0, {}
+    while not terminated:
+        batch.update({"state": [env.get_state()], "avail_actions": [env.get_avail_actions()], "obs": [env.get_obs()]}, ts=t)
+        actions = mac.select_actions(batch, t_ep=t, t_env=t_env, test_mode=test_mode)
+        reward, terminated, info = env.step(actions[0])
+        batch.update({"actions": actions, "reward": [(reward,)], "terminated": [(terminated,)]}, ts=t)
+        t += 1
+    batch.update({"state": [env.get_state()], "avail_actions": [env.get_avail_actions()], "obs": [env.get_obs()]}, ts=t)
+    batch.update({"actions": mac.select_actions(batch, t_ep=t, t_env=t_env, test_mode=test_mode)}, ts=t)
+    return batch, t, info.get("battle_won", False)
+
+
+def train_until(prioritized, seed, cfg):
+    np.random.seed(seed)
+    th.manual_seed(seed)
+    env = CueEnv(episode_limit=cfg.episode_limit)
+    args = SN(n_agents=env.n_agents, n_actions=env.n_actions, state_shape=env.n_agents * (env.n_actions + 1),
+              obs_agent_id=True, obs_last_action=True, agent="rnn", rnn_hidden_dim=32, agent_output_type="q",
+              action_selector="epsilon_greedy", epsilon_start=1.0, epsilon_finish=0.05,
+              epsilon_anneal_time=cfg.epsilon_anneal_time, mac="basic_mac", learner="q_learner", mixer="vdn", double_q=True, gamma=0.99, lr=0.0005,
+              optim_alpha=0.99, optim_eps=0.00001, grad_norm_clip=10, target_update_interval=200,
+              learner_log_interval=10 ** 9, device="cpu")
+    scheme, groups, preprocess = make_scheme(env.n_agents, env.n_actions, env.n_actions + 1, args.state_shape)
+    if prioritized:
+        buffer = PrioritizedReplayBuffer(scheme, groups, cfg.buffer_size, env.episode_limit + 1, alpha=0.6, beta=0.4,
+                                         t_max=cfg.max_episodes * env.episode_limit, preprocess=preprocess)
+    else:
+        buffer = ReplayBuffer(scheme, groups, cfg.buffer_size, env.episode_limit + 1, preprocess=preprocess)
+    new_batch = partial(EpisodeBatch, scheme, groups, 1, env.episode_limit + 1, preprocess=preprocess)
+    mac = mac_REGISTRY[args.mac](buffer.scheme, groups, args)
+    learner = le_REGISTRY[args.learner](mac, buffer.scheme, Logger(logging.getLogger("bench")), args)
+
+    t_env, sampled_episodes = 0, 0
+    for episode in range(1, cfg.max_episodes + 1):
+        batch, ep_len, _ = run_episode(env, mac, new_batch, t_env, test_mode=False)
+        t_env += ep_len
+        buffer.insert_episode_batch(batch)
+        if buffer.can_sample(cfg.batch_size):
+            sample = buffer.sample(cfg.batch_size, t_env) if prioritized else buffer.sample(cfg.batch_size)
+            sample = sample[:, :sample.max_t_filled()]
+            priorities = learner.train(sample, t_env, episode)
+            if prioritized:
+                buffer.update_priorities(sample["ep_ids"], priorities)
+            sampled_episodes += cfg.batch_size
+        if episode % cfg.test_interval == 0:
+            wins = sum(run_episode(env, mac, new_batch, t_env, test_mode=True)[2] for _ in range(cfg.test_nepisode))
+            if wins / cfg.test_nepisode >= cfg.target_win_rate:
+                return episode, t_env, sampled_episodes
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--target-win-rate", type=float, default=0.8)
+    parser.add_argument("--episode-limit", type=int, default=10)
+    parser.add_argument("--buffer-size", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-episodes", type=int, default=3000)
+    parser.add_argument("--test-interval", type=int, default=50)
+    parser.add_argument("--epsilon-anneal-time", type=int, default=500)
+    parser.add_argument("--test-nepisode", type=int, default=20)
+    cfg = parser.parse_args()
+
+    print("target test win rate {} on CueEnv(episode_limit={})".format(cfg.target_win_rate, cfg.episode_limit))
+    print("{:<12}{:>6}{:>10}{:>10}{:>18}".format("buffer", "seed", "episodes", "t_env", "sampled episodes"))
+    for prioritized in [False, True]:
+        name = "prioritized" if prioritized else "uniform"
+        for seed in range(cfg.seeds):
+            result = train_until(prioritized, seed, cfg)
+            if result is None:
+                print("{:<12}{:>6}  not reached in {} episodes".format(name, seed, cfg.max_episodes))
+            else:
+                print("{:<12}{:>6}{:>10}{:>10}{:>18}".format(name, seed, *result))
+
+
+if __name__ == "__main__":
+    main()
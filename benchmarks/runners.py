@@ -0,0 +1,69 @@
+"""
+Env steps per second of every runner on the synthetic env (envs/synthetic.py), which costs next to nothing
+per step unless --step-cost is given, so the runner's own overhead is what gets timed. Every runner is also
+checked to run envs that differ from each other although they are built from the same env_args (and seed).
+
+    python3 benchmarks/runners.py [--batch-size-run 8] [--env-steps 4000] [--step-cost 0.0]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch
+from controllers import REGISTRY as mac_REGISTRY
+from runners import REGISTRY as r_REGISTRY
+from utils.logging import Logger
+
+
+def run(runner_name, cfg):
+    batch_size_run = 1 if runner_name == "episode" else cfg.batch_size_run
+    env_args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], obs_shape=SC2_LIKE["obs_dim"],
+                    state_shape=SC2_LIKE["state_dim"], episode_limit=SC2_LIKE["episode_limit"],
+                    episode_length="geometric", mean_episode_length=SC2_LIKE["episode_limit"] // 2,
+                    step_cost=cfg.step_cost, avail_actions_sparsity=0.3, seed=0)
+    args = SN(env="synthetic", env_args=env_args, batch_size_run=batch_size_run, shared_transport=True,
+              envs_per_worker=1, device="cpu", test_nepisode=batch_size_run, runner_log_interval=10 ** 9,
+              n_agents=env_args["n_agents"], n_actions=env_args["n_actions"], obs_agent_id=True, obs_last_action=True,
+              agent="rnn", rnn_hidden_dim=64, agent_output_type="q", action_selector="epsilon_greedy",
+              epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    runner = r_REGISTRY[runner_name](args, Logger(logging.getLogger("bench")))
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, SC2_LIKE["obs_dim"], SC2_LIKE["state_dim"])
+    th.manual_seed(0)
+    mac = mac_REGISTRY["basic_mac"](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+
+    start = time.time()
+    while runner.t_env < cfg.env_steps:
+        with th.no_grad():
+            batch = runner.run(test_mode=False)
+        check_distinct_episodes(batch)
+    elapsed = time.time() - start
+    runner.close_env()
+    return runner.t_env / elapsed
+
+
+def check_distinct_episodes(batch):
+    # Rows of a batch run by different envs, they must not hold the same episode
+    first_obs = {batch["obs"][b, 0].numpy().tobytes() for b in range(batch.batch_size)}
+    assert len(first_obs) == batch.batch_size, "{} envs ran the same episodes".format(batch.batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=8)
+    parser.add_argument("--env-steps", type=int, default=4000)
+    parser.add_argument("--step-cost", type=float, default=0.0)
+    parser.add_argument("--runners", nargs="+", default=["episode", "parallel", "continuous", "vector", "thread", "async"])
+    cfg = parser.parse_args()
+
+    print("{} envs, {} env steps, {}s per step".format(cfg.batch_size_run, cfg.env_steps, cfg.step_cost))
+    print("{:<12}{:>16}".format("runner", "env steps/s"))
+    for runner_name in cfg.runners:
+        print("{:<12}{:>16.0f}".format(runner_name, run(runner_name, cfg)))
+
+
+if __name__ == "__main__":
+    main()
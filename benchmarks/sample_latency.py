@@ -0,0 +1,52 @@
+"""
+ReplayBuffer.sample() latency against batch size and buffer size, allocating a new batch every call
+(followed by the truncation run.py does) against gathering into the buffer's reused SampleOutput.
+
+    python3 benchmarks/sample_latency.py [--buffer-sizes 200,1000] [--batch-sizes 8,32,128]
+"""
+import argparse
+
+from common import SC2_LIKE, make_scheme, random_episode_batch, timeit
+from components.episode_buffer import ReplayBuffer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buffer-sizes", default="200,1000")
+    parser.add_argument("--batch-sizes", default="8,32,128")
+    parser.add_argument("--repeats", type=int, default=50)
+    cfg = parser.parse_args()
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+    ep_batches = [random_episode_batch(scheme, groups, preprocess, 10, SC2_LIKE["episode_limit"], SC2_LIKE["n_actions"])
+                  for _ in range(5)]
+
+    print(SC2_LIKE)
+    print("{:>12}{:>12}{:>16}{:>16}".format("buffer_size", "batch_size", "allocating ms", "reused ms"))
+    for buffer_size in map(int, cfg.buffer_sizes.split(",")):
+        buffer = ReplayBuffer(scheme, groups, buffer_size, max_seq_length, preprocess=preprocess, reuse_sample_output=True)
+        for i in range(buffer_size // 10):
+            buffer.insert_episode_batch(ep_batches[i % len(ep_batches)])
+        for batch_size in map(int, cfg.batch_sizes.split(",")):
+            if batch_size > buffer_size:
+                continue
+
+            def allocating():
+                batch = buffer.sample(batch_size)
+                return batch[:, :batch.max_t_filled()]
+
+            def reused():
+                return buffer.sample(batch_size)
+
+            # Without a SampleOutput the buffer falls back to __getitem__
+            sample_output, buffer.sample_output = buffer.sample_output, None
+            allocating_ms = 1000 * timeit(allocating, cfg.repeats)
+            buffer.sample_output = sample_output
+            reused_ms = 1000 * timeit(reused, cfg.repeats)
+            print("{:>12}{:>12}{:>16.3f}{:>16.3f}".format(buffer_size, batch_size, allocating_ms, reused_ms))
+        del buffer
+
+
+if __name__ == "__main__":
+    main()
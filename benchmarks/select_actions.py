@@ -0,0 +1,58 @@
+"""
+Latency of BasicMAC.select_actions, which runs under inference mode on the rows of the envs still running only,
+against the previous path, which ran forward on the whole batch with autograd on and then kept the rows asked for,
+as fewer and fewer envs of the batch are still running.
+
+    python3 benchmarks/select_actions.py [--batch-size-run 32] [--active 32 16 8 1] [--steps 300]
+"""
+import argparse
+import time
+from types import SimpleNamespace as SN
+
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from controllers import REGISTRY as mac_REGISTRY
+
+
+def full_batch_select(mac, batch, t, t_env, bs):
+    # select_actions before the inference mode path
+    avail_actions = batch["avail_actions"][:, t]
+    agent_outputs = mac.forward(batch, t)
+    return mac.action_selector.select_action(agent_outputs[bs], avail_actions[bs], t_env)
+
+
+def time_steps(select, mac, batch, bs, steps):
+    mac.init_hidden(batch.batch_size)
+    start = time.perf_counter()
+    for t in range(steps):
+        select(mac, batch, t % batch.max_seq_length, t, bs)
+    return 1000.0 * (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=32)
+    parser.add_argument("--active", type=int, nargs="+", default=[32, 16, 8, 1])
+    parser.add_argument("--steps", type=int, default=300)
+    cfg = parser.parse_args()
+
+    n_agents, n_actions = SC2_LIKE["n_agents"], SC2_LIKE["n_actions"]
+    scheme, groups, preprocess = make_scheme(n_agents, n_actions, SC2_LIKE["obs_dim"], SC2_LIKE["state_dim"])
+    batch = random_episode_batch(scheme, groups, preprocess, cfg.batch_size_run, SC2_LIKE["episode_limit"], n_actions,
+                                 min_len=SC2_LIKE["episode_limit"])
+    args = SN(n_agents=n_agents, n_actions=n_actions, obs_agent_id=True, obs_last_action=True, agent="rnn",
+              rnn_hidden_dim=64, agent_output_type="q", action_selector="epsilon_greedy", epsilon_start=1.0,
+              epsilon_finish=0.05, epsilon_anneal_time=50000)
+    mac = mac_REGISTRY["basic_mac"](batch.scheme, groups, args)
+
+    print("{} envs, {} agents, ms per select_actions".format(cfg.batch_size_run, n_agents))
+    print("{:<14}{:>12}{:>12}".format("active envs", "previous", "rollout"))
+    for active in cfg.active:
+        bs = list(range(active))
+        previous = time_steps(full_batch_select, mac, batch, bs, cfg.steps)
+        rollout = time_steps(lambda m, b, t, t_env, rows: m.select_actions(b, t, t_env, bs=rows),
+                             mac, batch, bs, cfg.steps)
+        print("{:<14}{:>12.3f}{:>12.3f}".format(active, previous, rollout))
+
+
+if __name__ == "__main__":
+    main()
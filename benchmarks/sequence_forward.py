@@ -0,0 +1,91 @@
+"""
+QLearner updates per second against the length of the sampled episodes, with the agents unrolled over the batch
+by BasicMAC.forward_sequence (fc1 and fc2 over all timesteps at once, the recurrence in nn.GRU) against a
+forward call (one GRU step) per timestep as before. Both unrolls are checked to agree, also on copies of the agent
+made with deepcopy and .to(), and on an agent loaded from a model saved when the GRU was a GRUCell.
+
+    python3 benchmarks/sequence_forward.py [--lengths 25 50 100 150] [--batch-size 32] [--iterations 10]
+"""
+import argparse
+import copy
+from types import SimpleNamespace as SN
+
+import numpy as np
+import torch as th
+import torch.nn as nn
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from controllers import REGISTRY as mac_REGISTRY
+from controllers.basic_controller import BasicMAC
+from learner_step import make_learner, time_train
+from modules.agents.rnn_agent import RNNAgent
+
+
+class StepLoopMAC(BasicMAC):
+    # forward_sequence as the learners ran it before, one forward call per timestep
+    def forward_sequence(self, ep_batch, inputs=None, max_t=None, test_mode=False, return_hidden_states=False):
+        max_t = ep_batch.max_seq_length if max_t is None else max_t
+        agent_outs, hidden_states = [], []
+        for t in range(max_t):
+            agent_outs.append(self.forward(ep_batch, t=t, test_mode=test_mode, inputs=inputs))
+            hidden_states.append(self.hidden_states.view(ep_batch.batch_size, self.n_agents, -1))
+        if return_hidden_states:
+            return th.stack(agent_outs, dim=1), th.stack(hidden_states, dim=1)
+        return th.stack(agent_outs, dim=1)
+
+
+def check_agent_copies(timesteps=20, n=16, input_shape=40):
+    args = SN(rnn_hidden_dim=64, n_actions=SC2_LIKE["n_actions"])
+    agent = RNNAgent(input_shape, args)
+    devices = [th.float64] + (["cuda"] if th.cuda.is_available() else [])
+    for copied in [copy.deepcopy(agent)] + [copy.deepcopy(agent).to(device) for device in devices]:
+        weight = copied.fc1.weight
+        inputs, h = th.randn(timesteps, n, input_shape).to(weight), th.zeros(n, args.rnn_hidden_dim).to(weight)
+        with th.no_grad():
+            q, hs = copied.forward_sequence(inputs, h)
+            for t in range(timesteps):
+                q_t, h = copied(inputs[t], h)
+                assert th.allclose(q[t], q_t, atol=1e-5) and th.allclose(hs[t], h, atol=1e-5)
+
+    # Agents saved with an nn.GRUCell as rnn load into the nn.GRU
+    cell = nn.GRUCell(args.rnn_hidden_dim, args.rnn_hidden_dim)
+    state = {k: v for k, v in agent.state_dict().items() if not k.startswith("rnn.")}
+    state.update({"rnn." + k: v for k, v in cell.state_dict().items()})
+    loaded = RNNAgent(input_shape, args)
+    loaded.load_state_dict(state)
+    x, h = th.randn(n, args.rnn_hidden_dim), th.randn(n, args.rnn_hidden_dim)
+    with th.no_grad():
+        assert th.allclose(loaded.rnn(x.unsqueeze(0), h.unsqueeze(0))[0][0], cell(x, h), atol=1e-6)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[25, 50, 100, 150])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=10)
+    cfg = parser.parse_args()
+    mac_REGISTRY["step_loop_mac"] = StepLoopMAC
+
+    th.set_num_threads(1)
+    np.random.seed(0)
+    check_agent_copies()
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    print("batches of {} episodes, {} agents, 1 thread, learner updates/s".format(cfg.batch_size, SC2_LIKE["n_agents"]))
+    print("{:<10}{:>12}{:>12}{:>10}".format("timesteps", "step loop", "sequence", "speedup"))
+    for length in cfg.lengths:
+        batch = random_episode_batch(scheme, groups, preprocess, cfg.batch_size, length, SC2_LIKE["n_actions"],
+                                     min_len=length)
+        loop_learner = make_learner(batch, groups, mac="step_loop_mac")
+        seq_learner = make_learner(batch, groups)
+        for mac in [loop_learner.mac, seq_learner.mac]:
+            mac.init_hidden(batch.batch_size)
+        with th.no_grad():
+            assert th.allclose(loop_learner.mac.forward_sequence(batch), seq_learner.mac.forward_sequence(batch),
+                               atol=1e-5)
+        loop_ms = time_train(loop_learner, batch, cfg.iterations)
+        seq_ms = time_train(seq_learner, batch, cfg.iterations)
+        print("{:<10}{:>12.2f}{:>12.2f}{:>10.2f}".format(batch.max_seq_length, 1000 / loop_ms, 1000 / seq_ms,
+                                                         loop_ms / seq_ms))
+
+
+if __name__ == "__main__":
+    main()
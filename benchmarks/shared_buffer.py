@@ -0,0 +1,88 @@
+"""
+Episodes per second that actor processes get into the replay buffer: sent through a Pipe to the main
+process that owns a ReplayBuffer (how ParallelRunner collects them), against written straight into a
+SharedReplayBuffer by the actors while the main process samples from it.
+
+    python3 benchmarks/shared_buffer.py [--actors 2] [--episodes 100] [--start-method fork]
+"""
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+import torch as th
+from common import SC2_LIKE, make_scheme, random_episode_batch
+from components.episode_buffer import EpisodeBatch, ReplayBuffer, SharedReplayBuffer
+
+
+def pipe_actor(conn, episode, n_episodes):
+    for _ in range(n_episodes):
+        conn.send({k: v.numpy() for k, v in episode.data.transition_data.items()})
+    conn.send(None)
+
+
+def shared_actor(buffer, episode, n_episodes):
+    for _ in range(n_episodes):
+        buffer.insert_episode_batch(episode)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--actors", type=int, default=2)
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--buffer-size", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--start-method", default="fork")
+    cfg = parser.parse_args()
+    # SharedReplayBuffer creates its lock with the default context
+    mp.set_start_method(cfg.start_method)
+
+    scheme, groups, preprocess = make_scheme(**SC2_LIKE)
+    max_seq_length = SC2_LIKE["episode_limit"] + 1
+    episode = random_episode_batch(scheme, groups, preprocess, 1, SC2_LIKE["episode_limit"], SC2_LIKE["n_actions"])
+    total = cfg.actors * cfg.episodes
+    print("{} actors x {} episodes {}".format(cfg.actors, cfg.episodes, SC2_LIKE))
+
+    buffer = ReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess)
+    conns, ps = [], []
+    for _ in range(cfg.actors):
+        parent_conn, child_conn = mp.Pipe()
+        conns.append(parent_conn)
+        ps.append(mp.Process(target=pipe_actor, args=(child_conn, episode, cfg.episodes), daemon=True))
+    start = time.perf_counter()
+    for p in ps:
+        p.start()
+    open_conns = list(conns)
+    while open_conns:
+        for conn in list(open_conns):
+            data = conn.recv()
+            if data is None:
+                open_conns.remove(conn)
+                continue
+            ep_batch = EpisodeBatch(scheme, groups, 1, max_seq_length, preprocess=preprocess)
+            ep_batch.update({k: th.from_numpy(v) for k, v in data.items() if k != "actions_onehot"})
+            buffer.insert_episode_batch(ep_batch)
+    elapsed = time.perf_counter() - start
+    print("{:<8}{:>12.0f} episodes/s".format("pipe", total / elapsed))
+    del buffer
+
+    buffer = SharedReplayBuffer(scheme, groups, cfg.buffer_size, max_seq_length, preprocess=preprocess)
+    ps = [mp.Process(target=shared_actor, args=(buffer, episode, cfg.episodes), daemon=True) for _ in range(cfg.actors)]
+    start = time.perf_counter()
+    for p in ps:
+        p.start()
+    n_samples = 0
+    while any(p.is_alive() for p in ps):
+        if buffer.can_sample(cfg.batch_size):
+            buffer.sample(cfg.batch_size)
+            n_samples += 1
+        else:
+            time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    print("{:<8}{:>12.0f} episodes/s ({} batches sampled meanwhile)".format("shared", total / elapsed, n_samples))
+    assert buffer.episodes_in_buffer == min(total, cfg.buffer_size)
+    assert np.all(buffer.ep_lengths[buffer.committed] == int(episode["filled"].sum()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Env steps per second of the thread runner against the parallel runner, with the stand-in env of
+parallel_transport.py waiting step_time seconds per step with the GIL released, as for a game behind a socket.
+Startup (processes or threads, and the envs) is timed separately. Both runners collect the same episodes,
+which is checked.
+
+    python3 benchmarks/thread_runner.py [--batch-size-run 8] [--env-steps 3000] [--step-time 0.002]
+"""
+import argparse
+import logging
+import time
+from types import SimpleNamespace as SN
+
+import torch as th
+from common import SC2_LIKE, make_scheme
+from components.episode_buffer import EpisodeBatch
+from controllers import REGISTRY as mac_REGISTRY
+from envs import REGISTRY as env_REGISTRY
+from parallel_transport import StandInEnv
+from runners import REGISTRY as r_REGISTRY
+from utils.logging import Logger
+
+
+def run(runner_name, cfg):
+    env_args = dict(n_agents=SC2_LIKE["n_agents"], n_actions=SC2_LIKE["n_actions"], obs_dim=SC2_LIKE["obs_dim"],
+                    state_dim=SC2_LIKE["state_dim"], episode_limit=SC2_LIKE["episode_limit"], step_time=cfg.step_time)
+    args = SN(env="stand_in", env_args=env_args, batch_size_run=cfg.batch_size_run, shared_transport=True,
+              envs_per_worker=1, env_threads=cfg.env_threads, device="cpu", test_nepisode=cfg.batch_size_run,
+              runner_log_interval=10 ** 9, n_agents=env_args["n_agents"], n_actions=env_args["n_actions"],
+              obs_agent_id=True, obs_last_action=True, agent="rnn", rnn_hidden_dim=64, agent_output_type="q",
+              action_selector="epsilon_greedy", epsilon_start=1.0, epsilon_finish=0.05, epsilon_anneal_time=50000)
+    start = time.time()
+    runner = r_REGISTRY[runner_name](args, Logger(logging.getLogger("bench")))
+    startup = time.time() - start
+    scheme, groups, preprocess = make_scheme(args.n_agents, args.n_actions, SC2_LIKE["obs_dim"], SC2_LIKE["state_dim"])
+    th.manual_seed(0)
+    mac = mac_REGISTRY["basic_mac"](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+    runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+
+    batches, start = [], time.time()
+    while runner.t_env < cfg.env_steps:
+        with th.no_grad():
+            batches.append(runner.run(test_mode=False))
+    elapsed = time.time() - start
+    runner.close_env()
+    return batches, runner.t_env / elapsed, startup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size-run", type=int, default=8)
+    parser.add_argument("--env-steps", type=int, default=3000)
+    parser.add_argument("--step-time", type=float, default=0.002)
+    parser.add_argument("--env-threads", type=int, default=0)
+    cfg = parser.parse_args()
+    env_REGISTRY["stand_in"] = StandInEnv
+
+    print("{} envs, {} env steps, {}s per step".format(cfg.batch_size_run, cfg.env_steps, cfg.step_time))
+    print("{:<10}{:>16}{:>14}".format("runner", "env steps/s", "startup (s)"))
+    reference = None
+    for runner_name in ["parallel", "thread"]:
+        batches, steps_per_s, startup = run(runner_name, cfg)
+        if reference is None:
+            reference = batches
+        for a, b in zip(reference, batches):
+            for k in a.data.transition_data:
+                assert th.equal(a[k], b[k]), k
+        print("{:<10}{:>16.0f}{:>14.3f}".format(runner_name, steps_per_s, startup))
+
+
+if __name__ == "__main__":
+    main()
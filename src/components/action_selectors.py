@@ -1,9 +1,38 @@
 import torch as th
 from torch.distributions import Categorical
 from .epsilon_schedules import DecayThenFlatSchedule
+from utils.th_utils import inference_mode
 
 REGISTRY = {}
 
+
+class StepBuffers:
+    """
+    Tensors an action selector writes into at every step instead of allocating new ones, each kept at the largest
+    number of rows seen so far and sliced to the rows of the call.
+    """
+    def __init__(self):
+        self.tensors = {}
+
+    def get(self, name, shape, dtype, device):
+        tensor = self.tensors.get(name)
+        if tensor is None or tensor.shape[0] < shape[0] or tensor.shape[1:] != shape[1:] \
+                or tensor.dtype != dtype or tensor.device != device:
+            # Not an inference tensor, so the buffers can also be written outside of select_actions
+            with inference_mode(False):
+                tensor = th.empty(shape, dtype=dtype, device=device)
+            self.tensors[name] = tensor
+        return tensor[:shape[0]]
+
+    def masked(self, name, values, mask, fill):
+        # values.masked_fill(mask, fill), written into the buffer name
+        out = self.get(name, values.shape, values.dtype, values.device)
+        return out.copy_(values.detach()).masked_fill_(mask, fill)
+
+    def unavailable(self, avail_actions):
+        # avail_actions == 0
+        return th.eq(avail_actions, 0, out=self.get("unavailable", avail_actions.shape, th.bool, avail_actions.device))
+
 # 动作挑选器
 class MultinomialActionSelector():
 
@@ -14,10 +43,10 @@ class MultinomialActionSelector():
                                               decay="linear")
         self.epsilon = self.schedule.eval(0)
         self.test_greedy = getattr(args, "test_greedy", True)
+        self.buffers = StepBuffers()
 
     def select_action(self, agent_inputs, avail_actions, t_env, test_mode=False):
-        masked_policies = agent_inputs.clone()
-        masked_policies[avail_actions == 0.0] = 0.0
+        masked_policies = self.buffers.masked("policies", agent_inputs, self.buffers.unavailable(avail_actions), 0.0)
 
         self.epsilon = self.schedule.eval(t_env)
 
@@ -40,6 +69,7 @@ class EpsilonGreedyActionSelector():
         self.schedule = DecayThenFlatSchedule(args.epsilon_start, args.epsilon_finish, args.epsilon_anneal_time,
                                               decay="linear")
         self.epsilon = self.schedule.eval(0)
+        self.buffers = StepBuffers()
 
     def select_action(self, agent_inputs, avail_actions, t_env, test_mode=False):
 
@@ -51,14 +81,21 @@ class EpsilonGreedyActionSelector():
             self.epsilon = 0.0
 
         # mask actions that are excluded from selection
-        masked_q_values = agent_inputs.clone()
-        masked_q_values[avail_actions == 0.0] = -float("inf")  # should never be selected!
-
-        random_numbers = th.rand_like(agent_inputs[:, :, 0])
-        pick_random = (random_numbers < self.epsilon).long()
-        random_actions = Categorical(avail_actions.float()).sample().long()
-
-        picked_actions = pick_random * random_actions + (1 - pick_random) * masked_q_values.max(dim=2)[1]
+        # 每一步都写进同一块缓冲区，不再每步新分配Q值和mask
+        buffers, device = self.buffers, agent_inputs.device
+        masked_q_values = buffers.masked("q_values", agent_inputs, buffers.unavailable(avail_actions),
+                                         -float("inf"))  # should never be selected!
+
+        rows = agent_inputs.shape[:2]
+        random_numbers = buffers.get("random_numbers", rows, agent_inputs.dtype, device).uniform_()
+        pick_random = th.lt(random_numbers, self.epsilon, out=buffers.get("pick_random", rows, th.bool, device))
+        avail_probs = buffers.get("avail_probs", avail_actions.shape, th.float, device).copy_(avail_actions)
+        random_actions = Categorical(avail_probs, validate_args=False).sample().long()
+
+        max_out = (buffers.get("max_q_values", rows, agent_inputs.dtype, device),
+                   buffers.get("greedy_actions", rows, th.long, device))
+        greedy_actions = th.max(masked_q_values, dim=2, out=max_out)[1]
+        picked_actions = th.where(pick_random, random_actions, greedy_actions)
         return picked_actions
 
 
@@ -0,0 +1,129 @@
+import multiprocessing as mp
+from types import SimpleNamespace as SN
+
+import numpy as np
+import torch as th
+
+from utils.logging import QueueLogger, log_queued_stats
+
+
+# learner把最新的参数写进共享内存，actor进程每个episode开始前检查一下版本号，有新的就拷贝过去
+class SharedWeights:
+    """
+    A copy of a module's parameters in shared memory, together with the number of learner updates they come from
+    (their version). The learner publish()es, actors pull() whenever a newer version is out.
+    """
+    def __init__(self, module):
+        self.tensors = {k: v.detach().to("cpu").clone().share_memory_() for k, v in module.state_dict().items()}
+        self.version_value = mp.Value("q", 0)
+
+    @property
+    def version(self):
+        return self.version_value.value
+
+    def publish(self, module, version):
+        with self.version_value.get_lock():
+            for k, v in module.state_dict().items():
+                self.tensors[k].copy_(v)
+            self.version_value.value = version
+
+    def pull(self, module, have_version):
+        # Loads the shared parameters into module if they are newer than have_version, returns their version
+        if self.version <= have_version:
+            return have_version
+        with self.version_value.get_lock():
+            module.load_state_dict(self.tensors)
+            return self.version_value.value
+
+
+class ActorPool:
+    """
+    actor_processes processes that each run their own runner and agent copy on the CPU and insert every episode they
+    collect into a SharedReplayBuffer while the learner trains from it. t_env and the number of episodes inserted
+    are counted over all actors. Runner stats reach the main process through a queue and are logged by drain().
+    """
+    def __init__(self, args, buffer, scheme, groups, preprocess, mac):
+        self.weights = SharedWeights(mac.agent)
+        self.t_env_value = mp.Value("q", 0)
+        self.episodes_value = mp.Value("q", 0)
+        self.stop_event = mp.Event()
+        self.stats_queue = mp.Queue()
+
+        actor_args = SN(**vars(args))
+        actor_args.device = "cpu"
+        actor_args.use_cuda = False
+        self.ps = [mp.Process(target=actor_worker, args=(actor_args, i, buffer, scheme, groups, preprocess, self.weights,
+                                                         self.t_env_value, self.episodes_value, self.stop_event,
+                                                         self.stats_queue))
+                   for i in range(args.actor_processes)]
+        for p in self.ps:
+            p.start()
+
+    @property
+    def t_env(self):
+        return self.t_env_value.value
+
+    @property
+    def episodes(self):
+        return self.episodes_value.value
+
+    def publish(self, mac, version):
+        self.weights.publish(mac.agent, version)
+
+    def drain(self, logger):
+        # Logs the stats the actors sent since the last call, errors of an actor are raised again here
+        log_queued_stats(self.stats_queue, logger)
+
+    def close(self, logger):
+        self.stop_event.set()
+        # A process only exits once everything it put on stats_queue has been read
+        for p in self.ps:
+            while p.is_alive():
+                self.drain(logger)
+                p.join(timeout=0.1)
+        self.drain(logger)
+
+
+def actor_worker(args, actor_id, buffer, scheme, groups, preprocess, weights, t_env_value, episodes_value,
+                 stop_event, stats_queue):
+    # Imported here, the actor builds its own runner (and envs) and agent
+    import traceback
+    from controllers import REGISTRY as mac_REGISTRY
+    from runners import REGISTRY as r_REGISTRY
+
+    try:
+        th.set_num_threads(1)
+        # Forked actors start from the same RNG states and env seed, without their own they collect the same episodes
+        th.manual_seed(args.seed + actor_id)
+        np.random.seed(args.seed + actor_id)
+        args.env_args = dict(args.env_args, seed=args.seed + actor_id * args.batch_size_run)
+        logger = QueueLogger(stats_queue)
+        runner = r_REGISTRY[args.runner](args=args, logger=logger)
+        mac = mac_REGISTRY[args.mac](buffer.scheme, groups, args)
+        runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+        version = weights.pull(mac.agent, -1)
+
+        lags, log_t = [], -args.runner_log_interval - 1
+        while not stop_event.is_set():
+            version = weights.pull(mac.agent, version)
+            # Epsilon schedules and logging follow the steps of all actors
+            runner.t_env = t_env_before = t_env_value.value
+            with th.no_grad():
+                episode_batch = runner.run(test_mode=False)
+            buffer.insert_episode_batch(episode_batch)
+
+            steps = runner.t_env - t_env_before
+            with t_env_value.get_lock():
+                t_env_value.value += steps
+                t_env = t_env_value.value
+            with episodes_value.get_lock():
+                episodes_value.value += episode_batch.batch_size
+
+            # Learner updates made while the episodes were being collected
+            lags.append(weights.version - version)
+            if t_env - log_t >= args.runner_log_interval:
+                logger.log_stat("policy_lag", sum(lags) / len(lags), t_env)
+                lags, log_t = [], t_env
+        runner.close_env()
+    except Exception:
+        stats_queue.put(("error", traceback.format_exc(), 0))
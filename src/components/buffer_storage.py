@@ -0,0 +1,74 @@
+import json
+import os
+import numpy as np
+import torch as th
+
+
+# numpy equivalents of the dtypes used in schemes
+NP_DTYPES = {
+    th.float32: np.float32,
+    th.float16: np.float16,
+    th.float64: np.float64,
+    th.int64: np.int64,
+    th.int32: np.int32,
+    th.int16: np.int16,
+    th.uint8: np.uint8,
+    th.bool: np.bool_,
+}
+
+
+class MemoryStorage:
+    """
+    Default backend: every field is a tensor in RAM (or VRAM)
+    """
+    def alloc(self, name, shape, dtype, device):
+        return th.zeros(shape, dtype=dtype, device=device)
+
+    def close(self):
+        pass
+
+
+class SharedMemoryStorage:
+    """
+    Every field is a CPU tensor in shared memory, so processes forked from (or handed the buffer by) the one
+    that built it read and write the same memory
+    """
+    def alloc(self, name, shape, dtype, device):
+        assert str(device) == "cpu", "The shared buffer backend can only be used with buffer_cpu_only=True"
+        return th.zeros(shape, dtype=dtype).share_memory_()
+
+    def close(self):
+        pass
+
+
+class MemmapStorage:
+    """
+    Keeps every field in its own numpy memmap file under `directory`.
+    The layout (file, shape, dtype of each field) is fixed by the scheme and written to layout.json.
+    Tensors returned by alloc share memory with the file, so the buffer only holds in RAM the pages
+    the OS decides to cache; indexing a sample out of it copies just the sampled episodes.
+    """
+    def __init__(self, directory, remove_on_close=True):
+        self.directory = directory
+        self.remove_on_close = remove_on_close
+        self.layout = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def alloc(self, name, shape, dtype, device):
+        assert str(device) == "cpu", "The memmap buffer backend can only be used with buffer_cpu_only=True"
+        file_name = "{}.dat".format(name)
+        array = np.memmap(os.path.join(self.directory, file_name), dtype=NP_DTYPES[dtype], mode="w+", shape=tuple(shape))
+        self.layout[name] = {"file": file_name, "shape": list(shape), "dtype": np.dtype(NP_DTYPES[dtype]).name}
+        with open(os.path.join(self.directory, "layout.json"), "w") as f:
+            json.dump(self.layout, f, indent=2)
+        return th.from_numpy(array)
+
+    def close(self):
+        if self.remove_on_close:
+            for info in self.layout.values():
+                os.remove(os.path.join(self.directory, info["file"]))
+            os.remove(os.path.join(self.directory, "layout.json"))
+            if not os.listdir(self.directory):
+                os.rmdir(self.directory)
+            self.layout = {}
+
@@ -0,0 +1,78 @@
+import torch as th
+
+
+# Storage codecs change how a replay buffer field is kept in memory. They work on the last dimension of the
+# field, encode when data is written to the buffer and decode when it is read back, so the learner sees the
+# same tensors as without them.
+class Codec:
+    # Derived codecs store nothing and rebuild the field from the field named by source
+    source = None
+
+    def encode(self, tensor):
+        raise NotImplementedError
+
+    def decode(self, tensor):
+        raise NotImplementedError
+
+    def infer_storage_info(self, vshape_in, dtype_in):
+        raise NotImplementedError
+
+
+class Float16Codec(Codec):
+    def encode(self, tensor):
+        return tensor.half()
+
+    def decode(self, tensor):
+        return tensor.float()
+
+    def infer_storage_info(self, vshape_in, dtype_in):
+        return vshape_in, th.float16
+
+
+# Maps [low, high] affinely onto the 256 levels of a uint8, values outside the range are clipped
+class AffineUint8Codec(Codec):
+    def __init__(self, low=-1.0, high=1.0):
+        self.low = low
+        self.scale = (high - low) / 255.0
+
+    def encode(self, tensor):
+        return ((tensor.float() - self.low) / self.scale).round_().clamp_(0, 255).byte()
+
+    def decode(self, tensor):
+        return tensor.float() * self.scale + self.low
+
+    def infer_storage_info(self, vshape_in, dtype_in):
+        return vshape_in, th.uint8
+
+
+# Packs a 0/1 mask (e.g. avail_actions) into 8 entries per byte
+class BitPackCodec(Codec):
+    def __init__(self, n_bits):
+        self.n_bits = n_bits
+        self.n_bytes = (n_bits + 7) // 8
+        self.bit_values = th.tensor([128, 64, 32, 16, 8, 4, 2, 1], dtype=th.uint8)
+
+    def encode(self, tensor):
+        bits = tensor.new_zeros(*tensor.shape[:-1], self.n_bytes * 8, dtype=th.uint8)
+        bits[..., :self.n_bits] = tensor != 0
+        bits = bits.view(*tensor.shape[:-1], self.n_bytes, 8) * self.bit_values.to(tensor.device)
+        return bits.sum(dim=-1).byte()
+
+    def decode(self, tensor):
+        bits = (tensor.unsqueeze(-1) & self.bit_values.to(tensor.device)) != 0
+        return bits.view(*tensor.shape[:-1], self.n_bytes * 8)[..., :self.n_bits]
+
+    def infer_storage_info(self, vshape_in, dtype_in):
+        return (self.n_bytes,), th.uint8
+
+
+# Rebuilds a preprocessed field (e.g. actions_onehot) from its source field on read instead of storing it
+class DerivedCodec(Codec):
+    def __init__(self, source, transforms):
+        self.source = source
+        self.transforms = transforms
+
+    def decode(self, tensor):
+        for transform in self.transforms:
+            tensor = transform.transform(tensor)
+        return tensor
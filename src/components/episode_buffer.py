@@ -1,6 +1,11 @@
+import json
+import multiprocessing as mp
+import os
 import torch as th
 import numpy as np
 from types import SimpleNamespace as SN
+from .buffer_storage import MemoryStorage, SharedMemoryStorage, NP_DTYPES
+from .sum_tree import SumTree
 
 
 class EpisodeBatch:
@@ -25,6 +30,8 @@ class EpisodeBatch:
         # 对action的预处理器
         self.preprocess = {} if preprocess is None else preprocess
         self.device = device
+        # field -> (tensor, is a transition field, shape of one entry, numpy view if on the CPU), see update_step
+        self._step_fields = {}
 
         if data is not None:
             self.data = data
@@ -84,9 +91,25 @@ class EpisodeBatch:
 
             # 注意看63行，决定设置episode_data还是transition_data
             if episode_const:
-                self.data.episode_data[field_key] = th.zeros((batch_size, *shape), dtype=dtype, device=self.device)
+                self.data.episode_data[field_key] = self._alloc("episode_data", field_key, (batch_size, *shape), dtype)
             else:
-                self.data.transition_data[field_key] = th.zeros((batch_size, max_seq_length, *shape), dtype=dtype, device=self.device)
+                self.data.transition_data[field_key] = self._alloc("transition_data", field_key, (batch_size, max_seq_length, *shape), dtype)
+
+    @classmethod
+    def from_data(cls, scheme, groups, batch_size, max_seq_length, data, preprocess=None, device="cpu"):
+        # A batch over data that already exists, which shares scheme and groups with its source instead of copying
+        # them, so neither may be changed through it
+        batch = cls.__new__(cls)
+        batch.scheme, batch.groups = scheme, groups
+        batch.batch_size, batch.max_seq_length = batch_size, max_seq_length
+        batch.preprocess = {} if preprocess is None else preprocess
+        batch.device = device
+        batch._step_fields = {}
+        batch.data = data
+        return batch
+
+    def _alloc(self, section, field_key, shape, dtype):
+        return th.zeros(shape, dtype=dtype, device=self.device)
 
 
     def extend(self, scheme, groups=None):
@@ -98,6 +121,7 @@ class EpisodeBatch:
         for k, v in self.data.episode_data.items():
             self.data.episode_data[k] = v.to(device)
         self.device = device
+        self._step_fields = {}
 
     # 更新buffer中的数据
     def update(self, data, bs=slice(None), ts=slice(None), mark_filled=True):
@@ -118,24 +142,83 @@ class EpisodeBatch:
 
             dtype = self.scheme[k].get("dtype", th.float32)
             v = th.tensor(v, dtype=dtype, device=self.device)
-            self._check_safe_view(v, target[k][_slices])
-            target[k][_slices] = v.view_as(target[k][_slices])
+            v = self._write(target, k, _slices, v)
 
             if k in self.preprocess:
                 new_k = self.preprocess[k][0]
-                v = target[k][_slices]
                 for transform in self.preprocess[k][1]:
                     v = transform.transform(v)
-                target[new_k][_slices] = v.view_as(target[new_k][_slices])
+                self._write(target, new_k, _slices, v)
+
+    # update()的快速版本：runner每个时间步写入数据用
+    def update_step(self, data, t, bs=slice(None), mark_filled=True):
+        # Writes several fields of timestep t for the episodes in bs. Every value must already hold the entries
+        # of those episodes in order (numpy arrays, tensors, or anything np.asarray turns into an array).
+        # Field lookups are cached and CPU fields are written through numpy views of their storage, which
+        # costs a fraction of torch indexing for the small per-step writes
+        n_rows = len(range(*bs.indices(self.batch_size))) if isinstance(bs, slice) else len(bs)
+        for k, v in data.items():
+            field = self._step_fields.get(k)
+            if field is None:
+                field = self._cache_step_field(k)
+            if field[1] and mark_filled:
+                self._write_step(self._step_fields.get("filled") or self._cache_step_field("filled"), t, bs, n_rows, 1)
+                mark_filled = False
+            v = self._write_step(field, t, bs, n_rows, v)
 
+            if k in self.preprocess:
+                new_k, transforms = self.preprocess[k]
+                v = th.as_tensor(v)
+                for transform in transforms:
+                    v = transform.transform(v)
+                self._write_step(self._step_fields.get(new_k) or self._cache_step_field(new_k), t, bs, n_rows, v)
 
-    # 检测reshape是否安全， v是需要reshape的张量，dest是reshape后的张量形状
-    def _check_safe_view(self, v, dest):
+    def _cache_step_field(self, k):
+        if k in self.data.transition_data:
+            tensor, transition = self.data.transition_data[k], True
+        elif k in self.data.episode_data:
+            tensor, transition = self.data.episode_data[k], False
+        else:
+            raise KeyError("{} not found in transition or episode data".format(k))
+        shape = tuple(tensor.shape[2:] if transition else tensor.shape[1:])
+        array = tensor.numpy() if tensor.device.type == "cpu" else None
+        self._step_fields[k] = (tensor, transition, shape, array)
+        return self._step_fields[k]
+
+    def _write_step(self, field, t, bs, n_rows, v):
+        tensor, transition, shape, array = field
+        index = (bs, t) if transition else bs
+        if array is not None:
+            if isinstance(v, th.Tensor):
+                v = v.detach().cpu().numpy()
+            elif not isinstance(v, np.ndarray):
+                v = np.asarray(v)
+            if v.ndim > 0:
+                v = v.reshape(n_rows, *shape)
+            array[index] = v
+            return v
+        if not isinstance(v, th.Tensor):
+            v = th.from_numpy(np.asarray(v))
+        v = v.to(device=self.device, dtype=tensor.dtype)
+        v = v.reshape(n_rows, *shape) if v.dim() > 0 else v
+        tensor[index] = v
+        return v
+
+    # 把v写入target[k][_slices]，返回reshape后的v
+    def _write(self, target, k, _slices, v):
+        dest = target[k][_slices]
+        self._check_safe_view(v, dest.shape)
+        v = v.view_as(dest)
+        target[k][_slices] = v
+        return v
+
+    # 检测reshape是否安全， v是需要reshape的张量，dest_shape是reshape后的张量形状
+    def _check_safe_view(self, v, dest_shape):
         idx = len(v.shape) - 1
-        for s in dest.shape[::-1]:
+        for s in dest_shape[::-1]:
             if v.shape[idx] != s:
                 if s != 1:
-                    raise ValueError("Unsafe reshape of {} to {}".format(v.shape, dest.shape))
+                    raise ValueError("Unsafe reshape of {} to {}".format(v.shape, dest_shape))
             else:
                 idx -= 1
 
@@ -215,6 +298,9 @@ class EpisodeBatch:
 
     def max_t_filled(self):
         # 返回最长序列的长度
+        if "ep_length" in self.data.episode_data:
+            # Batches sampled from a ReplayBuffer already know the length of their episodes
+            return min(int(self.data.episode_data["ep_length"].max()), self.max_seq_length)
         return th.sum(self.data.transition_data["filled"], 1).max(0)[0]
 
     def __repr__(self):
@@ -224,9 +310,46 @@ class EpisodeBatch:
                                                                                      self.groups.keys())
 
 
+# 采样结果复用的输出空间，避免每次采样都重新分配张量
+class SampleOutput:
+    """
+    Persistent tensors a ReplayBuffer gathers samples into. Each field keeps one flat tensor, of which a
+    contiguous prefix is viewed with the shape of the current sample, so batches of different lengths share it.
+    The per-episode fields added to a sample (ep_length, ...) are written into it too, and the batch shares its
+    scheme with the buffer. A batch gathered into it is only valid until the next sample gathered into the same
+    SampleOutput.
+    """
+    def __init__(self, pin_memory=False):
+        self.pin_memory = pin_memory
+        self.tensors = {}
+
+    def get(self, key, shape, dtype, device, capacity=0):
+        numel = int(np.prod(shape))
+        tensor = self.tensors.get(key)
+        if tensor is None or tensor.numel() < numel or tensor.dtype != dtype or tensor.device != th.device(device):
+            tensor = th.empty(max(numel, capacity), dtype=dtype, device=device, pin_memory=self.pin_memory)
+            self.tensors[key] = tensor
+        return tensor[:numel].view(shape)
+
+
 # 经验回放缓冲区， 继承自EpisodeBatch
 class ReplayBuffer(EpisodeBatch):
-    def __init__(self, scheme, groups, buffer_size, max_seq_length, preprocess=None, device="cpu"):
+    # Per-episode fields added to every sample, see _add_episode_field
+    sample_fields = {"ep_length": th.long}
+
+    def __init__(self, scheme, groups, buffer_size, max_seq_length, preprocess=None, device="cpu", storage=None,
+                 codecs=None, sampler="uniform", reuse_sample_output=False, episode_fields=None):
+        # storage decides where the fields live (see components/buffer_storage.py) and codecs how they are
+        # encoded there (see components/codecs.py), both are needed by _setup_data
+        self.storage = MemoryStorage() if storage is None else storage
+        self.codecs = {} if codecs is None else codecs
+        # field -> (bytes without codec, bytes actually stored)
+        self.field_bytes = {}
+        # Fields computed from every inserted episode (see components/episode_fields.py) are stored like the others
+        self.episode_fields = [] if episode_fields is None else episode_fields
+        scheme = dict(scheme)
+        for episode_field in self.episode_fields:
+            scheme.update(episode_field.scheme)
         super(ReplayBuffer, self).__init__(scheme, groups, buffer_size, max_seq_length, preprocess=preprocess, device=device)
 
         # buffer基本参数，这些参数基类EpisodeBatch都没有, 这也是batch和buffer的区别所在
@@ -234,39 +357,319 @@ class ReplayBuffer(EpisodeBatch):
         self.buffer_index = 0
         self.episodes_in_buffer = 0
 
+        # Number of filled timesteps of every stored episode, kept up to date on insert
+        self.ep_lengths = np.zeros(buffer_size, dtype=np.int64)
+        assert sampler in ["uniform", "length_bucketed"], "Sampler {} not recognised.".format(sampler)
+        self.sampler = sampler
+        self.padding_waste_sum, self.n_samples = 0.0, 0
+        # Samples are gathered into this when set, see sample()
+        self.sample_output = SampleOutput() if reuse_sample_output else None
+
     # 插入一个episode batch的数据
     def insert_episode_batch(self, ep_batch):
-        if self.buffer_index + ep_batch.batch_size <= self.buffer_size:
-            # slice是切片类，可以直接被list通过索引的方式使用然后得到切片
-            # max_seq_length是episode_limit+1,episode_limit为120
-            self.update(ep_batch.data.transition_data, # 更新transition_data
-                        slice(self.buffer_index, self.buffer_index + ep_batch.batch_size),
-                        slice(0, ep_batch.max_seq_length),
-                        mark_filled=False) # 这里更新和之前运行的时候收集数据进batch不一样，这里是mark_filled是False
-            self.update(ep_batch.data.episode_data, # 更新episode_data
-                        slice(self.buffer_index, self.buffer_index + ep_batch.batch_size))
-            self.buffer_index = (self.buffer_index + ep_batch.batch_size)
-            self.episodes_in_buffer = max(self.episodes_in_buffer, self.buffer_index)
-            self.buffer_index = self.buffer_index % self.buffer_size
-            assert self.buffer_index < self.buffer_size
+        # Episodes that would be overwritten within this same insert are never stored
+        skip = max(0, ep_batch.batch_size - self.buffer_size)
+        n_new = ep_batch.batch_size - skip
+        start = (self.buffer_index + skip) % self.buffer_size
+
+        if start + n_new <= self.buffer_size:
+            slots = slice(start, start + n_new)
+        else:
+            # Wrap around the end of the buffer: write both parts with a single indexed copy per field
+            slots = th.arange(start, start + n_new, device=self.device) % self.buffer_size
+
+        self._copy_episodes(ep_batch, slots, slice(skip, ep_batch.batch_size))
+
+        self.episodes_in_buffer = min(self.buffer_size, max(self.episodes_in_buffer, start + n_new))
+        self.buffer_index = (start + n_new) % self.buffer_size
+
+    def _copy_episodes(self, ep_batch, slots, rows):
+        # Data coming from a runner already has the buffer's dtypes (and preprocessed fields such as
+        # actions_onehot), so it is copied straight into the preallocated storage instead of going
+        # through update(), which would rebuild every field with th.tensor and re-run the preprocessing
+        for k, v in self._transition_items(ep_batch):
+            self._copy_field(self.data.transition_data, k, v[rows], slots, slice(0, ep_batch.max_seq_length))
+        for k, v in ep_batch.data.episode_data.items():
+            self._copy_field(self.data.episode_data, k, v[rows], slots)
+
+        slots = np.arange(slots.start, slots.stop) if isinstance(slots, slice) else slots.cpu().numpy()
+        self.ep_lengths[slots] = ep_batch["filled"][rows].reshape(len(slots), -1).sum(1).cpu().numpy()
+        return slots
+
+    def _transition_items(self, ep_batch):
+        # The episode's transition fields followed by the fields computed from it
+        items = list(ep_batch.data.transition_data.items())
+        for episode_field in self.episode_fields:
+            items += episode_field.compute(ep_batch).items()
+        return items
+
+    def update(self, data, bs=slice(None), ts=slice(None), mark_filled=True):
+        super(ReplayBuffer, self).update(data, bs, ts, mark_filled)
+        bs = self._parse_slices((bs, ts))[0]
+        self.ep_lengths[bs] = self.data.transition_data["filled"][bs].reshape(len(self.ep_lengths[bs]), -1).sum(1).cpu().numpy()
+
+    def update_step(self, data, t, bs=slice(None), mark_filled=True):
+        if self.codecs:
+            # Fields have to go through their codec on the way in
+            return self.update(data, bs, t, mark_filled)
+        super(ReplayBuffer, self).update_step(data, t, bs, mark_filled)
+        if mark_filled and any(k in self.data.transition_data for k in data):
+            # Timestep t (one per episode or the same for all) was just marked filled. Episodes are filled from
+            # their first timestep on, so their length is at least t + 1, without summing filled again
+            bs = np.arange(self.buffer_size)[bs]
+            t = t.cpu().numpy() if isinstance(t, th.Tensor) else np.asarray(t)
+            self.ep_lengths[bs] = np.maximum(self.ep_lengths[bs], t + 1)
+
+    def _copy_field(self, fields, k, v, slots, ts=None):
+        codec = self.codecs.get(k)
+        if codec is not None:
+            if codec.source is not None:
+                return
+            v = codec.encode(v)
+        if k not in fields:
+            raise KeyError("{} not found in transition or episode data".format(k))
+        target = fields[k] if ts is None else fields[k][:, ts]
+        if isinstance(slots, slice):
+            target[slots].copy_(v)
         else:
-            # 如果buffer_index后面空间不够，那就对ep_batch切片，先插满后面的剩余空间，这样buffer_index就变成0了
-            # 再插ep_batch剩下的切片
-            buffer_left = self.buffer_size - self.buffer_index
-            self.insert_episode_batch(ep_batch[0:buffer_left, :])
-            self.insert_episode_batch(ep_batch[buffer_left:, :])
+            target.index_copy_(0, slots, v.to(device=target.device, dtype=target.dtype))
+
+    def _setup_data(self, scheme, groups, batch_size, max_seq_length, preprocess):
+        super(ReplayBuffer, self)._setup_data(scheme, groups, batch_size, max_seq_length, preprocess)
+        self._sample_scheme = None
+        # Derived fields have no storage, they are rebuilt from their source on read
+        for k, codec in self.codecs.items():
+            if codec.source is not None:
+                self.data.transition_data.pop(k, None)
+                self.data.episode_data.pop(k, None)
+
+    def _alloc(self, section, field_key, shape, dtype):
+        codec = self.codecs.get(field_key)
+        raw_bytes = int(np.prod(shape)) * th.tensor([], dtype=dtype).element_size()
+        if codec is not None and codec.source is not None:
+            self.field_bytes[field_key] = (raw_bytes, 0)
+            return None
+        if codec is not None:
+            vshape, dtype = codec.infer_storage_info(tuple(shape[-1:]), dtype)
+            shape = (*shape[:-1], *vshape)
+        tensor = self.storage.alloc("{}.{}".format(section, field_key), shape, dtype, self.device)
+        self.field_bytes[field_key] = (raw_bytes, tensor.numel() * tensor.element_size())
+        return tensor
+
+    def _write(self, target, k, _slices, v):
+        codec = self.codecs.get(k)
+        if codec is None:
+            return super(ReplayBuffer, self)._write(target, k, _slices, v)
+        if codec.source is not None:
+            return v
+        vshape = self.scheme[k]["vshape"]
+        dest_shape = (*target[k][_slices].shape[:-1], vshape if isinstance(vshape, int) else vshape[-1])
+        self._check_safe_view(v, dest_shape)
+        v = v.view(dest_shape)
+        target[k][_slices] = codec.encode(v)
+        return v
+
+    def __getitem__(self, item):
+        if not self.codecs:
+            return super(ReplayBuffer, self).__getitem__(item)
+        if isinstance(item, str):
+            codec = self.codecs.get(item)
+            if codec is None:
+                return super(ReplayBuffer, self).__getitem__(item)
+            elif codec.source is None:
+                return self._decode(item, super(ReplayBuffer, self).__getitem__(item))
+            else:
+                return self._decode(item, self[codec.source], self.data.transition_data["filled"])
+        return self._decode_batch(super(ReplayBuffer, self).__getitem__(item))
+
+    def _decode_batch(self, ret):
+        # Decode the stored fields first, derived fields may be built from one of them
+        for k, codec in sorted(self.codecs.items(), key=lambda kv: kv[1].source is not None):
+            source = k if codec.source is None else codec.source
+            for fields in (ret.data.transition_data, ret.data.episode_data):
+                if source in fields:
+                    fields[k] = self._decode(k, fields[source], ret.data.transition_data["filled"])
+        return ret
+
+    def _decode(self, k, v, filled):
+        codec = self.codecs[k]
+        v = codec.decode(v).to(self.scheme[k].get("dtype", th.float32))
+        if codec.source is not None and not self.scheme[k].get("episode_const", False):
+            # A stored field stays zero on padded timesteps since nothing is ever written there
+            v = v * filled.view(*filled.shape[:2], *([1] * (v.dim() - 2))).to(v.dtype)
+        return v
+
+    def storage_report(self):
+        lines = ["{:<16}{:>12}{:>12}{:>8}  {}".format("field", "raw MB", "stored MB", "saved", "codec")]
+        total_raw, total_stored = 0, 0
+        for k, (raw, stored) in self.field_bytes.items():
+            codec = self.codecs.get(k)
+            lines.append("{:<16}{:>12.1f}{:>12.1f}{:>7.0f}%  {}".format(k, raw / 2 ** 20, stored / 2 ** 20,
+                                                                    100.0 * (raw - stored) / max(raw, 1),
+                                                                    "-" if codec is None else type(codec).__name__))
+            total_raw += raw
+            total_stored += stored
+        lines.append("{:<16}{:>12.1f}{:>12.1f}{:>7.0f}%".format("total", total_raw / 2 ** 20, total_stored / 2 ** 20,
+                                                                100.0 * (total_raw - total_stored) / max(total_raw, 1)))
+        return "\n".join(lines)
+
+    def close(self):
+        self.storage.close()
+
+    # 保存/恢复整个buffer，和模型放在一起，重启训练时不用重新收集数据
+    def save(self, path, chunk_size=64):
+        # Every stored field is streamed to its own raw file chunk_size rows at a time, straight from the
+        # buffer's memory, so saving never needs a second copy of the buffer. meta.json is written last.
+        os.makedirs(path, exist_ok=True)
+        meta = {"type": type(self).__name__, "fields": {}}
+        for section in ["transition_data", "episode_data"]:
+            rows = self._snapshot_rows(section)
+            for k, v in getattr(self.data, section).items():
+                name = "{}.{}".format(section, k)
+                with open(os.path.join(path, name + ".dat"), "wb") as f:
+                    for i in range(0, rows, chunk_size):
+                        f.write(v[i:i + chunk_size].cpu().numpy().data)
+                meta["fields"][name] = {"shape": [rows, *v.shape[1:]], "dtype": np.dtype(NP_DTYPES[v.dtype]).name}
+        arrays, meta["state"] = self._snapshot_state()
+        np.savez(os.path.join(path, "state.npz"), **arrays)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def load(self, path, mmap=False, chunk_size=64):
+        # With mmap the files are mapped and paged in as they are copied, otherwise they are read straight into
+        # the buffer's memory. The buffer must have been built with the same scheme, sizes and codecs.
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["type"] != type(self).__name__:
+            raise ValueError("Cannot load a {} snapshot into a {}".format(meta["type"], type(self).__name__))
+        fields = {"{}.{}".format(section, k): v for section in ["transition_data", "episode_data"]
+                  for k, v in getattr(self.data, section).items()}
+        if set(fields) != set(meta["fields"]):
+            raise ValueError("Snapshot fields {} do not match the buffer's {}".format(sorted(meta["fields"]), sorted(fields)))
+
+        for name, info in meta["fields"].items():
+            target, rows = fields[name], info["shape"][0]
+            if list(target.shape[1:]) != info["shape"][1:] or np.dtype(NP_DTYPES[target.dtype]) != np.dtype(info["dtype"]):
+                raise ValueError("Snapshot field {} has shape {} and dtype {}, the buffer has {} and {}".format(
+                    name, info["shape"][1:], info["dtype"], list(target.shape[1:]), target.dtype))
+            if rows == 0:
+                continue
+            file_name = os.path.join(path, name + ".dat")
+            if mmap:
+                source = np.memmap(file_name, dtype=info["dtype"], mode="c", shape=tuple(info["shape"]))
+                for i in range(0, rows, chunk_size):
+                    target[i:min(i + chunk_size, rows)].copy_(th.from_numpy(source[i:i + chunk_size]))
+                del source
+            else:
+                with open(file_name, "rb") as f:
+                    for i in range(0, rows, chunk_size):
+                        chunk = target[i:min(i + chunk_size, rows)]
+                        if chunk.device.type == "cpu":
+                            f.readinto(chunk.numpy())
+                        else:
+                            array = np.empty(tuple(chunk.shape), dtype=info["dtype"])
+                            f.readinto(array)
+                            chunk.copy_(th.from_numpy(array))
+
+        with np.load(os.path.join(path, "state.npz")) as arrays:
+            self._restore_state(dict(arrays), meta["state"])
+
+    def _snapshot_rows(self, section):
+        return self.episodes_in_buffer
+
+    def _snapshot_state(self):
+        return {"ep_lengths": self.ep_lengths}, {"buffer_index": self.buffer_index,
+                                                 "episodes_in_buffer": self.episodes_in_buffer}
+
+    def _restore_state(self, arrays, state):
+        self.ep_lengths[:] = arrays["ep_lengths"]
+        self.buffer_index = state["buffer_index"]
+        self.episodes_in_buffer = state["episodes_in_buffer"]
 
     def can_sample(self, batch_size):
         return self.episodes_in_buffer >= batch_size
 
-    def sample(self, batch_size):
+    def sample(self, batch_size, out=None):
         assert self.can_sample(batch_size)
         if self.episodes_in_buffer == batch_size:
-            return self[:batch_size]
+            ep_ids = slice(0, batch_size)
+        elif self.sampler == "length_bucketed":
+            ep_ids = self._sample_length_bucketed(batch_size, np.arange(self.episodes_in_buffer))
         else:
-            # Uniform sampling only atm
             ep_ids = np.random.choice(self.episodes_in_buffer, batch_size, replace=False)
+        out = self._sample_output(out)
+        return self._add_sample_info(self._select(ep_ids, out), ep_ids, out)
+
+    def _sample_output(self, out):
+        # The SampleOutput a sample is gathered into: out, or the buffer's own (None if it has none)
+        return self.sample_output if out is None else out
+
+    def _select(self, ep_ids, out=None):
+        # With a SampleOutput the sampled episodes are gathered into its tensors, already truncated to their
+        # longest episode, instead of allocating new ones through __getitem__
+        if out is None:
             return self[ep_ids]
+        return self._gather_into(np.arange(self.buffer_size)[ep_ids], out)
+
+    def _new_sample(self, batch_size, max_t, data):
+        # A batch gathered into a SampleOutput. Its scheme already has the sample_fields and is shared by them all
+        if self._sample_scheme is None:
+            self._sample_scheme = dict(self.scheme, **{k: {"vshape": (1,), "dtype": dtype, "episode_const": True}
+                                                       for k, dtype in self.sample_fields.items()})
+        return self._decode_batch(EpisodeBatch.from_data(self._sample_scheme, self.groups, batch_size, max_t, data,
+                                                         device=self.device))
+
+    def _gather_into(self, ep_ids, out):
+        max_t = max(int(self.ep_lengths[ep_ids].max()), 1)
+        idx = th.from_numpy(ep_ids).to(self.device)
+        data = self._new_data_sn()
+        for k, v in self.data.transition_data.items():
+            data.transition_data[k] = th.index_select(v[:, :max_t], 0, idx, out=out.get(
+                k, (len(ep_ids), max_t, *v.shape[2:]), v.dtype, v.device, capacity=v[0].numel() * len(ep_ids)))
+        for k, v in self.data.episode_data.items():
+            data.episode_data[k] = th.index_select(v, 0, idx, out=out.get(k, (len(ep_ids), *v.shape[1:]), v.dtype, v.device))
+        return self._new_sample(len(ep_ids), max_t, data)
+
+    def _sample_length_bucketed(self, batch_size, ep_ids):
+        # Pick an episode uniformly at random, then fill the batch with the episodes whose length is closest to
+        # its own so that little of the batch is padding once it is truncated to max_t_filled
+        lengths = self.ep_lengths[ep_ids]
+        anchor = lengths[np.random.randint(len(ep_ids))]
+        counts = np.cumsum(np.bincount(lengths, minlength=self.max_seq_length + 1))
+        lo, hi = anchor, anchor
+        while counts[hi] - (counts[lo - 1] if lo > 0 else 0) < batch_size:
+            lo, hi = max(lo - 1, 0), min(hi + 1, self.max_seq_length)
+        candidates = ep_ids[(lengths >= lo) & (lengths <= hi)]
+        return np.random.choice(candidates, batch_size, replace=False)
+
+    def _add_sample_info(self, batch, ep_ids, out=None):
+        lengths = self.ep_lengths[ep_ids]
+        self.padding_waste_sum += 1.0 - lengths.sum() / max(len(lengths) * lengths.max(), 1)
+        self.n_samples += 1
+        self._add_episode_field(batch, "ep_length", lengths, out)
+        return batch
+
+    def _add_episode_field(self, batch, key, values, out=None):
+        # Per-episode information about a sample travels with it (through slicing and .to(device)).
+        # Written into out if the sample was gathered into a SampleOutput, whose batches already have it in their scheme
+        dtype = self.sample_fields[key]
+        values = th.as_tensor(np.asarray(values), dtype=dtype).view(-1, 1)
+        if out is None:
+            batch.scheme[key] = {"vshape": (1,), "dtype": dtype, "episode_const": True}
+            batch.data.episode_data[key] = values.to(self.device)
+        else:
+            batch.data.episode_data[key] = out.get(key, values.shape, dtype, self.device).copy_(values)
+
+    def pop_sample_stats(self):
+        # Fraction of the sampled timesteps that were padding, averaged over the batches sampled since the last call
+        stats = {}
+        if self.n_samples > 0:
+            stats["padding_waste"] = float(self.padding_waste_sum / self.n_samples)
+        self.padding_waste_sum, self.n_samples = 0.0, 0
+        return stats
+
+    def max_t_filled(self):
+        return int(self.ep_lengths[:self.episodes_in_buffer].max()) if self.episodes_in_buffer > 0 else 0
 
     def __repr__(self):
         return "ReplayBuffer. {}/{} episodes. Keys:{} Groups:{}".format(self.episodes_in_buffer,
@@ -274,3 +677,321 @@ class ReplayBuffer(EpisodeBatch):
                                                                         self.scheme.keys(),
                                                                         self.groups.keys())
 
+
+
+# 紧凑存储的经验回放：不再把每个episode都补齐到episode_limit+1
+class PackedReplayBuffer(ReplayBuffer):
+    """
+    Keeps every transition field as one flat array of buffer_steps timesteps, with the episodes laid out one
+    after the other, plus the offset and length of every stored episode. Episodes that end well before the
+    episode limit then only take up the timesteps they actually filled. sample() pads the sampled episodes
+    up to the longest of them and returns an ordinary EpisodeBatch.
+    """
+    def __init__(self, scheme, groups, buffer_size, max_seq_length, buffer_steps, **kwargs):
+        assert buffer_steps >= max_seq_length, "buffer_steps must fit at least one full episode"
+        # Needed by _alloc while the base classes set up the data
+        self.buffer_steps = buffer_steps
+        super(PackedReplayBuffer, self).__init__(scheme, groups, buffer_size, max_seq_length, **kwargs)
+        self.ep_offsets = np.zeros(buffer_size, dtype=np.int64)
+        # A slot stops being valid once it is reused or once its timesteps are overwritten
+        self.valid = np.zeros(buffer_size, dtype=bool)
+        self.step_index = 0
+
+    def _alloc(self, section, field_key, shape, dtype):
+        if section == "transition_data":
+            shape = (self.buffer_steps, *shape[2:])
+        return super(PackedReplayBuffer, self)._alloc(section, field_key, shape, dtype)
+
+    def insert_episode_batch(self, ep_batch):
+        skip = max(0, ep_batch.batch_size - self.buffer_size)
+        rows = slice(skip, ep_batch.batch_size)
+        filled = ep_batch["filled"][rows].reshape(ep_batch.batch_size - skip, -1)
+        lengths = filled.sum(1).cpu().numpy()
+        total = int(lengths.sum())
+        assert total <= self.buffer_steps, "{} timesteps do not fit in buffer_steps={}".format(total, self.buffer_steps)
+
+        if self.step_index + total > self.buffer_steps:
+            # Episodes are never split across the end of the flat arrays, the few steps left there go unused
+            self.step_index = 0
+        start, stop = self.step_index, self.step_index + total
+        self.valid &= (self.ep_offsets >= stop) | (self.ep_offsets + self.ep_lengths <= start)
+
+        # Filled timesteps are a prefix of every episode, so masking keeps them in order, one episode after the other
+        mask = filled.bool()
+        for k, v in self._transition_items(ep_batch):
+            self._copy_field(self.data.transition_data, k, v[rows][mask], slice(start, stop))
+        slots = (self.buffer_index + np.arange(len(lengths))) % self.buffer_size
+        for k, v in ep_batch.data.episode_data.items():
+            self._copy_field(self.data.episode_data, k, v[rows], th.from_numpy(slots).to(self.device))
+
+        self.ep_offsets[slots] = start + np.cumsum(lengths) - lengths
+        self.ep_lengths[slots] = lengths
+        self.valid[slots] = True
+        self.step_index = stop
+        self.buffer_index = (self.buffer_index + len(lengths)) % self.buffer_size
+        self.episodes_in_buffer = int(self.valid.sum())
+
+    def update(self, data, bs=slice(None), ts=slice(None), mark_filled=True):
+        raise NotImplementedError("PackedReplayBuffer only stores whole episodes, use insert_episode_batch")
+
+    def update_step(self, data, t, bs=slice(None), mark_filled=True):
+        raise NotImplementedError("PackedReplayBuffer only stores whole episodes, use insert_episode_batch")
+
+    def __getitem__(self, item):
+        if isinstance(item, str):
+            # The flat timestep array of a transition field
+            return super(PackedReplayBuffer, self).__getitem__(item)
+        ep_ids, ts = item if isinstance(item, tuple) else (item, slice(None))
+        ret = self._gather(np.atleast_1d(np.arange(self.buffer_size)[ep_ids]))
+        return ret if ts == slice(None) else ret[:, ts]
+
+    def _gather_into(self, ep_ids, out):
+        return self._gather(ep_ids, out)
+
+    def _gather(self, ep_ids, out=None):
+        lengths = self.ep_lengths[ep_ids]
+        max_t = int(lengths.max())
+        t = np.arange(max_t)
+        pad = t[None, :] >= lengths[:, None]
+        steps = th.from_numpy(np.where(pad, 0, self.ep_offsets[ep_ids][:, None] + t[None, :]).reshape(-1)).to(self.device)
+        pad = th.from_numpy(pad).to(self.device)
+
+        new_data = self._new_data_sn()
+        for k, v in self.data.transition_data.items():
+            if out is None:
+                v = v.index_select(0, steps).view(len(ep_ids), max_t, *v.shape[1:])
+            else:
+                v = th.index_select(v, 0, steps, out=out.get(k, (len(ep_ids) * max_t, *v.shape[1:]), v.dtype, v.device,
+                                                             capacity=v[0].numel() * len(ep_ids) * self.max_seq_length))
+                v = v.view(len(ep_ids), max_t, *v.shape[1:])
+            new_data.transition_data[k] = v.masked_fill_(pad.view(*pad.shape, *([1] * (v.dim() - 2))), 0)
+        ids = th.from_numpy(ep_ids).to(self.device)
+        for k, v in self.data.episode_data.items():
+            if out is None:
+                new_data.episode_data[k] = v.index_select(0, ids)
+            else:
+                new_data.episode_data[k] = th.index_select(v, 0, ids, out=out.get(k, (len(ep_ids), *v.shape[1:]), v.dtype, v.device))
+        if out is not None:
+            return self._new_sample(len(ep_ids), max_t, new_data)
+        return self._decode_batch(EpisodeBatch(self.scheme, self.groups, len(ep_ids), max_t, data=new_data,
+                                               device=self.device))
+
+    def sample(self, batch_size, out=None):
+        assert self.can_sample(batch_size)
+        valid_ids = np.flatnonzero(self.valid)
+        if self.sampler == "length_bucketed":
+            ep_ids = self._sample_length_bucketed(batch_size, valid_ids)
+        else:
+            ep_ids = np.random.choice(valid_ids, batch_size, replace=False)
+        out = self._sample_output(out)
+        return self._add_sample_info(self._select(ep_ids, out), ep_ids, out)
+
+    def max_t_filled(self):
+        return int(self.ep_lengths[self.valid].max()) if self.episodes_in_buffer > 0 else 0
+
+    def _snapshot_rows(self, section):
+        if section == "episode_data":
+            return self.buffer_size
+        # Timesteps past the end of the last valid episode hold nothing that can still be sampled
+        return int((self.ep_offsets + self.ep_lengths)[self.valid].max()) if self.episodes_in_buffer > 0 else 0
+
+    def _snapshot_state(self):
+        arrays, state = super(PackedReplayBuffer, self)._snapshot_state()
+        arrays.update(ep_offsets=self.ep_offsets, valid=self.valid)
+        state["step_index"] = self.step_index
+        return arrays, state
+
+    def _restore_state(self, arrays, state):
+        super(PackedReplayBuffer, self)._restore_state(arrays, state)
+        self.ep_offsets[:] = arrays["ep_offsets"]
+        self.valid[:] = arrays["valid"]
+        self.step_index = state["step_index"]
+
+    def __repr__(self):
+        return "PackedReplayBuffer. {}/{} episodes, {} timesteps. Keys:{} Groups:{}".format(self.episodes_in_buffer,
+                                                                                          self.buffer_size,
+                                                                                          self.buffer_steps,
+                                                                                          self.scheme.keys(),
+                                                                                          self.groups.keys())
+
+
+
+# 共享内存的经验回放：actor进程直接把episode写进buffer，learner进程原地采样
+class SharedReplayBuffer(ReplayBuffer):
+    """
+    ReplayBuffer whose fields, episode lengths and counters all live in shared memory. Handed to other processes
+    as a multiprocessing.Process argument, every process reads and writes the same buffer: actors either insert
+    finished episodes with insert_episode_batch, or reserve() slots, fill them in place with update() and
+    commit() them, while the learner samples in place. The lock is only held to hand out and publish slots and
+    while a sample is gathered, so a slot is never read while it is written. Only committed slots are sampled,
+    and buffer_size has to be larger than the number of episodes being written at the same time.
+    """
+    def __init__(self, scheme, groups, buffer_size, max_seq_length, storage=None, **kwargs):
+        # buffer_index and episodes_in_buffer, see the properties below
+        self._counters = th.zeros(2, dtype=th.long).share_memory_()
+        self.lock = mp.Lock()
+        super(SharedReplayBuffer, self).__init__(scheme, groups, buffer_size, max_seq_length,
+                                                 storage=SharedMemoryStorage() if storage is None else storage, **kwargs)
+        self._ep_lengths = th.zeros(buffer_size, dtype=th.long).share_memory_()
+        self._committed = th.zeros(buffer_size, dtype=th.bool).share_memory_()
+        self._bind_views()
+
+    def _bind_views(self):
+        # numpy views of the shared tensors, they are rebuilt rather than pickled when the buffer changes process
+        self.ep_lengths = self._ep_lengths.numpy()
+        self.committed = self._committed.numpy()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["ep_lengths"], state["committed"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind_views()
+
+    @property
+    def buffer_index(self):
+        return int(self._counters[0])
+
+    @buffer_index.setter
+    def buffer_index(self, value):
+        self._counters[0] = value
+
+    @property
+    def episodes_in_buffer(self):
+        return int(self._counters[1])
+
+    @episodes_in_buffer.setter
+    def episodes_in_buffer(self, value):
+        self._counters[1] = value
+
+    def reserve(self, n, clear=True):
+        # Takes the next n slots out of the sampleable set and returns them, the caller owns them until commit()
+        with self.lock:
+            slots = (self.buffer_index + np.arange(n)) % self.buffer_size
+            self.buffer_index = (self.buffer_index + n) % self.buffer_size
+            self.committed[slots] = False
+            self.episodes_in_buffer = int(self.committed.sum())
+        if clear:
+            # Slots filled step by step with update() must not keep the previous episode's timesteps
+            for v in self.data.transition_data.values():
+                v[th.from_numpy(slots)] = 0
+        return slots
+
+    def commit(self, slots, compute_fields=True):
+        slots = np.asarray(slots)
+        if compute_fields and self.episode_fields:
+            # Episodes written in place with update() still need their computed fields
+            episodes = self[slots]
+            for episode_field in self.episode_fields:
+                for k, v in episode_field.compute(episodes).items():
+                    self._copy_field(self.data.transition_data, k, v, th.from_numpy(slots))
+        filled = self.data.transition_data["filled"].index_select(0, th.from_numpy(slots))
+        with self.lock:
+            self.ep_lengths[slots] = filled.reshape(len(slots), -1).sum(1).numpy()
+            self.committed[slots] = True
+            self.episodes_in_buffer = int(self.committed.sum())
+
+    def insert_episode_batch(self, ep_batch):
+        skip = max(0, ep_batch.batch_size - self.buffer_size)
+        # Every slot is overwritten in full by the copy, no need to clear it first
+        slots = self.reserve(ep_batch.batch_size - skip, clear=ep_batch.max_seq_length < self.max_seq_length)
+        self._copy_episodes(ep_batch, th.from_numpy(slots), slice(skip, ep_batch.batch_size))
+        self.commit(slots, compute_fields=False)
+
+    def sample(self, batch_size, out=None):
+        with self.lock:
+            assert self.can_sample(batch_size)
+            committed_ids = np.flatnonzero(self.committed)
+            if self.sampler == "length_bucketed":
+                ep_ids = self._sample_length_bucketed(batch_size, committed_ids)
+            else:
+                ep_ids = np.random.choice(committed_ids, batch_size, replace=False)
+            out = self._sample_output(out)
+            batch = self._select(ep_ids, out)
+        return self._add_sample_info(batch, ep_ids, out)
+
+    def max_t_filled(self):
+        return int(self.ep_lengths[self.committed].max()) if self.episodes_in_buffer > 0 else 0
+
+    def _snapshot_rows(self, section):
+        committed_ids = np.flatnonzero(self.committed)
+        return int(committed_ids.max()) + 1 if len(committed_ids) > 0 else 0
+
+    def _snapshot_state(self):
+        arrays, state = super(SharedReplayBuffer, self)._snapshot_state()
+        arrays["committed"] = self.committed
+        return arrays, state
+
+    def _restore_state(self, arrays, state):
+        super(SharedReplayBuffer, self)._restore_state(arrays, state)
+        self.committed[:] = arrays["committed"]
+
+    def __repr__(self):
+        return "SharedReplayBuffer. {}/{} episodes. Keys:{} Groups:{}".format(self.episodes_in_buffer,
+                                                                              self.buffer_size,
+                                                                              self.scheme.keys(),
+                                                                              self.groups.keys())
+
+
+
+# 优先经验回放，按照TD-error的大小来采样episode
+class PrioritizedReplayBuffer(ReplayBuffer):
+    sample_fields = dict(ReplayBuffer.sample_fields, ep_ids=th.long, weights=th.float32)
+
+    def __init__(self, scheme, groups, buffer_size, max_seq_length, alpha, beta, t_max, eps=1e-6, **kwargs):
+        # sampler is only used by ReplayBuffer.sample, episodes are drawn from the sum-tree here
+        super(PrioritizedReplayBuffer, self).__init__(scheme, groups, buffer_size, max_seq_length, **kwargs)
+        self.alpha = alpha
+        # The importance sampling exponent is annealed linearly from beta to 1 over t_max
+        self.beta = beta
+        self.t_max = t_max
+        self.eps = eps
+        self.sum_tree = SumTree(buffer_size)
+        self.max_priority = 1.0
+
+    def _copy_episodes(self, ep_batch, slots, rows):
+        slots = super(PrioritizedReplayBuffer, self)._copy_episodes(ep_batch, slots, rows)
+        # New episodes get the highest priority seen so far so that they are sampled at least once
+        self.sum_tree.update(slots, self.max_priority ** self.alpha)
+        return slots
+
+    def sample(self, batch_size, t_env=0, out=None):
+        assert self.can_sample(batch_size)
+        ep_ids = self.sum_tree.sample(batch_size)
+        probs = self.sum_tree.get(ep_ids) / self.sum_tree.total()
+
+        beta = min(1.0, self.beta + (1.0 - self.beta) * t_env / self.t_max)
+        weights = (self.episodes_in_buffer * probs) ** (-beta)
+        weights = weights / weights.max()
+
+        out = self._sample_output(out)
+        batch = self._add_sample_info(self._select(ep_ids, out), ep_ids, out)
+        # The learner weights its loss with these, and the priorities of ep_ids are updated afterwards
+        self._add_episode_field(batch, "ep_ids", ep_ids, out)
+        self._add_episode_field(batch, "weights", weights, out)
+        return batch
+
+    def update_priorities(self, ep_ids, priorities):
+        ep_ids = ep_ids.reshape(-1).cpu().numpy()
+        priorities = priorities.reshape(-1).detach().cpu().numpy() + self.eps
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.sum_tree.update(ep_ids, priorities ** self.alpha)
+
+    def _snapshot_state(self):
+        arrays, state = super(PrioritizedReplayBuffer, self)._snapshot_state()
+        arrays["priorities"] = self.sum_tree.get(np.arange(self.buffer_size))
+        state["max_priority"] = float(self.max_priority)
+        return arrays, state
+
+    def _restore_state(self, arrays, state):
+        super(PrioritizedReplayBuffer, self)._restore_state(arrays, state)
+        self.sum_tree.update(np.arange(self.buffer_size), arrays["priorities"])
+        self.max_priority = state["max_priority"]
+
+    def __repr__(self):
+        return "PrioritizedReplayBuffer. {}/{} episodes. Keys:{} Groups:{}".format(self.episodes_in_buffer,
+                                                                                   self.buffer_size,
+                                                                                   self.scheme.keys(),
+                                                                                   self.groups.keys())
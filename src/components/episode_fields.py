@@ -0,0 +1,32 @@
+import torch as th
+from utils.rl_utils import build_n_step_returns
+
+
+# Episode fields are computed once from a whole episode when it is inserted into a replay buffer, and are then
+# sampled like any other field instead of being recomputed by the learner for every batch
+class EpisodeField:
+    # field -> scheme entry of every field this computes
+    scheme = {}
+
+    def compute(self, batch):
+        # Returns field -> tensor of shape (batch_size, max_seq_length, *vshape) for the episodes of batch
+        raise NotImplementedError
+
+
+class NStepReturns(EpisodeField):
+    def __init__(self, n_step, gamma):
+        self.n_step = n_step
+        self.gamma = gamma
+        self.scheme = {
+            "reward_nstep": {"vshape": (1,)},
+            "nstep_index": {"vshape": (1,), "dtype": th.long},
+            "nstep_discount": {"vshape": (1,)},
+        }
+
+    def compute(self, batch):
+        terminated = batch["terminated"][:, :-1].float()
+        mask = batch["filled"][:, :-1].float()
+        mask[:, 1:] = mask[:, 1:] * (1 - terminated[:, :-1])
+        fields = build_n_step_returns(batch["reward"][:, :-1].float(), terminated, mask, self.gamma, self.n_step)
+        # Nothing starts at the last timestep, it only holds the final state
+        return {k: th.cat([v, v.new_zeros(v.shape[0], 1, *v.shape[2:])], dim=1) for k, v in zip(self.scheme, fields)}
@@ -0,0 +1,68 @@
+import multiprocessing as mp
+from types import SimpleNamespace as SN
+
+import torch as th
+
+from utils.logging import QueueLogger, log_queued_stats
+
+
+# 测试放到单独的进程里，用它自己的环境和某一时刻冻结的参数，训练不用停下来等测试
+class Evaluator:
+    """
+    Runs the test episodes in a process of its own, with its own runner and envs, so training carries on meanwhile.
+    submit() hands over a frozen copy of the agent weights and the t_env they were taken at; the test stats are
+    logged against that t_env once drain() picks them up. Snapshots submitted while a test is running wait their turn.
+    """
+    def __init__(self, args, scheme, groups, preprocess):
+        self.requests = mp.Queue()
+        self.stats_queue = mp.Queue()
+        eval_args = SN(**vars(args))
+        eval_args.device = "cpu"
+        eval_args.use_cuda = False
+        self.p = mp.Process(target=evaluator_worker, args=(eval_args, scheme, groups, preprocess, self.requests,
+                                                            self.stats_queue))
+        self.p.start()
+
+    def submit(self, mac, t_env):
+        weights = {k: v.detach().to("cpu").clone() for k, v in mac.agent.state_dict().items()}
+        self.requests.put((t_env, weights))
+
+    def drain(self, logger):
+        log_queued_stats(self.stats_queue, logger)
+
+    def close(self, logger):
+        # Waits for the tests already submitted and logs them
+        self.requests.put(None)
+        # A process only exits once everything it put on stats_queue has been read
+        while self.p.is_alive():
+            self.drain(logger)
+            self.p.join(timeout=0.1)
+        self.drain(logger)
+
+
+def evaluator_worker(args, scheme, groups, preprocess, requests, stats_queue):
+    import traceback
+    from components.episode_buffer import EpisodeBatch
+    from controllers import REGISTRY as mac_REGISTRY
+    from runners import REGISTRY as r_REGISTRY
+
+    try:
+        th.set_num_threads(1)
+        runner = r_REGISTRY[args.runner](args=args, logger=QueueLogger(stats_queue))
+        mac = mac_REGISTRY[args.mac](EpisodeBatch(scheme, groups, 1, 1, preprocess=preprocess).scheme, groups, args)
+        runner.setup(scheme=scheme, groups=groups, preprocess=preprocess, mac=mac)
+        n_test_runs = max(1, args.test_nepisode // runner.batch_size)
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            t_env, weights = request
+            mac.agent.load_state_dict(weights)
+            # The runner logs the test stats at its t_env. It never trains, so its train stats interval never runs out
+            runner.t_env = runner.log_train_stats_t = t_env
+            with th.no_grad():
+                for _ in range(n_test_runs):
+                    runner.run(test_mode=True)
+        runner.close_env()
+    except Exception:
+        stats_queue.put(("error", traceback.format_exc(), 0))
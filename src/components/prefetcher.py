@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+
+import torch as th
+
+from components.episode_buffer import SampleOutput
+
+
+# 后台线程预取训练用的batch：采样、截断、拷贝到learner所在的设备都不再占用主循环的时间
+class BatchPrefetcher:
+    """
+    Keeps up to `depth` training batches ready on a background thread. sample_fn(out) samples a batch truncated
+    to its filled timesteps straight into the staging SampleOutput `out`, which is reused, and the batch is then
+    moved to `device`. Anything that writes to the replay buffer (inserts, priority updates) has to hold `lock`.
+    """
+    def __init__(self, sample_fn, ready_fn, depth, device, buffer_device="cpu"):
+        self.sample_fn = sample_fn
+        self.ready_fn = ready_fn
+        self.device = device
+        # Batches going from a RAM buffer to the GPU are staged in pinned memory and copied on a side stream
+        self.pin = th.device(buffer_device).type == "cpu" and th.device(device).type == "cuda" and th.cuda.is_available()
+        self.stream = th.cuda.Stream() if self.pin else None
+
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=depth)
+        # depth batches waiting in the queue, one being filled and one in use by the learner
+        self.free_slots = queue.Queue()
+        for _ in range(depth + 2):
+            self.free_slots.put(SampleOutput(pin_memory=self.pin))
+        self.slot_in_use = None
+
+        self.wait_time, self.n_gets, self.n_starved = 0.0, 0, 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                slot = self._get_free_slot()
+                if slot is None:
+                    return
+                with self.lock:
+                    batch = self.sample_fn(slot) if self.ready_fn() else None
+                if batch is None:
+                    self.free_slots.put(slot)
+                    self.stop_event.wait(0.01)
+                    continue
+                self._put(self._transfer(batch, slot))
+        except Exception as e:
+            # Raised again on the main thread by get()
+            self._put((e, None))
+
+    def _get_free_slot(self):
+        while not self.stop_event.is_set():
+            try:
+                return self.free_slots.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def _put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                return self.queue.put(item, timeout=0.1)
+            except queue.Full:
+                pass
+
+    def _transfer(self, batch, slot):
+        if self.pin:
+            with th.cuda.stream(self.stream):
+                for fields in [batch.data.transition_data, batch.data.episode_data]:
+                    for k, v in fields.items():
+                        fields[k] = v.to(self.device, non_blocking=True)
+            self.stream.synchronize()
+            batch.device = self.device
+            # The batch now lives on the GPU, the staging buffers can be refilled straight away
+            self.free_slots.put(slot)
+            slot = None
+        elif th.device(batch.device) != th.device(self.device):
+            batch.to(self.device)
+        return batch, slot
+
+    def get(self):
+        # The learner is done with the previous batch once it asks for the next one
+        if self.slot_in_use is not None:
+            self.free_slots.put(self.slot_in_use)
+            self.slot_in_use = None
+        start = time.time()
+        self.n_starved += self.queue.empty()
+        batch, self.slot_in_use = self.queue.get()
+        self.wait_time += time.time() - start
+        self.n_gets += 1
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    def pop_stats(self):
+        # Mean time the learner waited for a batch and the fraction of requests that found the queue empty
+        stats = {}
+        if self.n_gets > 0:
+            stats["prefetch_wait_ms"] = 1000.0 * self.wait_time / self.n_gets
+            stats["prefetch_starved"] = self.n_starved / self.n_gets
+        self.wait_time, self.n_gets, self.n_starved = 0.0, 0, 0
+        return stats
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
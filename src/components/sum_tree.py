@@ -0,0 +1,46 @@
+import numpy as np
+
+
+class SumTree:
+    """
+    Binary tree over `capacity` leaves where each internal node holds the sum of its children.
+    Updating a leaf and finding the leaf at a given prefix sum are both O(log capacity), and are
+    vectorised over a batch of leaves.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.n_leaves = 1
+        while self.n_leaves < capacity:
+            self.n_leaves *= 2
+        # Node i has children 2i and 2i+1, the root is node 1 and leaf j is node n_leaves + j
+        self.tree = np.zeros(2 * self.n_leaves, dtype=np.float64)
+
+    def total(self):
+        return self.tree[1]
+
+    def get(self, idxs):
+        return self.tree[np.asarray(idxs) + self.n_leaves]
+
+    def update(self, idxs, values):
+        nodes = np.asarray(idxs, dtype=np.int64) + self.n_leaves
+        self.tree[nodes] = values
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, prefix_sums):
+        # Leaf index j such that sum(leaves[:j]) <= prefix_sum < sum(leaves[:j+1])
+        values = np.array(prefix_sums, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        while nodes[0] < self.n_leaves:
+            left = 2 * nodes
+            # Never step into an empty subtree because of floating point error
+            go_right = (values >= self.tree[left]) & (self.tree[left + 1] > 0)
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return nodes - self.n_leaves
+
+    def sample(self, n):
+        # Stratified sampling: one draw from each of n equal slices of the total
+        segment = self.total() / n
+        return self.find((np.arange(n) + np.random.uniform(size=n)) * segment)
@@ -1,5 +1,6 @@
 from modules.agents import REGISTRY as agent_REGISTRY
 from components.action_selectors import REGISTRY as action_REGISTRY
+from utils.th_utils import inference_mode
 import torch as th
 
 
@@ -10,6 +11,7 @@ class BasicMAC:
         self.n_agents = args.n_agents
         self.args = args
         input_shape = self._get_input_shape(scheme)
+        self.input_shape = input_shape
 
         self._build_agents(input_shape) # 创建一个rnn_agent
         # 智能体输出类型，这里是Q
@@ -20,26 +22,72 @@ class BasicMAC:
 
         # 隐藏状态
         self.hidden_states = None
+        self._agent_id_inputs = None
+        self._rollout_inputs = None
+        self._sequence_storage = None
 
     def select_actions(self, ep_batch, t_ep, t_env, bs=slice(None), test_mode=False):
         # Only select actions for the selected batch elements in bs
-        avail_actions = ep_batch["avail_actions"][:, t_ep]
-        agent_outputs = self.forward(ep_batch, t_ep, test_mode=test_mode)
-        chosen_actions = self.action_selector.select_action(agent_outputs[bs], avail_actions[bs], t_env, test_mode=test_mode)
-        return chosen_actions
-
-    def forward(self, ep_batch, t, test_mode=False):
-        agent_inputs = self._build_inputs(ep_batch, t)
-        avail_actions = ep_batch["avail_actions"][:, t]
+        # t_ep can also be a LongTensor holding the timestep of every episode in the batch
+        # Rollouts only: runs without autograd and only computes (and carries the hidden states of) the rows in bs
+        with inference_mode():
+            batch_size = ep_batch.batch_size
+            rows = th.arange(batch_size, device=ep_batch.device)[bs]
+            # bs holds distinct rows in ascending order, so as many rows as the batch has are all of them
+            all_rows = len(rows) == batch_size
+            if isinstance(t_ep, th.Tensor):
+                t_ep = t_ep.to(ep_batch.device)[rows]
+            avail_actions = self._at(ep_batch["avail_actions"], t_ep, rows, all_rows)
+            agent_inputs = self._build_rollout_inputs(ep_batch, t_ep, rows, all_rows)
+
+            hidden_states = self.hidden_states.reshape(batch_size, self.n_agents, -1)
+            agent_outs, h = self.agent(agent_inputs, hidden_states if all_rows else hidden_states[rows])
+            h = h.view(len(rows), self.n_agents, -1)
+            self.hidden_states = h if all_rows else hidden_states.index_copy(0, rows, h)
+
+            agent_outputs = self._agent_outputs(agent_outs, avail_actions, test_mode).view(len(rows), self.n_agents, -1)
+            return self.action_selector.select_action(agent_outputs, avail_actions, t_env, test_mode=test_mode)
+
+    def forward(self, ep_batch, t, test_mode=False, inputs=None):
+        # inputs: the agent inputs of every timestep from build_sequence_inputs, if built beforehand
+        agent_inputs = self._build_inputs(ep_batch, t) if inputs is None else inputs[t]
+        avail_actions = self._at(ep_batch["avail_actions"], t)
         agent_outs, self.hidden_states = self.agent(agent_inputs, self.hidden_states)
+        return self._agent_outputs(agent_outs, avail_actions, test_mode).view(ep_batch.batch_size, self.n_agents, -1)
+
+    def forward_sequence(self, ep_batch, inputs=None, max_t=None, test_mode=False, return_hidden_states=False):
+        # forward for timesteps 0 to max_t - 1 (all of them if None) in one call of the agent, from the hidden states
+        # set by init_hidden. Returns the agent outputs of every timestep, (batch_size, max_t, n_agents, -1), and the
+        # hidden states after each timestep with return_hidden_states. self.hidden_states are the ones after the last
+        if inputs is None:
+            inputs = self.build_sequence_inputs(ep_batch)
+        max_t = inputs.shape[0] if max_t is None else max_t
+        agent_outs, hidden_states = self.agent.forward_sequence(inputs[:max_t], self.hidden_states)
+        self.hidden_states = hidden_states[-1]
+
+        agent_outs = self._sequence_outputs(ep_batch, agent_outs, test_mode)
+        if return_hidden_states:
+            return agent_outs, hidden_states.view(max_t, ep_batch.batch_size, self.n_agents, -1).transpose(0, 1)
+        return agent_outs
+
+    def _sequence_outputs(self, ep_batch, agent_outs, test_mode):
+        # Agent outputs of forward_sequence, (max_t, batch_size * n_agents, -1), to (batch_size, max_t, n_agents, -1)
+        max_t, bs = agent_outs.shape[0], ep_batch.batch_size
+        avail_actions = None
+        if self.agent_output_type == "pi_logits":
+            avail_actions = ep_batch["avail_actions"][:, :max_t].transpose(0, 1)
+        agent_outs = self._agent_outputs(agent_outs.reshape(max_t * bs * self.n_agents, -1), avail_actions, test_mode)
+        return agent_outs.view(max_t, bs, self.n_agents, -1).transpose(0, 1).contiguous()
 
+    def _agent_outputs(self, agent_outs, avail_actions, test_mode):
         # Softmax the agent outputs if they're policy logits
         if self.agent_output_type == "pi_logits":
 
             if getattr(self.args, "mask_before_softmax", True):
                 # Make the logits for unavailable actions very negative to minimise their affect on the softmax
-                reshaped_avail_actions = avail_actions.reshape(ep_batch.batch_size * self.n_agents, -1)
-                agent_outs[reshaped_avail_actions == 0] = -1e10
+                reshaped_avail_actions = avail_actions.reshape(agent_outs.shape[0], -1)
+                unavailable = reshaped_avail_actions == 0
+                agent_outs[unavailable] = -1e10
 
             agent_outs = th.nn.functional.softmax(agent_outs, dim=-1)
             if not test_mode:
@@ -54,13 +102,19 @@ class BasicMAC:
 
                 if getattr(self.args, "mask_before_softmax", True):
                     # Zero out the unavailable actions
-                    agent_outs[reshaped_avail_actions == 0] = 0.0
+                    agent_outs[unavailable] = 0.0
 
-        return agent_outs.view(ep_batch.batch_size, self.n_agents, -1)
+        return agent_outs
 
     def init_hidden(self, batch_size):
         self.hidden_states = self.agent.init_hidden().unsqueeze(0).expand(batch_size, self.n_agents, -1)  # bav
 
+    def reset_hidden(self, bs):
+        # Starts new episodes in the batch rows bs while the other rows keep their hidden states
+        hidden_states = self.hidden_states.reshape(-1, self.n_agents, self.hidden_states.shape[-1]).clone()
+        hidden_states[bs] = self.agent.init_hidden()
+        self.hidden_states = hidden_states
+
     def parameters(self):
         return self.agent.parameters()
 
@@ -84,18 +138,88 @@ class BasicMAC:
         # Other MACs might want to e.g. delegate building inputs to each agent
         bs = batch.batch_size
         inputs = []
-        inputs.append(batch["obs"][:, t])  # b1av
+        inputs.append(self._at(batch["obs"], t))  # b1av
         if self.args.obs_last_action:
-            if t == 0:
-                inputs.append(th.zeros_like(batch["actions_onehot"][:, t]))
+            if isinstance(t, th.Tensor):
+                # No last action for the episodes at their first timestep
+                last_actions = self._at(batch["actions_onehot"], (t - 1).clamp(min=0))
+                inputs.append(last_actions * (t > 0).view(-1, 1, 1).to(last_actions.dtype))
+            elif t == 0:
+                inputs.append(batch["actions_onehot"].new_zeros(bs, self.n_agents, batch["actions_onehot"].shape[-1]))
             else:
                 inputs.append(batch["actions_onehot"][:, t-1])
         if self.args.obs_agent_id:
-            inputs.append(th.eye(self.n_agents, device=batch.device).unsqueeze(0).expand(bs, -1, -1))
+            inputs.append(self._agent_ids(batch.device).unsqueeze(0).expand(bs, -1, -1))
 
         inputs = th.cat([x.reshape(bs*self.n_agents, -1) for x in inputs], dim=1)
         return inputs
 
+    def build_sequence_inputs(self, batch):
+        # The inputs of _build_inputs for every timestep of batch at once, time first:
+        # (max_seq_length, batch_size * n_agents, input_shape), so that inputs[t] is what _build_inputs(batch, t)
+        # returns. They are written into storage kept between calls, so they are only valid until the next call
+        T, bs = batch.max_seq_length, batch.batch_size
+        size = T * bs * self.n_agents * self.input_shape
+        if self._sequence_storage is None or self._sequence_storage.numel() < size \
+                or self._sequence_storage.device != batch.device:
+            self._sequence_storage = th.empty(size, device=batch.device)
+        inputs = self._sequence_storage[:size].view(T, bs, self.n_agents, self.input_shape)
+
+        obs = batch["obs"]
+        inputs[..., :obs.shape[-1]] = obs.transpose(0, 1)
+        offset = obs.shape[-1]
+        if self.args.obs_last_action:
+            actions_onehot = batch["actions_onehot"]
+            n_actions = actions_onehot.shape[-1]
+            inputs[0, ..., offset:offset + n_actions] = 0
+            inputs[1:, ..., offset:offset + n_actions] = actions_onehot[:, :-1].transpose(0, 1)
+            offset += n_actions
+        if self.args.obs_agent_id:
+            inputs[..., offset:] = self._agent_ids(batch.device)
+        return inputs.view(T, bs * self.n_agents, self.input_shape)
+
+    def _agent_ids(self, device):
+        if self._agent_id_inputs is None or self._agent_id_inputs.device != device:
+            # Also used for training, so not an inference tensor even when made by select_actions
+            with inference_mode(False):
+                self._agent_id_inputs = th.eye(self.n_agents, device=device)
+        return self._agent_id_inputs
+
+    def _build_rollout_inputs(self, batch, t, rows, all_rows):
+        # The inputs of _build_inputs for the rows only, written into a buffer that is kept from step to step
+        n_rows = len(rows)
+        buffer = self._rollout_inputs
+        if buffer is None or buffer.shape[0] < n_rows or buffer.device != batch.device:
+            buffer = th.zeros(batch.batch_size, self.n_agents, self.input_shape, device=batch.device)
+            if self.args.obs_agent_id:
+                buffer[:, :, -self.n_agents:] = self._agent_ids(batch.device)
+            self._rollout_inputs = buffer
+        inputs = buffer[:n_rows]
+
+        obs = self._at(batch["obs"], t, rows, all_rows)
+        inputs[:, :, :obs.shape[-1]] = obs
+        if self.args.obs_last_action:
+            last_actions = inputs[:, :, obs.shape[-1]:obs.shape[-1] + batch["actions_onehot"].shape[-1]]
+            if isinstance(t, th.Tensor):
+                # No last action for the episodes at their first timestep
+                last_actions.copy_(self._at(batch["actions_onehot"], (t - 1).clamp(min=0), rows, all_rows))
+                last_actions.mul_((t > 0).view(-1, 1, 1))
+            elif t == 0:
+                last_actions.zero_()
+            else:
+                last_actions.copy_(self._at(batch["actions_onehot"], t - 1, rows, all_rows))
+        return inputs.view(n_rows * self.n_agents, -1)
+
+    @staticmethod
+    def _at(x, t, rows=None, all_rows=True):
+        # x[:, t], where t is a timestep or a LongTensor with one timestep per episode,
+        # or x[rows, t] if not all_rows (t then holds the timesteps of the rows)
+        if isinstance(t, th.Tensor):
+            if rows is None or all_rows:
+                rows = th.arange(x.shape[0], device=x.device)
+            return x[rows, t.to(x.device)]
+        return x[:, t] if all_rows else x[rows, t]
+
     def _get_input_shape(self, scheme):
         input_shape = scheme["obs"]["vshape"]
         if self.args.obs_last_action:
@@ -1,13 +1,37 @@
 from functools import partial
-from smac.env import MultiAgentEnv, StarCraft2Env
+from .multiagentenv import MultiAgentEnv, SequentialBatchEnv
+from .synthetic import SyntheticEnv
 import sys
 import os
 
-def env_fn(env, **kwargs) -> MultiAgentEnv:
-    return env(**kwargs)
+# smac is only needed for the sc2 env
+try:
+    from smac.env import StarCraft2Env
+except ImportError:
+    StarCraft2Env = None
+
+def env_args_for(env_args, env_index):
+    # Every instance built from the same env_args gets a seed of its own, seed + env_index, or they all replay the
+    # same episodes
+    seed = env_args.get("seed")
+    return env_args if seed is None else dict(env_args, seed=seed + env_index)
+
+def env_fn(env, n_envs=None, **kwargs) -> MultiAgentEnv:
+    if n_envs is None:
+        return env(**kwargs)
+    # n_envs instances behind the batched interface, see MultiAgentEnv.step_batch
+    if getattr(env, "batched", False):
+        return env(n_envs=n_envs, **kwargs)
+    return SequentialBatchEnv([partial(env, **env_args_for(kwargs, i)) for i in range(n_envs)])
 
 REGISTRY = {}
-REGISTRY["sc2"] = partial(env_fn, env=StarCraft2Env)
+if StarCraft2Env is not None:
+    REGISTRY["sc2"] = partial(env_fn, env=StarCraft2Env)
+REGISTRY["synthetic"] = partial(env_fn, env=SyntheticEnv)
+
+def make_env(env, env_args, env_index=0):
+    # Instance env_index of the registered env, seeded with env_args_for
+    return REGISTRY[env](**env_args_for(env_args, env_index))
 
 # 设置环境变量
 if sys.platform == "linux":
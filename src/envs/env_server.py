@@ -0,0 +1,143 @@
+import asyncio
+import ipaddress
+import pickle
+import socket
+import struct
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 远程环境的通信协议：每条消息是4字节长度加上pickle的内容
+# A request is (request_id, cmd, env_id, data), the reply (request_id, ok, result) where result is the traceback
+# if the command failed. Replies may come back out of order, so requests can be pipelined on one connection.
+# Unpickling a message can run arbitrary code, so whoever can connect to a server can run code on its machine:
+# servers only listen on loopback addresses unless told they may be insecure.
+_HEADER = struct.Struct("!I")
+
+
+async def read_message(reader):
+    header = await reader.readexactly(_HEADER.size)
+    return pickle.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+
+
+def write_message(writer, message):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_HEADER.pack(len(payload)) + payload)
+
+
+def _env_data(env):
+    return {
+        "state": np.asarray(env.get_state(), dtype=np.float32),
+        "avail_actions": np.asarray(env.get_avail_actions(), dtype=np.int32),
+        "obs": np.asarray(env.get_obs(), dtype=np.float32)
+    }
+
+
+class EnvServer:
+    """
+    Serves instances of any MultiAgentEnv over TCP, created by env_fn(env_id) the first time a client uses their
+    env_id (e.g. envs.make_env, which seeds every instance by its env_id).
+    Commands are run on a pool of threads, so the steps of different envs overlap while they wait (on a game,
+    a socket or time.sleep). reset and step reply with the state, avail_actions and obs that follow.
+    """
+    def __init__(self, env_fn, threads=32):
+        self.env_fn = env_fn
+        self.envs = {}
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+
+    def _env(self, env_id):
+        if env_id not in self.envs:
+            self.envs[env_id] = self.env_fn(env_id)
+        return self.envs[env_id]
+
+    def _run(self, cmd, env_id, data):
+        if cmd == "close":
+            env = self.envs.pop(env_id, None)
+            if env is not None:
+                env.close()
+            return None
+        env = self._env(env_id)
+        if cmd == "reset":
+            env.reset()
+            return _env_data(env)
+        elif cmd == "step":
+            reward, terminated, info = env.step(data)
+            return dict(_env_data(env), reward=reward, terminated=terminated, info=info)
+        elif cmd == "get_env_info":
+            return env.get_env_info()
+        elif cmd == "get_stats":
+            return env.get_stats()
+        raise NotImplementedError(cmd)
+
+    async def _handle(self, request, writer):
+        request_id, cmd, env_id, data = request
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, self._run, cmd, env_id, data)
+            write_message(writer, (request_id, True, result))
+        except Exception:
+            write_message(writer, (request_id, False, traceback.format_exc()))
+
+    async def handle_connection(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                task = asyncio.create_task(self._handle(await read_message(reader), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def serve(self, host, port, port_conn=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if port_conn is not None:
+            # Tells the parent which port was picked when port is 0
+            port_conn.send(server.sockets[0].getsockname()[1])
+            port_conn.close()
+        async with server:
+            await server.serve_forever()
+
+
+def is_loopback(host):
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (socket.gaierror, UnicodeError):
+        return False
+    return all(ipaddress.ip_address(address.split("%")[0]).is_loopback for address in addresses)
+
+
+def serve_forever(env_fn, host="127.0.0.1", port=0, threads=32, port_conn=None, insecure=False):
+    if not insecure and not is_loopback(host):
+        raise ValueError("The env server unpickles what it receives, so anyone who can connect to {} can run code on "
+                         "this machine. Only serve beyond loopback on a trusted network, with insecure=True "
+                         "(--insecure)".format(host))
+    if hasattr(env_fn, "x"):  # CloudpickleWrapper handed over by the runner
+        env_fn = env_fn.x
+    asyncio.run(EnvServer(env_fn, threads).serve(host, port, port_conn))
+
+
+if __name__ == "__main__":
+    # Stand-in env server, run from src/: python3 -m envs.env_server --env synthetic --port 9000
+    import argparse
+    import json
+    from functools import partial
+    from envs import make_env
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--env", default="synthetic")
+    parser.add_argument("--env-args", default="{}", help="JSON dict of env_args")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address to listen on. WARNING: requests are unpickled, so anyone who can reach the "
+                             "server can run arbitrary code on this machine. Hosts other than loopback need "
+                             "--insecure and must only be used on a trusted network")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--insecure", action="store_true",
+                        help="allow a --host that is not a loopback address")
+    cfg = parser.parse_args()
+    serve_forever(partial(make_env, cfg.env, json.loads(cfg.env_args)), cfg.host, cfg.port, cfg.threads,
+                  insecure=cfg.insecure)
@@ -1,3 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
 # 这只是一个接口，里面的方法都必须要由子类实现
 # StarCraft2Env就是继承的这个接口，并且实现了其中的方法
 
@@ -73,3 +78,101 @@ class MultiAgentEnv(object):
                     "n_agents": self.n_agents,
                     "episode_limit": self.episode_limit}
         return env_info
+
+    # --- Optional batched interface ---
+    # An env with batched = True holds n_envs instances (its constructor takes n_envs) and steps all of them in one
+    # call. Every method works on all the instances and returns arrays stacked over them (first dimension n_envs).
+    # mask, where given, is a bool array of shape (n_envs,) selecting the instances to act on, the others are left
+    # as they are. Envs without it can still be driven in batches through SequentialBatchEnv.
+    batched = False
+
+    def reset_batch(self, mask=None):
+        """ Resets the instances in mask (all of them if None) """
+        raise NotImplementedError
+
+    def step_batch(self, actions, mask=None):
+        """ actions is (n_envs, n_agents), only the rows in mask are used. Returns rewards (n_envs,), terminated
+            (n_envs,) and infos, a dict of (n_envs,) arrays; entries of the instances not in mask are 0 """
+        raise NotImplementedError
+
+    def get_obs_batch(self):
+        """ Returns the observations of every instance, (n_envs, n_agents, obs_size) """
+        raise NotImplementedError
+
+    def get_state_batch(self):
+        """ Returns the states of every instance, (n_envs, state_size) """
+        raise NotImplementedError
+
+    def get_avail_actions_batch(self):
+        """ Returns the available actions of every instance, (n_envs, n_agents, n_actions) """
+        raise NotImplementedError
+
+
+class SequentialBatchEnv(MultiAgentEnv):
+    """ The batched interface over n_envs single envs, which are stepped one after the other """
+    batched = True
+
+    def __init__(self, env_fns):
+        self.envs = [env_fn() for env_fn in env_fns]
+        self.n_envs = len(self.envs)
+        self.env_info = self.envs[0].get_env_info()
+        self.n_agents = self.env_info["n_agents"]
+        self.episode_limit = self.env_info["episode_limit"]
+
+    def _instances(self, mask):
+        return range(self.n_envs) if mask is None else np.flatnonzero(mask)
+
+    def _map(self, fn, instances):
+        return [fn(i) for i in instances]
+
+    def reset_batch(self, mask=None):
+        self._map(lambda i: self.envs[i].reset(), self._instances(mask))
+
+    def step_batch(self, actions, mask=None):
+        rewards = np.zeros(self.n_envs, dtype=np.float32)
+        terminated = np.zeros(self.n_envs, dtype=bool)
+        infos = {}
+        instances = self._instances(mask)
+        results = self._map(lambda i: self.envs[i].step(actions[i]), instances)
+        for i, (reward, env_terminated, info) in zip(instances, results):
+            rewards[i], terminated[i] = reward, env_terminated
+            for k, v in info.items():
+                infos.setdefault(k, np.zeros(self.n_envs))[i] = v
+        return rewards, terminated, infos
+
+    def get_obs_batch(self):
+        return np.stack([np.stack(env.get_obs()) for env in self.envs])
+
+    def get_state_batch(self):
+        return np.stack([env.get_state() for env in self.envs])
+
+    def get_avail_actions_batch(self):
+        return np.stack([np.asarray(env.get_avail_actions()) for env in self.envs])
+
+    def get_env_info(self):
+        return self.env_info
+
+    def get_stats(self):
+        return [env.get_stats() for env in self.envs]
+
+    def save_replay(self):
+        self.envs[0].save_replay()
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+class ThreadPoolBatchEnv(SequentialBatchEnv):
+    """ SequentialBatchEnv that resets and steps the instances on n_threads threads (one per instance if None).
+        Only pays off for envs whose step releases the GIL, e.g. native code or waiting on a socket """
+    def __init__(self, env_fns, n_threads=None):
+        super(ThreadPoolBatchEnv, self).__init__(env_fns)
+        self.pool = ThreadPoolExecutor(max_workers=n_threads or self.n_envs)
+
+    def _map(self, fn, instances):
+        return list(self.pool.map(fn, instances))
+
+    def close(self):
+        super(ThreadPoolBatchEnv, self).close()
+        self.pool.shutdown()
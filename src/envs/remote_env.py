@@ -0,0 +1,143 @@
+import asyncio
+
+import numpy as np
+
+from .env_server import read_message, write_message
+from .multiagentenv import MultiAgentEnv
+
+
+class _Connection:
+    # One connection to an env server, shared by all the envs on it. Requests are written without waiting for the
+    # replies of the earlier ones, a reader task hands every reply to the request waiting for it
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.next_id = 0
+        self.waiting = {}
+        self.reader_task = asyncio.get_running_loop().create_task(self._read_replies())
+
+    @classmethod
+    async def open(cls, endpoint):
+        host, port = endpoint.rsplit(":", 1)
+        return cls(*await asyncio.open_connection(host, int(port)))
+
+    async def _read_replies(self):
+        try:
+            while True:
+                request_id, ok, result = await read_message(self.reader)
+                future = self.waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError("Env server error:\n" + result))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Env server connection lost: {!r}".format(e)))
+            self.waiting.clear()
+
+    async def request(self, cmd, env_id, data, timeout):
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        write_message(self.writer, (request_id, cmd, env_id, data))
+        await self.writer.drain()
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("No reply to {} of env {} within {}s".format(cmd, env_id, timeout)) from None
+        finally:
+            self.waiting.pop(request_id, None)
+
+    async def close(self):
+        self.reader_task.cancel()
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+        self.writer.close()
+
+
+# 通过asyncio同时驱动很多远程环境，每个服务器一个复用的连接，请求可以连续发送不用等回复
+class RemoteBatchEnv(MultiAgentEnv):
+    """
+    The batched interface over n_envs envs served by env servers (envs/env_server.py) at endpoints ("host:port"),
+    spread over them round robin. Every call sends the requests of all the envs at once over one connection per
+    endpoint and waits for the replies on an event loop of its own, so however many envs there are, a step of the
+    batch takes about as long as the slowest env. A request without a reply after timeout seconds raises.
+    """
+    batched = True
+
+    def __init__(self, endpoints, n_envs, timeout=30.0):
+        self.n_envs = n_envs
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.connections = self._run_all([_Connection.open(endpoint) for endpoint in endpoints])
+        self.env_info = self._gather("get_env_info", [0])[0]
+        self.n_agents = self.env_info["n_agents"]
+        self.episode_limit = self.env_info["episode_limit"]
+
+        self.state = np.zeros((n_envs, self.env_info["state_shape"]), dtype=np.float32)
+        self.avail_actions = np.zeros((n_envs, self.n_agents, self.env_info["n_actions"]), dtype=np.int32)
+        self.obs = np.zeros((n_envs, self.n_agents, self.env_info["obs_shape"]), dtype=np.float32)
+
+    def _gather(self, cmd, instances, data=None):
+        # Env i is env_id i on endpoint i % len(endpoints), replies are in the order of instances
+        requests = [self.connections[i % len(self.connections)].request(
+            cmd, int(i), None if data is None else data[i], self.timeout) for i in instances]
+        return self._run_all(requests)
+
+    def _run_all(self, coroutines):
+        async def run_all():
+            return await asyncio.gather(*coroutines)
+        return self.loop.run_until_complete(run_all())
+
+    def _instances(self, mask):
+        return np.arange(self.n_envs) if mask is None else np.flatnonzero(mask)
+
+    def _store(self, instances, replies):
+        for i, reply in zip(instances, replies):
+            self.state[i] = reply["state"]
+            self.avail_actions[i] = reply["avail_actions"]
+            self.obs[i] = reply["obs"]
+
+    def reset_batch(self, mask=None):
+        instances = self._instances(mask)
+        self._store(instances, self._gather("reset", instances))
+
+    def step_batch(self, actions, mask=None):
+        rewards = np.zeros(self.n_envs, dtype=np.float32)
+        terminated = np.zeros(self.n_envs, dtype=bool)
+        infos = {}
+        instances = self._instances(mask)
+        replies = self._gather("step", instances, data=actions)
+        self._store(instances, replies)
+        for i, reply in zip(instances, replies):
+            rewards[i], terminated[i] = reply["reward"], reply["terminated"]
+            for k, v in reply["info"].items():
+                infos.setdefault(k, np.zeros(self.n_envs))[i] = v
+        return rewards, terminated, infos
+
+    def get_obs_batch(self):
+        return self.obs
+
+    def get_state_batch(self):
+        return self.state
+
+    def get_avail_actions_batch(self):
+        return self.avail_actions
+
+    def get_env_info(self):
+        return self.env_info
+
+    def get_stats(self):
+        return self._gather("get_stats", self._instances(None))
+
+    def save_replay(self):
+        pass
+
+    def close(self):
+        try:
+            self._gather("close", self._instances(None))
+        finally:
+            self._run_all([c.close() for c in self.connections])
+            self.loop.close()
@@ -0,0 +1,161 @@
+import time
+
+import numpy as np
+
+from .multiagentenv import MultiAgentEnv
+
+
+# 纯NumPy的合成环境，不需要StarCraft II，用来测runner、buffer和learner本身的开销
+class SyntheticEnv(MultiAgentEnv):
+    """
+    A stand-in multi-agent env in pure NumPy, to run and time the framework without StarCraft II.
+
+    Observations and states are random, a few of the actions of every agent are made unavailable at random each
+    step (avail_actions_sparsity is the share of them, action 0 always stays available). Each agent is rewarded
+    for picking a target action, which is one-hot encoded at the start of its observation, so learning can be
+    checked too. Episode lengths are drawn at reset:
+        "fixed"     always episode_limit steps
+        "uniform"   between min_episode_length and episode_limit
+        "geometric" ends every step with probability 1 / mean_episode_length, cut at episode_limit
+    step_cost seconds are spent busy in every step of every instance, as for a simulator of that cost.
+
+    With n_envs it holds that many instances and implements the batched interface (step_batch and friends) with
+    whole-array operations, the single env interface then acts on the first instance.
+    """
+    batched = True
+
+    def __init__(self, n_agents=5, n_actions=10, obs_shape=80, state_shape=120, episode_limit=100,
+                 episode_length="uniform", min_episode_length=20, mean_episode_length=60, step_cost=0.0,
+                 avail_actions_sparsity=0.0, seed=None, n_envs=None):
+        self.n_agents = n_agents
+        self.n_actions = n_actions
+        self.obs_shape = obs_shape
+        self.state_shape = state_shape
+        self.episode_limit = episode_limit
+        if episode_length not in ("fixed", "uniform", "geometric"):
+            raise ValueError("Unknown episode_length {}".format(episode_length))
+        self.episode_length = episode_length
+        self.min_episode_length = min(max(1, min_episode_length), episode_limit)
+        self.mean_episode_length = mean_episode_length
+        self.step_cost = step_cost
+        self.avail_actions_sparsity = avail_actions_sparsity
+        self.n_envs = 1 if n_envs is None else n_envs
+        self.rng = np.random.RandomState(seed)
+
+        shape = (self.n_envs, n_agents)
+        self.t = np.zeros(self.n_envs, dtype=np.int64)
+        self.lengths = np.zeros(self.n_envs, dtype=np.int64)
+        self.obs = np.zeros(shape + (obs_shape,), dtype=np.float32)
+        self.state = np.zeros((self.n_envs, state_shape), dtype=np.float32)
+        self.avail_actions = np.ones(shape + (n_actions,), dtype=np.int64)
+        self.targets = np.zeros(shape, dtype=np.int64)
+        self.reset_batch()
+
+    def _draw_lengths(self, n):
+        if self.episode_length == "fixed":
+            return np.full(n, self.episode_limit)
+        if self.episode_length == "uniform":
+            return self.rng.randint(self.min_episode_length, self.episode_limit + 1, size=n)
+        return np.minimum(self.rng.geometric(1.0 / max(1.0, self.mean_episode_length), size=n), self.episode_limit)
+
+    def _observe(self, envs):
+        n = len(envs)
+        avail = (self.rng.rand(n, self.n_agents, self.n_actions) >= self.avail_actions_sparsity).astype(np.int64)
+        avail[:, :, 0] = 1
+        # Target: a random available action of every agent
+        targets = np.argmax(avail * self.rng.rand(n, self.n_agents, self.n_actions), axis=-1)
+        obs = self.rng.randn(n, self.n_agents, self.obs_shape).astype(np.float32)
+        n_hot = min(self.n_actions, self.obs_shape)
+        obs[:, :, :n_hot] = np.eye(self.n_actions, n_hot, dtype=np.float32)[targets]
+        self.avail_actions[envs] = avail
+        self.targets[envs] = targets
+        self.obs[envs] = obs
+        self.state[envs] = self.rng.randn(n, self.state_shape).astype(np.float32)
+
+    def _spend(self, n_steps):
+        if self.step_cost > 0:
+            end = time.perf_counter() + n_steps * self.step_cost
+            while time.perf_counter() < end:
+                pass
+
+    # --- Batched interface ---
+    def reset_batch(self, mask=None):
+        envs = np.arange(self.n_envs) if mask is None else np.flatnonzero(mask)
+        self.t[envs] = 0
+        self.lengths[envs] = self._draw_lengths(len(envs))
+        self._observe(envs)
+
+    def step_batch(self, actions, mask=None):
+        envs = np.arange(self.n_envs) if mask is None else np.flatnonzero(mask)
+        actions = np.asarray(actions).reshape(self.n_envs, self.n_agents)[envs]
+        self._spend(len(envs))
+
+        rewards = np.zeros(self.n_envs, dtype=np.float32)
+        terminated = np.zeros(self.n_envs, dtype=bool)
+        episode_limit = np.zeros(self.n_envs)
+        rewards[envs] = (actions == self.targets[envs]).mean(axis=1)
+        self.t[envs] += 1
+        terminated[envs] = self.t[envs] >= self.lengths[envs]
+        episode_limit[envs] = terminated[envs] & (self.t[envs] >= self.episode_limit)
+        self._observe(envs)
+        return rewards, terminated, {"episode_limit": episode_limit}
+
+    def get_obs_batch(self):
+        return self.obs
+
+    def get_state_batch(self):
+        return self.state
+
+    def get_avail_actions_batch(self):
+        return self.avail_actions
+
+    # --- Single env interface, on the first instance ---
+    def reset(self):
+        self.reset_batch(np.arange(self.n_envs) == 0)
+        return self.get_obs(), self.get_state()
+
+    def step(self, actions):
+        batch_actions = np.zeros((self.n_envs, self.n_agents), dtype=np.int64)
+        batch_actions[0] = np.asarray(actions).reshape(-1)
+        rewards, terminated, infos = self.step_batch(batch_actions, np.arange(self.n_envs) == 0)
+        info = {"episode_limit": True} if infos["episode_limit"][0] else {}
+        return float(rewards[0]), bool(terminated[0]), info
+
+    def get_obs(self):
+        return list(self.obs[0])
+
+    def get_obs_agent(self, agent_id):
+        return self.obs[0, agent_id]
+
+    def get_obs_size(self):
+        return self.obs_shape
+
+    def get_state(self):
+        return self.state[0]
+
+    def get_state_size(self):
+        return self.state_shape
+
+    def get_avail_actions(self):
+        return self.avail_actions[0].tolist()
+
+    def get_avail_agent_actions(self, agent_id):
+        return self.avail_actions[0, agent_id].tolist()
+
+    def get_total_actions(self):
+        return self.n_actions
+
+    def get_stats(self):
+        return {}
+
+    def render(self):
+        pass
+
+    def close(self):
+        pass
+
+    def seed(self):
+        return None
+
+    def save_replay(self):
+        pass
@@ -2,6 +2,7 @@ import copy
 from components.episode_buffer import EpisodeBatch
 from modules.mixers.vdn import VDNMixer
 from modules.mixers.qmix import QMixer
+from utils.rl_utils import build_n_step_returns
 import torch as th
 from torch.optim import RMSprop
 
@@ -48,32 +49,25 @@ class QLearner:
         avail_actions = batch["avail_actions"]
 
         # Calculate estimated Q-Values
-        mac_out = []
+        # The agent inputs of all timesteps, built once for the online and target passes
+        inputs = self.mac.build_sequence_inputs(batch) if getattr(self.args, "learner_sequence_inputs", True) else None
 
         # 初始化隐藏层
         self.mac.init_hidden(batch.batch_size)
+        self.target_mac.init_hidden(batch.batch_size)
+
+        # 一次算出所有时间步的Q值，输出的是batch_size*max_seq_length*n_agents*n_actions的张量
+        mac_out = self.mac.forward_sequence(batch, inputs=inputs)
 
-        # 一个batch中含有32条轨迹的数据，每个轨迹，有max_seq_length条经验，这里应该是每次取32条经验，取max_seq_length次
-        for t in range(batch.max_seq_length):
-            # 计算Q值
-            # 输出的是一个32*5*11的张量，因为它的
-            agent_outs = self.mac.forward(batch, t=t)
-            mac_out.append(agent_outs)
-        mac_out = th.stack(mac_out, dim=1)  # Concat over time
+        # Calculate the Q-Values necessary for the target
+        with th.no_grad():
+            target_mac_out = self.target_mac.forward_sequence(batch, inputs=inputs)
 
         # Pick the Q-Values for the actions taken by each agent
         chosen_action_qvals = th.gather(mac_out[:, :-1], dim=3, index=actions).squeeze(3)  # Remove the last dim
 
-
-        # Calculate the Q-Values necessary for the target
-        target_mac_out = []
-        self.target_mac.init_hidden(batch.batch_size)
-        for t in range(batch.max_seq_length):
-            target_agent_outs = self.target_mac.forward(batch, t=t)
-            target_mac_out.append(target_agent_outs)
-
         # We don't need the first timesteps Q-Value estimate for calculating targets
-        target_mac_out = th.stack(target_mac_out[1:], dim=1)  # Concat across time
+        target_mac_out = target_mac_out[:, 1:]
 
         # Mask out unavailable actions
         target_mac_out[avail_actions[:, 1:] == 0] = -9999999
@@ -94,8 +88,22 @@ class QLearner:
             chosen_action_qvals = self.mixer(chosen_action_qvals, batch["state"][:, :-1])
             target_max_qvals = self.target_mixer(target_max_qvals, batch["state"][:, 1:])
 
-        # Calculate 1-step Q-Learning targets
-        targets = rewards + self.args.gamma * (1 - terminated) * target_max_qvals
+        n_step = getattr(self.args, "n_step", 1)
+        if n_step > 1:
+            # Calculate n-step Q-Learning targets, from the buffer when it computed them on insert
+            if "reward_nstep" in batch.data.transition_data:
+                rewards_n = batch["reward_nstep"][:, :-1]
+                bootstrap_index = batch["nstep_index"][:, :-1]
+                discount = batch["nstep_discount"][:, :-1]
+            else:
+                rewards_n, bootstrap_index, discount = build_n_step_returns(rewards, terminated, mask, self.args.gamma, n_step)
+            # target_max_qvals[:, t] is the value of the state at t + 1
+            bootstrap_index = (bootstrap_index - 1).clamp(0, target_max_qvals.shape[1] - 1)
+            target_max_qvals = th.gather(target_max_qvals, 1, bootstrap_index.expand(-1, -1, target_max_qvals.shape[2]))
+            targets = rewards_n + discount * target_max_qvals
+        else:
+            # Calculate 1-step Q-Learning targets
+            targets = rewards + self.args.gamma * (1 - terminated) * target_max_qvals
         # Td-error
         td_error = (chosen_action_qvals - targets.detach())
 
@@ -105,7 +113,12 @@ class QLearner:
         masked_td_error = td_error * mask
 
         # Normal L2 loss, take mean over actual data
-        loss = (masked_td_error ** 2).sum() / mask.sum()
+        if "weights" in batch.data.episode_data:
+            # Importance sampling weights of a prioritized replay buffer
+            weights = batch["weights"].view(-1, 1, 1)
+            loss = (weights * masked_td_error ** 2).sum() / mask.sum()
+        else:
+            loss = (masked_td_error ** 2).sum() / mask.sum()
 
         # Optimise
         self.optimiser.zero_grad()
@@ -126,6 +139,9 @@ class QLearner:
             self.logger.log_stat("target_mean", (targets * mask).sum().item()/(mask_elems * self.args.n_agents), t_env)
             self.log_stats_t = t_env
 
+        # Mean absolute TD-error of each episode, used as its priority by a prioritized replay buffer
+        return masked_td_error.detach().abs().reshape(batch.batch_size, -1).sum(1) / mask.reshape(batch.batch_size, -1).sum(1).clamp(min=1)
+
     def _update_targets(self):
         self.target_mac.load_state(self.mac)
         if self.mixer is not None:
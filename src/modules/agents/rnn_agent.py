@@ -8,7 +8,9 @@ class RNNAgent(nn.Module):
         self.args = args
 
         self.fc1 = nn.Linear(input_shape, args.rnn_hidden_dim)
-        self.rnn = nn.GRUCell(args.rnn_hidden_dim, args.rnn_hidden_dim)
+        # One layer nn.GRU, run one timestep at a time by forward and over whole sequences by forward_sequence. Its
+        # initial weights are the ones nn.GRUCell would draw
+        self.rnn = nn.GRU(args.rnn_hidden_dim, args.rnn_hidden_dim)
         self.fc2 = nn.Linear(args.rnn_hidden_dim, args.n_actions)
 
     def init_hidden(self):
@@ -18,6 +20,23 @@ class RNNAgent(nn.Module):
     def forward(self, inputs, hidden_state):
         x = F.relu(self.fc1(inputs))
         h_in = hidden_state.reshape(-1, self.args.rnn_hidden_dim)
-        h = self.rnn(x, h_in)
+        h = self.rnn(x.unsqueeze(0), h_in.unsqueeze(0))[0][0]
         q = self.fc2(h)
         return q, h
+
+    def forward_sequence(self, inputs, hidden_state):
+        # forward over T timesteps at once, inputs: (T, N, input_shape). fc1 and fc2 run on all the timesteps in one
+        # go and the recurrence in a single call of the GRU.
+        # Returns the q of every timestep (T, N, n_actions) and the hidden states after each of them (T, N, hidden)
+        x = F.relu(self.fc1(inputs))
+        h_in = hidden_state.reshape(1, -1, self.args.rnn_hidden_dim)
+        h, _ = self.rnn(x, h_in)
+        q = self.fc2(h)
+        return q, h
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Models saved when rnn was an nn.GRUCell name its weights without the _l0 of the layer
+        for name in ["weight_ih", "weight_hh", "bias_ih", "bias_hh"]:
+            if prefix + "rnn." + name in state_dict:
+                state_dict[prefix + "rnn." + name + "_l0"] = state_dict.pop(prefix + "rnn." + name)
+        super(RNNAgent, self)._load_from_state_dict(state_dict, prefix, *args, **kwargs)
@@ -4,6 +4,7 @@ import pprint
 import time
 import threading
 import torch as th
+from contextlib import nullcontext
 from types import SimpleNamespace as SN
 from utils.logging import Logger
 from utils.timehelper import time_left, time_str
@@ -12,7 +13,13 @@ from os.path import dirname, abspath
 from learners import REGISTRY as le_REGISTRY
 from runners import REGISTRY as r_REGISTRY
 from controllers import REGISTRY as mac_REGISTRY
-from components.episode_buffer import ReplayBuffer
+from components.episode_buffer import ReplayBuffer, PackedReplayBuffer, PrioritizedReplayBuffer, SharedReplayBuffer
+from components.buffer_storage import MemoryStorage, MemmapStorage, SharedMemoryStorage
+from components.prefetcher import BatchPrefetcher
+from components.actor_pool import ActorPool
+from components.evaluator import Evaluator
+from components.episode_fields import NStepReturns
+from components.codecs import Float16Codec, AffineUint8Codec, BitPackCodec, DerivedCodec
 from components.transforms import OneHot
 
 # 主函数运行
@@ -118,9 +125,28 @@ def run_sequential(args, logger):
     }
 
     # 经验回放缓冲
-    buffer = ReplayBuffer(scheme, groups, args.buffer_size, env_info["episode_limit"] + 1,
-                          preprocess=preprocess,
-                          device="cpu" if args.buffer_cpu_only else args.device)
+    buffer_kwargs = dict(preprocess=preprocess,
+                         device="cpu" if args.buffer_cpu_only else args.device,
+                         sampler=args.buffer_sampler,
+                         reuse_sample_output=args.buffer_reuse_sample_output,
+                         storage=build_buffer_storage(args),
+                         codecs=build_buffer_codecs(args, scheme, preprocess))
+    if args.n_step > 1:
+        # n-step returns are computed once per episode on insert instead of for every sampled batch
+        buffer_kwargs["episode_fields"] = [NStepReturns(args.n_step, args.gamma)]
+    if args.prioritized_buffer:
+        buffer = PrioritizedReplayBuffer(scheme, groups, args.buffer_size, env_info["episode_limit"] + 1,
+                                         alpha=args.prioritized_alpha, beta=args.prioritized_beta, t_max=args.t_max,
+                                         eps=args.prioritized_eps, **buffer_kwargs)
+    elif args.buffer_packed:
+        buffer_steps = args.buffer_packed_steps or args.buffer_size * (env_info["episode_limit"] + 1) // 2
+        buffer = PackedReplayBuffer(scheme, groups, args.buffer_size, env_info["episode_limit"] + 1,
+                                    max(buffer_steps, env_info["episode_limit"] + 1), **buffer_kwargs)
+    elif args.buffer_backend == "shared":
+        buffer = SharedReplayBuffer(scheme, groups, args.buffer_size, env_info["episode_limit"] + 1, **buffer_kwargs)
+    else:
+        buffer = ReplayBuffer(scheme, groups, args.buffer_size, env_info["episode_limit"] + 1, **buffer_kwargs)
+    logger.console_logger.info("Replay buffer storage:\n" + buffer.storage_report())
     # logger.console_logger.info(args)
     # Setup multiagent controller here
 
@@ -146,6 +172,7 @@ def run_sequential(args, logger):
 
         if not os.path.isdir(args.checkpoint_path):
             logger.console_logger.info("Checkpoint directiory {} doesn't exist".format(args.checkpoint_path))
+            buffer.close()
             return
 
         # Go through all files in args.checkpoint_path
@@ -168,10 +195,25 @@ def run_sequential(args, logger):
         learner.load_models(model_path)
         runner.t_env = timestep_to_load
 
+        buffer_path = os.path.join(model_path, "buffer")
+        if os.path.isfile(os.path.join(buffer_path, "meta.json")) and not (args.evaluate or args.save_replay):
+            start = time.time()
+            buffer.load(buffer_path, mmap=args.buffer_load_mmap)
+            logger.console_logger.info("Restored {} episodes into the replay buffer from {} in {:.1f}s".format(
+                buffer.episodes_in_buffer, buffer_path, time.time() - start))
+
         if args.evaluate or args.save_replay:
             evaluate_sequential(args, runner)
+            buffer.close()
             return
 
+    # 测试在单独的进程里跑，不阻塞训练
+    evaluator = Evaluator(args, scheme, groups, preprocess) if args.async_test else None
+
+    if args.actor_learner:
+        run_actor_learner(args, logger, runner, buffer, learner, mac, scheme, groups, preprocess, evaluator)
+        return
+
     # start training
     # 注意：后面带t的，都是指时间步，带time的应该都是指真实时间
     episode = 0
@@ -182,6 +224,18 @@ def run_sequential(args, logger):
     # 模型保存的时间
     model_save_time = 0
 
+    def sample_batch(out=None):
+        if args.prioritized_buffer:
+            return buffer.sample(args.batch_size, runner.t_env, out=out)
+        return buffer.sample(args.batch_size, out=out)
+
+    # 后台线程预取batch，写buffer时要持有prefetcher.lock
+    prefetcher = None
+    if args.prefetch_depth > 0:
+        prefetcher = BatchPrefetcher(sample_batch, lambda: buffer.can_sample(args.batch_size), args.prefetch_depth,
+                                     args.device, buffer_kwargs["device"])
+    buffer_lock = nullcontext() if prefetcher is None else prefetcher.lock
+
     start_time = time.time()
     last_time = start_time
 
@@ -196,24 +250,34 @@ def run_sequential(args, logger):
         episode_batch = runner.run(test_mode=False)
 
         # 把这个episode_batch数据放进缓冲区里
-        buffer.insert_episode_batch(episode_batch)
+        with buffer_lock:
+            buffer.insert_episode_batch(episode_batch)
 
         # 收集了32个episode后，才可以采样，因为一个batch_size是32个episode的数据
         if buffer.can_sample(args.batch_size):
-            episode_sample = buffer.sample(args.batch_size)
-
-            # Truncate batch to only filled timesteps
-            # 返回这32个episodes里面最长的那个序列的长度
-            max_ep_t = episode_sample.max_t_filled()
-
-            # 对这32个episodes的数据按照最长序列的长度进行切片
-            episode_sample = episode_sample[:, :max_ep_t]
-
-            # 有显卡的话将数据发送到显卡
-            if episode_sample.device != args.device:
-                episode_sample.to(args.device)
-
-            learner.train(episode_sample, runner.t_env, episode)
+            if prefetcher is not None:
+                # Already truncated and on args.device
+                episode_sample = prefetcher.get()
+            else:
+                episode_sample = sample_batch()
+
+                # Truncate batch to only filled timesteps
+                # 返回这32个episodes里面最长的那个序列的长度
+                max_ep_t = episode_sample.max_t_filled()
+
+                # 对这32个episodes的数据按照最长序列的长度进行切片
+                # (samples gathered into a SampleOutput are already truncated)
+                if max_ep_t < episode_sample.max_seq_length:
+                    episode_sample = episode_sample[:, :max_ep_t]
+
+                # 有显卡的话将数据发送到显卡
+                if episode_sample.device != args.device:
+                    episode_sample.to(args.device)
+
+            priorities = learner.train(episode_sample, runner.t_env, episode)
+            if args.prioritized_buffer:
+                with buffer_lock:
+                    buffer.update_priorities(episode_sample["ep_ids"], priorities)
 
         # Execute test runs once in a while
         n_test_runs = max(1, args.test_nepisode // runner.batch_size)
@@ -225,8 +289,11 @@ def run_sequential(args, logger):
             last_time = time.time()
 
             last_test_T = runner.t_env
-            for _ in range(n_test_runs):
-                runner.run(test_mode=True)
+            if evaluator is not None:
+                evaluator.submit(mac, runner.t_env)
+            else:
+                for _ in range(n_test_runs):
+                    runner.run(test_mode=True)
 
         if args.save_model and (runner.t_env - model_save_time >= args.save_model_interval or model_save_time == 0):
             model_save_time = runner.t_env
@@ -239,17 +306,151 @@ def run_sequential(args, logger):
             # use appropriate filenames to do critics, optimizer states
             learner.save_models(save_path)
 
-        episode += args.batch_size_run
+            if args.save_buffer:
+                start = time.time()
+                with buffer_lock:
+                    buffer.save(os.path.join(save_path, "buffer"))
+                logger.console_logger.info("Saved the replay buffer in {:.1f}s".format(time.time() - start))
+
+        episode += episode_batch.batch_size
+
+        if evaluator is not None:
+            evaluator.drain(logger)
 
         if (runner.t_env - last_log_T) >= args.log_interval:
             logger.log_stat("episode", episode, runner.t_env)
+            with buffer_lock:
+                sample_stats = buffer.pop_sample_stats()
+            if prefetcher is not None:
+                sample_stats.update(prefetcher.pop_stats())
+            for k, v in sample_stats.items():
+                logger.log_stat(k, v, runner.t_env)
             logger.print_recent_stats()
             last_log_T = runner.t_env
 
+    if prefetcher is not None:
+        prefetcher.close()
+    if evaluator is not None:
+        evaluator.close(logger)
+    runner.close_env()
+    buffer.close()
+    logger.console_logger.info("Finished Training")
+
+
+# actor进程一直在收集数据，learner在主进程里按自己的节奏从buffer中训练
+def run_actor_learner(args, logger, runner, buffer, learner, mac, scheme, groups, preprocess, evaluator=None):
+    pool = ActorPool(args, buffer, scheme, groups, preprocess, mac)
+    # Carry on from the timesteps of a loaded checkpoint
+    pool.t_env_value.value = runner.t_env
+
+    train_steps = 0
+    last_test_T = -args.test_interval - 1
+    last_log_T = 0
+    model_save_time = 0
+    start_time = time.time()
+    last_time = start_time
+    log_time, log_train_steps, log_t_env = start_time, 0, pool.t_env
+
+    logger.console_logger.info("Beginning training for {} timesteps with {} actor processes".format(
+        args.t_max, args.actor_processes))
+    while pool.t_env <= args.t_max:
+        pool.drain(logger)
+        if evaluator is not None:
+            evaluator.drain(logger)
+        t_env = pool.t_env
+
+        # The learner waits for new episodes once it has sampled samples_per_insert times as many as were inserted
+        ratio_ok = args.samples_per_insert <= 0 or (train_steps + 1) * args.batch_size <= args.samples_per_insert * pool.episodes
+        if buffer.can_sample(args.batch_size) and ratio_ok:
+            episode_sample = buffer.sample(args.batch_size)
+            max_ep_t = episode_sample.max_t_filled()
+            if max_ep_t < episode_sample.max_seq_length:
+                episode_sample = episode_sample[:, :max_ep_t]
+            if episode_sample.device != args.device:
+                episode_sample.to(args.device)
+            learner.train(episode_sample, t_env, pool.episodes)
+            train_steps += 1
+            if train_steps % args.actor_weight_sync_interval == 0:
+                pool.publish(mac, train_steps)
+        else:
+            time.sleep(0.01)
+
+        # Test runs (unless async_test) and saving block the learner but not the actors.
+        # The runner never trains here, so its train stats interval must not run out during the tests
+        runner.t_env = runner.log_train_stats_t = t_env
+        if (t_env - last_test_T) / args.test_interval >= 1.0:
+            logger.console_logger.info("t_env: {} / {}".format(t_env, args.t_max))
+            logger.console_logger.info("Estimated time left: {}. Time passed: {}".format(
+                time_left(last_time, last_test_T, t_env, args.t_max), time_str(time.time() - start_time)))
+            last_time = time.time()
+
+            last_test_T = t_env
+            if evaluator is not None:
+                evaluator.submit(mac, t_env)
+            else:
+                for _ in range(max(1, args.test_nepisode // runner.batch_size)):
+                    runner.run(test_mode=True)
+
+        if args.save_model and (t_env - model_save_time >= args.save_model_interval or model_save_time == 0):
+            model_save_time = t_env
+            save_path = os.path.join(args.local_results_path, "models", args.unique_token, str(t_env))
+            os.makedirs(save_path, exist_ok=True)
+            logger.console_logger.info("Saving models to {}".format(save_path))
+            learner.save_models(save_path)
+            if args.save_buffer:
+                with buffer.lock:
+                    buffer.save(os.path.join(save_path, "buffer"))
+
+        if (t_env - last_log_T) >= args.log_interval:
+            elapsed = time.time() - log_time
+            logger.log_stat("episode", pool.episodes, t_env)
+            logger.log_stat("actor_env_steps_per_s", (t_env - log_t_env) / elapsed, t_env)
+            logger.log_stat("learner_steps_per_s", (train_steps - log_train_steps) / elapsed, t_env)
+            logger.log_stat("samples_per_insert", train_steps * args.batch_size / max(1, pool.episodes), t_env)
+            for k, v in buffer.pop_sample_stats().items():
+                logger.log_stat(k, v, t_env)
+            logger.print_recent_stats()
+            last_log_T = t_env
+            log_time, log_train_steps, log_t_env = time.time(), train_steps, t_env
+
+    pool.close(logger)
+    if evaluator is not None:
+        evaluator.close(logger)
     runner.close_env()
+    buffer.close()
     logger.console_logger.info("Finished Training")
 
 
+def build_buffer_storage(args):
+    if args.buffer_backend == "memory":
+        return MemoryStorage()
+    elif args.buffer_backend == "memmap":
+        mmap_dir = args.buffer_mmap_dir or os.path.join(args.local_results_path, "buffers")
+        return MemmapStorage(os.path.join(mmap_dir, args.unique_token))
+    elif args.buffer_backend == "shared":
+        return SharedMemoryStorage()
+    else:
+        raise ValueError("Buffer backend {} not recognised.".format(args.buffer_backend))
+
+
+def build_buffer_codecs(args, scheme, preprocess):
+    codecs = {}
+    for k, codec in args.buffer_codecs.items():
+        if codec == "float16":
+            codecs[k] = Float16Codec()
+        elif codec == "uint8":
+            codecs[k] = AffineUint8Codec(*args.buffer_quant_range)
+        elif codec == "bitpack":
+            codecs[k] = BitPackCodec(n_bits=scheme[k]["vshape"][-1])
+        elif codec == "derived":
+            sources = [src for src, (new_k, _) in preprocess.items() if new_k == k]
+            assert len(sources) == 1, "Only preprocessed fields can be derived, {} is not one".format(k)
+            codecs[k] = DerivedCodec(sources[0], preprocess[sources[0]][1])
+        else:
+            raise ValueError("Buffer codec {} not recognised.".format(codec))
+    return codecs
+
+
 def args_sanity_check(config, _log):
     # set CUDA flags
     # config["use_cuda"] = True # Use cuda whenever possible!
@@ -258,6 +459,21 @@ def args_sanity_check(config, _log):
         config["use_cuda"] = False
         _log.warning("CUDA flag use_cuda was switched OFF automatically because no CUDA devices are available!")
 
+    if config["prioritized_buffer"] and config["learner"] != "q_learner":
+        config["prioritized_buffer"] = False
+        _log.warning("prioritized_buffer was switched OFF because only q_learner reports TD-error priorities!")
+    if config["prioritized_buffer"] and config["buffer_packed"]:
+        config["buffer_packed"] = False
+        _log.warning("buffer_packed was switched OFF because it is not supported together with prioritized_buffer!")
+
+    if config["actor_learner"]:
+        # Actor processes write their episodes straight into a shared-memory buffer
+        for key, value in [("buffer_backend", "shared"), ("prioritized_buffer", False), ("buffer_packed", False),
+                           ("prefetch_depth", 0)]:
+            if config[key] != value:
+                config[key] = value
+                _log.warning("{} was set to {} because actor_learner needs a SharedReplayBuffer!".format(key, value))
+
     if config["test_nepisode"] < config["batch_size_run"]:
         config["test_nepisode"] = config["batch_size_run"]
     else:
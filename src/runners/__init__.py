@@ -5,3 +5,15 @@ REGISTRY["episode"] = EpisodeRunner
 
 from .parallel_runner import ParallelRunner
 REGISTRY["parallel"] = ParallelRunner
+
+from .continuous_runner import ContinuousRunner
+REGISTRY["continuous"] = ContinuousRunner
+
+from .vector_runner import VectorRunner
+REGISTRY["vector"] = VectorRunner
+
+from .thread_runner import ThreadRunner
+REGISTRY["thread"] = ThreadRunner
+
+from .async_runner import AsyncRunner
+REGISTRY["async"] = AsyncRunner
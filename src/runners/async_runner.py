@@ -0,0 +1,42 @@
+from envs import make_env
+from envs.env_server import serve_forever
+from envs.remote_env import RemoteBatchEnv
+from functools import partial
+from multiprocessing import Pipe, Process
+from .parallel_runner import CloudpickleWrapper
+from .vector_runner import VectorRunner
+
+
+# 环境跑在别的进程/机器上，通过socket用asyncio同时驱动，一个进程就能让几百个episode同时在跑
+class AsyncRunner(VectorRunner):
+    """
+    Runs batch_size_run remote envs like VectorRunner, each step being sent to all of them at once over asyncio
+    connections (see envs/remote_env.py). The envs are served by the env servers at remote_endpoints; if there are
+    none, remote_local_servers stand-in servers of args.env are started on this machine.
+    """
+    def _make_env(self):
+        endpoints = list(getattr(self.args, "remote_endpoints", None) or [])
+        self.server_ps = []
+        if not endpoints:
+            endpoints = self._start_local_servers(getattr(self.args, "remote_local_servers", 1))
+        return RemoteBatchEnv(endpoints, self.batch_size, timeout=getattr(self.args, "remote_timeout", 30.0))
+
+    def _start_local_servers(self, n_servers):
+        env_fn = CloudpickleWrapper(partial(make_env, self.args.env, self.args.env_args))
+        # A thread per env, so all the envs of a server can wait on their steps at once
+        threads = -(-self.batch_size // n_servers)
+        endpoints = []
+        for _ in range(n_servers):
+            parent_conn, child_conn = Pipe()
+            p = Process(target=serve_forever, kwargs=dict(env_fn=env_fn, threads=threads, port_conn=child_conn))
+            p.daemon = True
+            p.start()
+            self.server_ps.append(p)
+            endpoints.append("127.0.0.1:{}".format(parent_conn.recv()))
+        return endpoints
+
+    def close_env(self):
+        super(AsyncRunner, self).close_env()
+        for p in self.server_ps:
+            p.terminate()
+            p.join()
@@ -0,0 +1,141 @@
+from functools import partial
+from components.episode_buffer import EpisodeBatch
+from .parallel_runner import ParallelRunner
+import numpy as np
+import torch as th
+
+
+# 每个环境一结束就立刻重置并继续运行，不用等最慢的那个episode结束
+class ContinuousRunner(ParallelRunner):
+    """
+    Steps batch_size_run envs like ParallelRunner, but an env that finishes its episode is reset straight away
+    and keeps stepping while the others are still mid-episode. Every row of the batch is at its own timestep.
+    run() returns the episodes that finished, as soon as at least batch_size_run of them have, and t_env only
+    counts the steps of returned episodes. Test runs go through ParallelRunner.run, which drops the episodes in
+    flight, so their steps are never counted.
+    """
+    def __init__(self, args, logger):
+        super(ContinuousRunner, self).__init__(args, logger)
+        self.live_batch = None
+
+    def setup(self, scheme, groups, preprocess, mac):
+        super(ContinuousRunner, self).setup(scheme, groups, preprocess, mac)
+        self.new_episodes = partial(EpisodeBatch, scheme, groups, max_seq_length=self.episode_limit + 1,
+                                    preprocess=preprocess, device=self.args.device)
+
+    def run(self, test_mode=False):
+        if test_mode:
+            # Test episodes start from fresh envs, the train episodes in flight are lost
+            self.live_batch = None
+            return super(ContinuousRunner, self).run(test_mode=True)
+
+        if self.live_batch is None:
+            self._start()
+        else:
+            # The learner trains the same mac in between and overwrites its hidden states
+            self.mac.hidden_states = self.live_hidden_states
+        finished = []
+        self.finished_returns, self.finished_lengths, self.finished_infos = [], [], []
+        while sum(b.batch_size for b in finished) < self.batch_size:
+            batch = self._step()
+            if batch is not None:
+                finished.append(batch)
+        # The steps of the episodes still in flight are counted once they finish
+        self.t_env += sum(self.finished_lengths)
+        self.live_hidden_states = self.mac.hidden_states
+
+        n_episodes = len(self.finished_returns)
+        cur_stats = self.train_stats
+        infos = [cur_stats] + self.finished_infos
+        cur_stats.update({k: sum(d.get(k, 0) for d in infos) for k in set.union(*[set(d) for d in infos])})
+        cur_stats["n_episodes"] = n_episodes + cur_stats.get("n_episodes", 0)
+        cur_stats["ep_length"] = sum(self.finished_lengths) + cur_stats.get("ep_length", 0)
+        self.train_returns.extend(self.finished_returns)
+
+        if self.t_env - self.log_train_stats_t >= self.args.runner_log_interval:
+            self._log(self.train_returns, cur_stats, "")
+            if hasattr(self.mac.action_selector, "epsilon"):
+                self.logger.log_stat("epsilon", self.mac.action_selector.epsilon, self.t_env)
+            self.log_train_stats_t = self.t_env
+
+        if len(finished) == 1:
+            return finished[0]
+        # Episodes that finished on different steps go into one batch
+        batch = self.new_episodes(n_episodes)
+        for fields in ["transition_data", "episode_data"]:
+            for k, v in getattr(batch.data, fields).items():
+                v.copy_(th.cat([getattr(b.data, fields)[k] for b in finished]))
+        return batch
+
+    def _start(self):
+        self.reset()
+        self.live_batch = self.batch
+        self.mac.init_hidden(batch_size=self.batch_size)
+        # Timestep, return and done flag of the episode each env is in
+        self.env_t = np.zeros(self.batch_size, dtype=np.int64)
+        self.env_returns = np.zeros(self.batch_size)
+        self.env_done = np.zeros(self.batch_size, dtype=bool)
+        self.env_infos = [None] * self.batch_size
+
+    def _step(self):
+        envs = np.arange(self.batch_size)
+        # Actions for every env, including the final ones of the episodes that ended on the last step
+        with th.no_grad():
+            actions = self.mac.select_actions(self.live_batch, t_ep=th.from_numpy(self.env_t), t_env=self.t_env,
+                                              test_mode=False)
+        self.live_batch.update_step({"actions": actions.unsqueeze(1)}, self.env_t, bs=envs, mark_filled=False)
+        cpu_actions = actions.to("cpu").numpy()
+
+        done = envs[self.env_done]
+        stepping = envs[~self.env_done]
+        finished = self._collect(done) if len(done) > 0 else None
+        if len(done) > 0:
+            self._send("reset", {idx: None for idx in done})
+        self._send("step", {idx: cpu_actions[idx] for idx in stepping})
+
+        pre_transition_data = {"state": [], "avail_actions": [], "obs": []}
+        post_transition_data = {"reward": [], "terminated": []}
+        replies = self._recv()
+        for idx in envs:
+            data = replies[idx]
+            if not self.env_done[idx]:
+                post_transition_data["reward"].append((data["reward"],))
+                self.env_returns[idx] += data["reward"]
+                env_terminated = False
+                if data["terminated"]:
+                    self.env_infos[idx] = data["info"]
+                    env_terminated = not data["info"].get("episode_limit", False)
+                post_transition_data["terminated"].append((env_terminated,))
+                self.env_done[idx] = data["terminated"]
+            else:
+                self.env_done[idx] = False
+            if self.shared_data is None:
+                pre_transition_data["state"].append(data["state"])
+                pre_transition_data["avail_actions"].append(data["avail_actions"])
+                pre_transition_data["obs"].append(data["obs"])
+        if self.shared_data is not None:
+            self._read_shared(pre_transition_data, slice(None))
+
+        if len(stepping) > 0:
+            self.live_batch.update_step(post_transition_data, self.env_t[stepping], bs=stepping, mark_filled=False)
+        # The reset envs start over at timestep 0
+        self.env_t[stepping] += 1
+        self.env_t[done] = 0
+        self.live_batch.update_step(pre_transition_data, self.env_t, bs=envs)
+        return finished
+
+    def _collect(self, done):
+        # Moves the finished episodes in rows done out of the live batch and clears the rows for the next ones
+        rows = th.as_tensor(done, device=self.live_batch.device)
+        batch = self.new_episodes(len(done))
+        for fields in ["transition_data", "episode_data"]:
+            live_fields = getattr(self.live_batch.data, fields)
+            for k, v in getattr(batch.data, fields).items():
+                v.copy_(live_fields[k][rows])
+                live_fields[k][rows] = 0
+        self.finished_returns.extend(self.env_returns[done].tolist())
+        self.finished_lengths.extend(self.env_t[done].tolist())
+        self.finished_infos.extend(self.env_infos[idx] for idx in done)
+        self.env_returns[done] = 0
+        self.mac.reset_hidden(rows)
+        return batch
@@ -68,12 +68,12 @@ class EpisodeRunner:
 
             # 当前状态，可选动作，观测
             pre_transition_data = {
-                "state": [self.env.get_state()],
-                "avail_actions": [self.env.get_avail_actions()],
-                "obs": [self.env.get_obs()]
+                "state": self.env.get_state(),
+                "avail_actions": self.env.get_avail_actions(),
+                "obs": self.env.get_obs()
             }
             # 插入过渡前的数据
-            self.batch.update(pre_transition_data, ts=self.t)
+            self.batch.update_step(pre_transition_data, self.t)
 
             # Pass the entire batch of experiences up till now to the agents
             # Receive the actions for each agent at this timestep in a batch of size 1
@@ -91,28 +91,28 @@ class EpisodeRunner:
             # 将actions， reward， terminated打包成字典
             post_transition_data = {
                 "actions": actions,
-                "reward": [(reward,)],
-                "terminated": [(terminated != env_info.get("episode_limit", False),)],
+                "reward": reward,
+                "terminated": terminated != env_info.get("episode_limit", False),
             }
 
             # 插入过渡后的数据
-            self.batch.update(post_transition_data, ts=self.t)
+            self.batch.update_step(post_transition_data, self.t, mark_filled=False)
 
             # self.t是一个episode的步长
             self.t += 1
 
         # 执行完一个episode后的状态，可选动作，观测
         last_data = {
-            "state": [self.env.get_state()],
-            "avail_actions": [self.env.get_avail_actions()],
-            "obs": [self.env.get_obs()]
+            "state": self.env.get_state(),
+            "avail_actions": self.env.get_avail_actions(),
+            "obs": self.env.get_obs()
         }
-        self.batch.update(last_data, ts=self.t)
+        self.batch.update_step(last_data, self.t)
 
         # Select actions in the last stored state
         # 根据最后一个存储的transition挑选动作,很好奇为什么要这样
         actions = self.mac.select_actions(self.batch, t_ep=self.t, t_env=self.t_env, test_mode=test_mode)
-        self.batch.update({"actions": actions}, ts=self.t)
+        self.batch.update_step({"actions": actions}, self.t, mark_filled=False)
 
 
         # 看当前是测试模式还是训练模式，测试模式的话就修改test_stats，训练模式的话就修改train_stats
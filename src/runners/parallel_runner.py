@@ -1,4 +1,4 @@
-from envs import REGISTRY as env_REGISTRY
+from envs import REGISTRY as env_REGISTRY, env_args_for
 from functools import partial
 from components.episode_buffer import EpisodeBatch
 from multiprocessing import Pipe, Process
@@ -15,11 +15,16 @@ class ParallelRunner:
         self.logger = logger
         self.batch_size = self.args.batch_size_run
 
-        # Make subprocesses for the envs
-        self.parent_conns, self.worker_conns = zip(*[Pipe() for _ in range(self.batch_size)])
+        # Make subprocesses for the envs, each of them runs envs_per_worker envs one after the other
+        self.envs_per_worker = max(1, min(getattr(self.args, "envs_per_worker", 1), self.batch_size))
+        n_workers = (self.batch_size + self.envs_per_worker - 1) // self.envs_per_worker
+        self.parent_conns, self.worker_conns = zip(*[Pipe() for _ in range(n_workers)])
         env_fn = env_REGISTRY[self.args.env]
-        self.ps = [Process(target=env_worker, args=(worker_conn, CloudpickleWrapper(partial(env_fn, **self.args.env_args))))
-                            for worker_conn in self.worker_conns]
+        env_fns = [partial(env_fn, **env_args_for(self.args.env_args, i)) for i in range(self.batch_size)]
+        starts = range(0, self.batch_size, self.envs_per_worker)
+        self.ps = [Process(target=env_worker,
+                           args=(worker_conn, CloudpickleWrapper(env_fns[start:start + self.envs_per_worker])))
+                   for worker_conn, start in zip(self.worker_conns, starts)]
 
         for p in self.ps:
             p.daemon = True
@@ -29,6 +34,14 @@ class ParallelRunner:
         self.env_info = self.parent_conns[0].recv()
         self.episode_limit = self.env_info["episode_limit"]
 
+        # With shared_transport the workers write state, avail_actions and obs into one shared-memory slot each
+        # and only the reward, terminated and info go through the pipes
+        self.shared_data = None
+        if getattr(self.args, "shared_transport", False):
+            self._setup_shared_transport()
+
+        self.pending = []
+
         self.t = 0
 
         self.t_env = 0
@@ -40,6 +53,45 @@ class ParallelRunner:
 
         self.log_train_stats_t = -100000
 
+    def _setup_shared_transport(self):
+        n_agents = self.env_info["n_agents"]
+        shared = {
+            "state": th.zeros(self.batch_size, self.env_info["state_shape"], dtype=th.float32),
+            "avail_actions": th.zeros(self.batch_size, n_agents, self.env_info["n_actions"], dtype=th.int32),
+            "obs": th.zeros(self.batch_size, n_agents, self.env_info["obs_shape"], dtype=th.float32),
+        }
+        for v in shared.values():
+            v.share_memory_()
+        for w, parent_conn in enumerate(self.parent_conns):
+            parent_conn.send(("use_shared_memory", (shared, w * self.envs_per_worker)))
+        for parent_conn in self.parent_conns:
+            parent_conn.recv()
+        # Numpy views of every env's slot, read as one batch once all the envs have stepped
+        self.shared_data = {k: v.numpy() for k, v in shared.items()}
+
+    def _send(self, cmd, env_data):
+        # env_data: env index -> data of cmd for that env. Every worker gets one message for all its envs,
+        # the replies are collected by _recv
+        messages = {}
+        for idx, data in env_data.items():
+            messages.setdefault(idx // self.envs_per_worker, []).append((idx % self.envs_per_worker, data))
+        for w, message in messages.items():
+            self.parent_conns[w].send((cmd, message))
+            self.pending.append((w, [local for local, _ in message]))
+
+    def _recv(self):
+        # Env index -> reply, for every env of the _send calls since the last _recv
+        replies = {}
+        for w, envs in self.pending:
+            for local, reply in zip(envs, self.parent_conns[w].recv()):
+                replies[w * self.envs_per_worker + local] = reply
+        self.pending = []
+        return replies
+
+    def _read_shared(self, data, envs):
+        for k, v in self.shared_data.items():
+            data[k] = v[envs]
+
     def setup(self, scheme, groups, preprocess, mac):
         self.new_batch = partial(EpisodeBatch, scheme, groups, self.batch_size, self.episode_limit + 1,
                                  preprocess=preprocess, device=self.args.device)
@@ -62,8 +114,7 @@ class ParallelRunner:
         self.batch = self.new_batch()
 
         # Reset the envs
-        for parent_conn in self.parent_conns:
-            parent_conn.send(("reset", None))
+        self._send("reset", {idx: None for idx in range(self.batch_size)})
 
         pre_transition_data = {
             "state": [],
@@ -71,13 +122,17 @@ class ParallelRunner:
             "obs": []
         }
         # Get the obs, state and avail_actions back
-        for parent_conn in self.parent_conns:
-            data = parent_conn.recv()
-            pre_transition_data["state"].append(data["state"])
-            pre_transition_data["avail_actions"].append(data["avail_actions"])
-            pre_transition_data["obs"].append(data["obs"])
-
-        self.batch.update(pre_transition_data, ts=0)
+        replies = self._recv()
+        for idx in range(self.batch_size):
+            data = replies[idx]
+            if self.shared_data is None:
+                pre_transition_data["state"].append(data["state"])
+                pre_transition_data["avail_actions"].append(data["avail_actions"])
+                pre_transition_data["obs"].append(data["obs"])
+        if self.shared_data is not None:
+            self._read_shared(pre_transition_data, slice(None))
+
+        self.batch.update_step(pre_transition_data, 0)
 
         self.t = 0
         self.env_steps_this_run = 0
@@ -104,15 +159,14 @@ class ParallelRunner:
             actions_chosen = {
                 "actions": actions.unsqueeze(1)
             }
-            self.batch.update(actions_chosen, bs=envs_not_terminated, ts=self.t, mark_filled=False)
+            self.batch.update_step(actions_chosen, self.t, bs=envs_not_terminated, mark_filled=False)
 
             # Send actions to each env
-            action_idx = 0
-            for idx, parent_conn in enumerate(self.parent_conns):
-                if idx in envs_not_terminated: # We produced actions for this env
-                    if not terminated[idx]: # Only send the actions to the env if it hasn't terminated
-                        parent_conn.send(("step", cpu_actions[action_idx]))
-                    action_idx += 1 # actions is not a list over every env
+            step_actions = {}
+            for action_idx, idx in enumerate(envs_not_terminated): # actions is not a list over every env
+                if not terminated[idx]: # Only send the actions to the env if it hasn't terminated
+                    step_actions[idx] = cpu_actions[action_idx]
+            self._send("step", step_actions)
 
             # Update envs_not_terminated
             envs_not_terminated = [b_idx for b_idx, termed in enumerate(terminated) if not termed]
@@ -133,9 +187,10 @@ class ParallelRunner:
             }
 
             # Receive data back for each unterminated env
-            for idx, parent_conn in enumerate(self.parent_conns):
+            replies = self._recv()
+            for idx in range(self.batch_size):
                 if not terminated[idx]:
-                    data = parent_conn.recv()
+                    data = replies[idx]
                     # Remaining data for this current timestep
                     post_transition_data["reward"].append((data["reward"],))
 
@@ -153,18 +208,21 @@ class ParallelRunner:
                     post_transition_data["terminated"].append((env_terminated,))
 
                     # Data for the next timestep needed to select an action
-                    pre_transition_data["state"].append(data["state"])
-                    pre_transition_data["avail_actions"].append(data["avail_actions"])
-                    pre_transition_data["obs"].append(data["obs"])
+                    if self.shared_data is None:
+                        pre_transition_data["state"].append(data["state"])
+                        pre_transition_data["avail_actions"].append(data["avail_actions"])
+                        pre_transition_data["obs"].append(data["obs"])
+            if self.shared_data is not None:
+                self._read_shared(pre_transition_data, envs_not_terminated)
 
             # Add post_transiton data into the batch
-            self.batch.update(post_transition_data, bs=envs_not_terminated, ts=self.t, mark_filled=False)
+            self.batch.update_step(post_transition_data, self.t, bs=envs_not_terminated, mark_filled=False)
 
             # Move onto the next timestep
             self.t += 1
 
             # Add the pre-transition data
-            self.batch.update(pre_transition_data, bs=envs_not_terminated, ts=self.t, mark_filled=True)
+            self.batch.update_step(pre_transition_data, self.t, bs=envs_not_terminated, mark_filled=True)
 
         if not test_mode:
             self.t_env += self.env_steps_this_run
@@ -175,8 +233,7 @@ class ParallelRunner:
 
         env_stats = []
         for parent_conn in self.parent_conns:
-            env_stat = parent_conn.recv()
-            env_stats.append(env_stat)
+            env_stats.extend(parent_conn.recv())
 
         cur_stats = self.test_stats if test_mode else self.train_stats
         cur_returns = self.test_returns if test_mode else self.train_returns
@@ -210,48 +267,76 @@ class ParallelRunner:
         stats.clear()
 
 
-def env_worker(remote, env_fn):
-    # Make environment
-    env = env_fn.x()
+def env_worker(remote, env_fns):
+    # Make environments
+    envs = [env_fn() for env_fn in env_fns.x]
+    # Each env's slot in the shared-memory transport, if the runner set one up
+    shared = None
     while True:
         cmd, data = remote.recv()
         if cmd == "step":
-            actions = data
-            # Take a step in the environment
-            reward, terminated, env_info = env.step(actions)
-            # Return the observations, avail_actions and state to make the next action
-            state = env.get_state()
-            avail_actions = env.get_avail_actions()
-            obs = env.get_obs()
-            remote.send({
-                # Data for the next timestep needed to pick an action
-                "state": state,
-                "avail_actions": avail_actions,
-                "obs": obs,
+            # data holds (env, actions) for the envs to step, which are stepped one after the other
+            replies = []
+            for idx, actions in data:
+                env = envs[idx]
+                # Take a step in the environment
+                reward, terminated, env_info = env.step(actions)
+                # Return the observations, avail_actions and state to make the next action
+                if shared is None:
+                    step_data = {
+                        # Data for the next timestep needed to pick an action
+                        "state": env.get_state(),
+                        "avail_actions": env.get_avail_actions(),
+                        "obs": env.get_obs(),
+                    }
+                else:
+                    step_data = _write_shared(shared[idx], env)
                 # Rest of the data for the current timestep
-                "reward": reward,
-                "terminated": terminated,
-                "info": env_info
-            })
+                step_data.update({
+                    "reward": reward,
+                    "terminated": terminated,
+                    "info": env_info
+                })
+                replies.append(step_data)
+            remote.send(replies)
         elif cmd == "reset":
-            env.reset()
-            remote.send({
-                "state": env.get_state(),
-                "avail_actions": env.get_avail_actions(),
-                "obs": env.get_obs()
-            })
+            replies = []
+            for idx, _ in data:
+                env = envs[idx]
+                env.reset()
+                if shared is None:
+                    replies.append({
+                        "state": env.get_state(),
+                        "avail_actions": env.get_avail_actions(),
+                        "obs": env.get_obs()
+                    })
+                else:
+                    replies.append(_write_shared(shared[idx], env))
+            remote.send(replies)
+        elif cmd == "use_shared_memory":
+            tensors, first = data
+            shared = [{k: v.numpy()[first + idx] for k, v in tensors.items()} for idx in range(len(envs))]
+            remote.send(None)
         elif cmd == "close":
-            env.close()
+            for env in envs:
+                env.close()
             remote.close()
             break
         elif cmd == "get_env_info":
-            remote.send(env.get_env_info())
+            remote.send(envs[0].get_env_info())
         elif cmd == "get_stats":
-            remote.send(env.get_stats())
+            remote.send([env.get_stats() for env in envs])
         else:
             raise NotImplementedError
 
 
+def _write_shared(shared, env):
+    shared["state"][:] = env.get_state()
+    shared["avail_actions"][:] = env.get_avail_actions()
+    shared["obs"][:] = env.get_obs()
+    return {}
+
+
 class CloudpickleWrapper():
     """
     Uses cloudpickle to serialize contents (otherwise multiprocessing tries to use pickle)
@@ -0,0 +1,18 @@
+from envs import REGISTRY as env_REGISTRY, env_args_for
+from envs.multiagentenv import ThreadPoolBatchEnv
+from functools import partial
+from .vector_runner import VectorRunner
+
+
+# 用线程池代替进程来并行跑环境，适合step时会释放GIL的环境（本地代码、等socket）
+class ThreadRunner(VectorRunner):
+    """
+    Runs batch_size_run envs like VectorRunner, with their resets and steps spread over a pool of env_threads
+    threads in this process. No worker processes to start and no data to pickle, but envs that hold the GIL while
+    stepping are stepped no faster than one after the other.
+    """
+    def _make_env(self):
+        env_fn = env_REGISTRY[self.args.env]
+        n_threads = getattr(self.args, "env_threads", 0) or None
+        return ThreadPoolBatchEnv([partial(env_fn, **env_args_for(self.args.env_args, i)) for i in range(self.batch_size)],
+                                  n_threads=n_threads)
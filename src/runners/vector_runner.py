@@ -0,0 +1,135 @@
+from envs import REGISTRY as env_REGISTRY
+from functools import partial
+from components.episode_buffer import EpisodeBatch
+import numpy as np
+
+
+# 一次调用就能让batch_size_run个环境同时走一步，数据整块写进EpisodeBatch，没有逐个环境的循环
+class VectorRunner:
+    """
+    Runs batch_size_run envs in lockstep like ParallelRunner, but in this process and through the batched env
+    interface (MultiAgentEnv.step_batch and friends): every step is one call for all the envs, and its stacked
+    arrays are written into the EpisodeBatch as they are. Envs without a batched implementation of their own are
+    stepped one after the other by SequentialBatchEnv.
+    """
+    def __init__(self, args, logger):
+        self.args = args
+        self.logger = logger
+        self.batch_size = self.args.batch_size_run
+
+        self.env = self._make_env()
+        self.env_info = self.env.get_env_info()
+        self.episode_limit = self.env_info["episode_limit"]
+
+        self.t = 0
+        self.t_env = 0
+
+        self.train_returns = []
+        self.test_returns = []
+        self.train_stats = {}
+        self.test_stats = {}
+
+        self.log_train_stats_t = -100000
+
+    def _make_env(self):
+        return env_REGISTRY[self.args.env](n_envs=self.batch_size, **self.args.env_args)
+
+    def setup(self, scheme, groups, preprocess, mac):
+        self.new_batch = partial(EpisodeBatch, scheme, groups, self.batch_size, self.episode_limit + 1,
+                                 preprocess=preprocess, device=self.args.device)
+        self.mac = mac
+
+    def get_env_info(self):
+        return self.env_info
+
+    def save_replay(self):
+        self.env.save_replay()
+
+    def close_env(self):
+        self.env.close()
+
+    def _env_data(self, envs):
+        return {
+            "state": self.env.get_state_batch()[envs],
+            "avail_actions": self.env.get_avail_actions_batch()[envs],
+            "obs": self.env.get_obs_batch()[envs]
+        }
+
+    def reset(self):
+        self.batch = self.new_batch()
+        self.env.reset_batch()
+        self.t = 0
+        self.batch.update_step(self._env_data(slice(None)), 0)
+
+    def run(self, test_mode=False):
+        self.reset()
+
+        episode_returns = np.zeros(self.batch_size)
+        episode_lengths = np.zeros(self.batch_size, dtype=np.int64)
+        terminated = np.zeros(self.batch_size, dtype=bool)
+        # Envs that get actions: the ones still running and the ones that ended on the last step
+        envs_not_terminated = np.arange(self.batch_size)
+        final_infos = {}
+        self.mac.init_hidden(batch_size=self.batch_size)
+        cpu_actions = np.zeros((self.batch_size, self.env_info["n_agents"]), dtype=np.int64)
+
+        while True:
+            actions = self.mac.select_actions(self.batch, t_ep=self.t, t_env=self.t_env, bs=envs_not_terminated,
+                                              test_mode=test_mode)
+            self.batch.update_step({"actions": actions.unsqueeze(1)}, self.t, bs=envs_not_terminated, mark_filled=False)
+
+            if terminated.all():
+                break
+            cpu_actions[envs_not_terminated] = actions.to("cpu").numpy()
+            rewards, env_terminated, infos = self.env.step_batch(cpu_actions, mask=~terminated)
+
+            envs = np.flatnonzero(~terminated)
+            episode_returns[envs] += rewards[envs]
+            episode_lengths[envs] += 1
+            ended = envs[env_terminated[envs]]
+            for k, v in infos.items():
+                final_infos[k] = final_infos.get(k, 0) + float(v[ended].sum())
+            # Episodes cut by the time limit did not terminate
+            episode_limit = infos.get("episode_limit", np.zeros(self.batch_size))
+            self.batch.update_step({
+                "reward": rewards[envs],
+                "terminated": env_terminated[envs] & (episode_limit[envs] == 0)
+            }, self.t, bs=envs, mark_filled=False)
+            terminated[envs] = env_terminated[envs]
+
+            self.t += 1
+            self.batch.update_step(self._env_data(envs), self.t, bs=envs)
+            envs_not_terminated = envs
+
+        if not test_mode:
+            self.t_env += int(episode_lengths.sum())
+
+        cur_stats = self.test_stats if test_mode else self.train_stats
+        cur_returns = self.test_returns if test_mode else self.train_returns
+        log_prefix = "test_" if test_mode else ""
+        cur_stats.update({k: cur_stats.get(k, 0) + final_infos.get(k, 0) for k in set(cur_stats) | set(final_infos)})
+        cur_stats["n_episodes"] = self.batch_size + cur_stats.get("n_episodes", 0)
+        cur_stats["ep_length"] = int(episode_lengths.sum()) + cur_stats.get("ep_length", 0)
+
+        cur_returns.extend(episode_returns.tolist())
+
+        n_test_runs = max(1, self.args.test_nepisode // self.batch_size) * self.batch_size
+        if test_mode and (len(self.test_returns) == n_test_runs):
+            self._log(cur_returns, cur_stats, log_prefix)
+        elif self.t_env - self.log_train_stats_t >= self.args.runner_log_interval:
+            self._log(cur_returns, cur_stats, log_prefix)
+            if hasattr(self.mac.action_selector, "epsilon"):
+                self.logger.log_stat("epsilon", self.mac.action_selector.epsilon, self.t_env)
+            self.log_train_stats_t = self.t_env
+
+        return self.batch
+
+    def _log(self, returns, stats, prefix):
+        self.logger.log_stat(prefix + "return_mean", np.mean(returns), self.t_env)
+        self.logger.log_stat(prefix + "return_std", np.std(returns), self.t_env)
+        returns.clear()
+
+        for k, v in stats.items():
+            if k != "n_episodes":
+                self.logger.log_stat(prefix + k + "_mean" , v/stats["n_episodes"], self.t_env)
+        stats.clear()
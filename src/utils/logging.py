@@ -1,5 +1,6 @@
 from collections import defaultdict
 import logging
+import queue
 import numpy as np
 import torch as th
 
@@ -56,6 +57,28 @@ class Logger:
         self.console_logger.info(log_str)
 
 
+# 在子进程里代替Logger：统计量放进队列，由主进程的Logger记录
+class QueueLogger:
+    def __init__(self, stats_queue):
+        self.console_logger = logging.getLogger("actor")
+        self.stats_queue = stats_queue
+
+    def log_stat(self, key, value, t, to_sacred=True):
+        self.stats_queue.put((key, value, t))
+
+
+def log_queued_stats(stats_queue, logger):
+    # Logs the stats other processes put on stats_queue so far. A process that failed sends ("error", traceback, 0)
+    while True:
+        try:
+            key, value, t = stats_queue.get_nowait()
+        except queue.Empty:
+            return
+        if key == "error":
+            raise RuntimeError("Worker process failed:\n{}".format(value))
+        logger.log_stat(key, value, t)
+
+
 # set up a custom logger
 def get_logger():
     logger = logging.getLogger()
@@ -13,3 +13,22 @@ def build_td_lambda_targets(rewards, terminated, mask, target_qs, n_agents, gamm
     # Returns lambda-return from t=0 to t=T-1, i.e. in B*T-1*A
     return ret[:, 0:-1]
 
+
+
+def build_n_step_returns(rewards, terminated, mask, gamma, n_step):
+    # Assumes <reward >, <terminated >, <mask > in B*T-1*1, with mask zero after termination
+    # Returns, for every transition t:
+    #   the discounted sum of the rewards of the (up to) n_step transitions from t within the episode,
+    #   the index of the state to bootstrap from (t + number of those transitions),
+    #   the discount of that bootstrap value (gamma ** number of transitions, 0 if the episode terminated)
+    T = rewards.shape[1]
+    reward_n = th.zeros_like(rewards)
+    steps = th.zeros_like(mask)
+    done = th.zeros_like(mask)
+    for k in range(min(n_step, T)):
+        reward_n[:, :T - k] += gamma ** k * rewards[:, k:] * mask[:, k:]
+        steps[:, :T - k] += mask[:, k:]
+        done[:, :T - k] = th.max(done[:, :T - k], terminated[:, k:] * mask[:, k:])
+    index = (th.arange(T, device=rewards.device).view(1, T, 1) + steps).long() * mask.long()
+    discount = gamma ** steps * (1 - done) * mask
+    return reward_n, index, discount
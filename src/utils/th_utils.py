@@ -0,0 +1,10 @@
+from contextlib import ExitStack
+
+import torch as th
+
+
+def inference_mode(mode=True):
+    # th.inference_mode on torch 1.9 and newer. Before that, th.no_grad in its place and nothing for mode=False
+    if hasattr(th, "inference_mode"):
+        return th.inference_mode(mode)
+    return th.no_grad() if mode else ExitStack()